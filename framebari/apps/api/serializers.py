@@ -1,7 +1,13 @@
 # apps/api/serializers.py
 from rest_framework import serializers
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from apps.editor.cache import PhotoCache
 from apps.editor.models import Project, Photo, EditingSettings, DetectedSubject
+from apps.editor.security import SecurityValidator
+from apps.editor.tasks import process_photo_async
 from django.contrib.auth.models import User
+from django.urls import reverse
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,9 +26,17 @@ class ProjectSerializer(serializers.ModelSerializer):
         return obj.photo_set.count()
 
 class DetectedSubjectSerializer(serializers.ModelSerializer):
+    mask_url = serializers.SerializerMethodField()
+    
     class Meta:
         model = DetectedSubject
-        fields = ['id', 'subject_type', 'confidence', 'bounding_box']
+        fields = ['id', 'subject_type', 'confidence', 'bounding_box', 'mask_url']
+    
+    def get_mask_url(self, obj):
+        # Masks are served as raw binary from their own endpoint rather than inlined as base64
+        url = reverse('photo-subject-mask', kwargs={'pk': obj.photo_id, 'subject_id': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
 
 class EditingSettingsSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,6 +44,8 @@ class EditingSettingsSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class PhotoSerializer(serializers.ModelSerializer):
+    # A plain file field: ImageField would open and verify() the image again
+    original_image = serializers.FileField()
     project_name = serializers.SerializerMethodField()
     detected_subjects = DetectedSubjectSerializer(many=True, read_only=True, source='detectedsubject_set')
     editing_settings = EditingSettingsSerializer(read_only=True)
@@ -45,4 +61,39 @@ class PhotoSerializer(serializers.ModelSerializer):
     
     def get_project_name(self, obj):
         return obj.project.name
+    
+    def validate_original_image(self, value):
+        """Inspect the upload from its headers; size and format are kept for saving"""
+        try:
+            self._upload_metadata = SecurityValidator().inspect_upload(value)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+        return value
+    
+    def _with_upload_metadata(self, validated_data):
+        metadata = getattr(self, '_upload_metadata', None)
+        if metadata is not None and 'original_image' in validated_data:
+            validated_data.update(
+                width=metadata.width,
+                height=metadata.height,
+                file_size=metadata.file_size,
+                format=metadata.format,
+            )
+        return validated_data
+    
+    def create(self, validated_data):
+        return super().create(self._with_upload_metadata(validated_data))
+    
+    def update(self, instance, validated_data):
+        reuploaded = 'original_image' in validated_data
+        if reuploaded:
+            # Proxies, mattes and cached previews of the replaced original would be served for the new one
+            instance.delete_derived_files()
+            PhotoCache().invalidate_photo(instance.id)
+        
+        photo = super().update(instance, self._with_upload_metadata(validated_data))
+        if reuploaded:
+            # Rebuilds the proxy pyramid and thumbnail from the new original
+            transaction.on_commit(lambda: process_photo_async.delay(str(photo.id)))
+        return photo
 
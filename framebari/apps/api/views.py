@@ -4,11 +4,19 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from apps.editor.models import Project, Photo
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.http import HttpResponse
+from apps.editor.models import Project, Photo, DetectedSubject
 from .serializers import ProjectSerializer, PhotoSerializer
 from apps.processing.engine import PhotoProcessor
+from apps.processing.pipeline import EditGraph
 from apps.editor.tasks import process_photo_async
+from apps.editor.cache import RenderCache
+from apps.processing.hashing import get_source_hash
+from apps.processing.mask_codec import CONTENT_TYPE as MASK_CONTENT_TYPE
 import json
+import os
 
 class ProjectViewSet(viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
@@ -33,7 +41,10 @@ class PhotoViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Photo.objects.filter(project__user=self.request.user)
+        # Subject lists carry mask URLs only, so the mask blobs are never loaded here
+        return Photo.objects.filter(project__user=self.request.user).prefetch_related(
+            Prefetch('detectedsubject_set', queryset=DetectedSubject.objects.defer('mask'))
+        )
     
     @action(detail=True, methods=['post'])
     def process(self, request, pk=None):
@@ -64,6 +75,19 @@ class PhotoViewSet(viewsets.ModelViewSet):
             'download_url': photo.processed_image.url,
             'filename': f"{photo.id}_processed.{photo.format.lower()}"
         })
+    
+    @action(detail=True, methods=['get'], url_path=r'subjects/(?P<subject_id>[0-9]+)/mask')
+    def subject_mask(self, request, pk=None, subject_id=None):
+        """Subject mask as the compact binary blob, or as a cropped 1-bit PNG with ?encoding=png"""
+        photo = self.get_object()
+        subject = get_object_or_404(DetectedSubject, photo=photo, pk=subject_id)
+        
+        if not subject.mask:
+            return Response({'error': 'No mask stored for this subject'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if request.query_params.get('encoding') == 'png':
+            return HttpResponse(subject.subject_mask.to_png(), content_type='image/png')
+        return HttpResponse(bytes(subject.mask), content_type=MASK_CONTENT_TYPE)
 
 class ProcessPhotoAPI(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -76,28 +100,32 @@ class ProcessPhotoAPI(APIView):
         photo = get_object_or_404(Photo, id=photo_id, project__user=request.user)
         
         try:
-            processor = PhotoProcessor(photo.original_image.path)
+            output_path = f"api_processed/{photo.id}_api.jpg"
+            full_path = default_storage.path(output_path)
+            quality = settings.get('quality', 85)
             
-            # Apply settings
-            processor.enhance_photo(
-                brightness=settings.get('brightness', 0),
-                contrast=settings.get('contrast', 0),
-                saturation=settings.get('saturation', 0),
-                vibrance=settings.get('vibrance', 0),
-                exposure=settings.get('exposure', 0)
+            # Identical source + settings renders are served from the render cache
+            render_cache = RenderCache()
+            cache_key = render_cache.make_key(
+                get_source_hash(photo.original_image.path), settings, 'JPEG', quality
             )
+            if render_cache.fetch_to(cache_key, full_path):
+                photo.processed_image = output_path
+                photo.status = 'completed'
+                photo.save()
+                return Response(PhotoSerializer(photo).data)
             
-            # Background replacement if requested
-            if settings.get('replace_background'):
-                processor.remove_background()
-                processor.replace_background(
-                    color=settings.get('background_color', '#0066FF'),
-                    style=settings.get('background_style', 'solid')
-                )
+            # Adjustments and background replacement, with point operations fused
+            processor = PhotoProcessor(photo.original_image.path)
+            edit = EditGraph.from_settings(
+                settings, default_background_style='solid', source_path=photo.original_image.path
+            ).compile()
+            processor.working_image = edit.run(processor.working_image)
             
             # Save processed image
-            output_path = f"api_processed/{photo.id}_api.jpg"
-            processor.save(output_path, quality=settings.get('quality', 85))
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            processor.save(full_path, quality=quality)
+            render_cache.put_file(cache_key, full_path)
             
             photo.processed_image = output_path
             photo.status = 'completed'
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class EditorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.editor'  # must be 'apps.editor'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -2,16 +2,25 @@
 from django.core.cache import cache
 from django.conf import settings
 import hashlib
-import pickle
+import os
+import shutil
+import tempfile
+
+from apps.processing.hashing import settings_hash
+from apps.processing.matte_store import MatteStore
+from apps.processing.registry import get_color_engine
+
+# Bump when a processing change alters output for the same settings
+RENDER_PIPELINE_VERSION = 5
 
 class PhotoCache:
     def __init__(self):
         self.timeout = getattr(settings, 'PHOTO_CACHE_TIMEOUT', 3600)  # 1 hour
     
     def get_cache_key(self, photo_id, settings_dict):
-        """Generate cache key based on photo and settings"""
-        settings_str = str(sorted(settings_dict.items()))
-        key_data = f"{photo_id}:{settings_str}"
+        """Generate cache key based on photo, its version and settings"""
+        version = cache.get(f"photo_version:{photo_id}", 0)
+        key_data = f"{photo_id}:{version}:{settings_hash(settings_dict)}"
         return f"photo_preview:{hashlib.md5(key_data.encode()).hexdigest()}"
     
     def get_preview(self, photo_id, settings_dict):
@@ -32,3 +41,176 @@ class PhotoCache:
         current_version = cache.get(version_key, 0)
         cache.set(version_key, current_version + 1, None)  # Never expires
 
+class RenderCache:
+    """Content-addressed cache of encoded render outputs
+    
+    Entries are keyed by the source content hash (FileStorage.file_hash)
+    plus a canonical hash of the full settings, so the same photo rendered
+    with the same settings is never processed twice. Encoded files live in
+    a sharded directory on disk; the least recently used entries (by
+    mtime, refreshed on every hit) are evicted once the total size
+    exceeds the configured budget. The total is kept as a running counter
+    in the Django cache, so the directory is only scanned when the counter
+    crosses the budget or is missing.
+    """
+    HITS_KEY = 'render_cache:hits'
+    MISSES_KEY = 'render_cache:misses'
+    
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = str(cache_dir or getattr(
+            settings, 'RENDER_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'render_cache')
+        ))
+        self.max_bytes = max_bytes or getattr(settings, 'RENDER_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024)
+        self.bytes_key = f"render_cache:bytes:{hashlib.md5(self.cache_dir.encode()).hexdigest()}"
+    
+    def make_key(self, source_hash, settings_dict, output_format='JPEG', quality=85):
+        """Build the cache key for a source/settings/output combination"""
+        key_data = {
+            'version': RENDER_PIPELINE_VERSION,
+            'source': source_hash,
+            'settings': settings_dict,
+            'inputs': self.render_inputs(settings_dict),
+            'format': output_format.upper(),
+            'quality': quality,
+        }
+        return settings_hash(key_data)
+    
+    def render_inputs(self, settings_dict):
+        """Versions of what a render reads besides the source and its settings
+        
+        A .cube LUT is identified by its content, which can be edited in
+        place under the same name, and a background replacement by the
+        matting model and resolution its matte comes from.
+        """
+        inputs = {}
+        if settings_dict.get('color_grade'):
+            inputs['lut'] = get_color_engine().lut_source_hash(settings_dict['color_grade'])
+        if settings_dict.get('replace_background'):
+            inputs['matte'] = MatteStore().model_version(settings_dict.get('background_quality'))
+        return inputs
+    
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+    
+    def get_path(self, key):
+        """Return the cached file path for a key, or None on a miss"""
+        path = self._entry_path(key)
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            self._increment(self.MISSES_KEY)
+            return None
+        
+        self._increment(self.HITS_KEY)
+        return path
+    
+    def get(self, key):
+        """Return cached bytes for a key, or None on a miss"""
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as cached:
+                return cached.read()
+        except FileNotFoundError:
+            # Evicted by another worker between the check and the read
+            return None
+    
+    def fetch_to(self, key, output_path):
+        """Copy a cached render to output_path; returns False on a miss"""
+        path = self.get_path(key)
+        if path is None:
+            return False
+        try:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            shutil.copyfile(path, output_path)
+        except FileNotFoundError:
+            return False
+        return True
+    
+    def put(self, key, data):
+        """Store encoded bytes under a key"""
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        # Write to a temp file and rename so readers never see partial data
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+        
+        total = self._add_bytes(len(data))
+        if total is None or total > self.max_bytes:
+            self.evict()
+        return path
+    
+    def _add_bytes(self, nbytes):
+        """Grow the running size total; None when it is unknown and needs a scan"""
+        try:
+            return cache.incr(self.bytes_key, nbytes)
+        except ValueError:
+            return None
+    
+    def put_file(self, key, source_path):
+        """Store an already encoded file under a key"""
+        with open(source_path, 'rb') as source:
+            return self.put(key, source.read())
+    
+    def _entries(self):
+        """List (mtime, size, path) for every cached file"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+    
+    def evict(self):
+        """Remove least recently used entries until under the size budget
+        
+        Scans the directory and resets the running total to what remains.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+        
+        cache.set(self.bytes_key, total, None)
+        return removed
+    
+    def _increment(self, counter_key):
+        cache.add(counter_key, 0, None)
+        try:
+            cache.incr(counter_key)
+        except ValueError:
+            cache.set(counter_key, 1, None)
+    
+    def stats(self):
+        """Hit/miss counters plus current on-disk usage"""
+        entries = self._entries()
+        return {
+            'hits': cache.get(self.HITS_KEY, 0),
+            'misses': cache.get(self.MISSES_KEY, 0),
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,117 @@
+# apps/editor/management/commands/benchmark_decode.py
+from django.core.management.base import BaseCommand
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from apps.processing.fast_decode import make_thumbnail
+
+# (label, width, height) of the generated test images
+DEFAULT_SIZES = [
+    ('12MP', 4000, 3000),
+    ('24MP', 6000, 4000),
+    ('45MP', 8192, 5464),
+]
+
+def _current_path(path, size):
+    """Thumbnail the way process_photo_async used to: full decode, then LANCZOS"""
+    with Image.open(path) as img:
+        img.load()
+        working = img.copy()
+    working.thumbnail(size, Image.Resampling.LANCZOS)
+    return working
+
+def _fast_path(path, size):
+    return make_thumbnail(path, size)
+
+PATHS = {
+    'full decode': _current_path,
+    'draft decode': _fast_path,
+}
+
+def _peak_rss_kb():
+    """Peak resident set size of this process in KB
+    
+    ru_maxrss survives exec on Linux, so a spawned child would inherit the
+    parent's high-water mark; VmHWM is reset with the new address space.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _measure(path_name, image_path, size, queue):
+    """Run one decode path in a fresh process and report time and peak RSS"""
+    baseline_kb = _peak_rss_kb()
+    start = time.perf_counter()
+    result = PATHS[path_name](image_path, size)
+    elapsed = time.perf_counter() - start
+    peak_kb = _peak_rss_kb()
+    queue.put((elapsed, max(0, peak_kb - baseline_kb), result.size))
+
+class Command(BaseCommand):
+    help = 'Benchmark thumbnail decode time and peak RSS: full decode vs draft/reduced decode'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='Images to benchmark (generated 12-45MP JPEGs if omitted)')
+        parser.add_argument('--size', type=int, default=300, help='Thumbnail bounding box')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path; the fastest is reported')
+    
+    def handle(self, *args, **options):
+        size = (options['size'], options['size'])
+        temp_dir = None
+        files = [(os.path.basename(path), path) for path in options['files']]
+        
+        if not files:
+            temp_dir = tempfile.mkdtemp()
+            files = self._generate_images(temp_dir)
+        
+        # One fresh process per run, so earlier decodes never raise the peak
+        context = multiprocessing.get_context('spawn')
+        try:
+            self.stdout.write(f"{'image':<12}{'path':<14}{'time (ms)':>12}{'peak RSS (MB)':>16}")
+            for label, image_path in files:
+                for path_name in PATHS:
+                    runs = []
+                    for _ in range(options['repeat']):
+                        queue = context.Queue()
+                        process = context.Process(target=_measure, args=(path_name, image_path, size, queue))
+                        process.start()
+                        runs.append(queue.get())
+                        process.join()
+                    
+                    elapsed, peak_kb, _ = min(runs)
+                    self.stdout.write(
+                        f"{label:<12}{path_name:<14}{elapsed * 1000:>12.1f}{peak_kb / 1024:>16.1f}"
+                    )
+        finally:
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    def _generate_images(self, temp_dir):
+        """Write photo-like JPEGs (smooth gradients plus noise) at each size"""
+        files = []
+        rng = np.random.default_rng(0)
+        for label, width, height in DEFAULT_SIZES:
+            ys = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+            xs = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :]
+            pixels = np.empty((height, width, 3), dtype=np.uint8)
+            pixels[:, :, 0] = xs
+            pixels[:, :, 1] = ys
+            pixels[:, :, 2] = np.clip((xs + ys) / 2 + rng.normal(0, 8, (height, width)), 0, 255)
+            
+            path = os.path.join(temp_dir, f"{label}.jpg")
+            Image.fromarray(pixels).save(path, quality=90)
+            files.append((label, path))
+            self.stdout.write(f"Generated {label} test image ({width}x{height})")
+        return files
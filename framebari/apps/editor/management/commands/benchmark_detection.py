@@ -0,0 +1,119 @@
+# apps/editor/management/commands/benchmark_detection.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+import json
+import os
+import time
+
+from PIL import Image
+
+from apps.processing.detection_metrics import mean_average_precision
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+class Command(BaseCommand):
+    help = 'Benchmark subject detection backends: latency, throughput and mAP delta against fp32 PyTorch'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--sample-dir', help='Images plus an optional annotations.json (default: AI_DETECTION_SAMPLE_DIR)')
+        parser.add_argument('--backends', default='torch,int8,onnx', help='Comma-separated backends to compare')
+        parser.add_argument('--input-sizes', default='800', help='Comma-separated shortest-edge input sizes')
+        parser.add_argument('--batch-size', type=int, default=4, help='Images per forward pass')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed passes over the sample set; the fastest is reported')
+        parser.add_argument('--threshold', type=float, default=0.05, help='Score threshold used for mAP')
+        parser.add_argument('--max-map-drop', type=float, help='Fail if any configuration loses more mAP than this')
+    
+    def handle(self, *args, **options):
+        # Imported here so the command lists without torch installed
+        try:
+            from apps.processing.detection_backends import DETECTION_BACKENDS, DETR_SHORTEST_EDGE, load_detection_backend
+        except ImportError as exc:
+            raise CommandError(f"Detection backends unavailable: {exc}")
+        
+        sample_dir = options['sample_dir'] or getattr(settings, 'AI_DETECTION_SAMPLE_DIR', None)
+        if not sample_dir or not os.path.isdir(sample_dir):
+            raise CommandError(f"Sample directory not found: {sample_dir}")
+        names, images = self._load_images(sample_dir)
+        if not images:
+            raise CommandError(f"No images in {sample_dir}")
+        ground_truths = self._load_annotations(sample_dir, names)
+        
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = [name for name in backends if name not in DETECTION_BACKENDS]
+        if unknown:
+            raise CommandError(f"Unknown backends: {', '.join(unknown)}")
+        sizes = [int(size) for size in options['input_sizes'].split(',')]
+        
+        # fp32 at DETR's native size is the baseline every configuration is compared to
+        configs = [('torch', DETR_SHORTEST_EDGE)] + [
+            (name, size) for name in backends for size in sizes
+            if (name, size) != ('torch', DETR_SHORTEST_EDGE)
+        ]
+        
+        results = []
+        for name, size in configs:
+            backend = load_detection_backend(name, input_size=size)
+            elapsed, predictions = self._run(backend, images, options)
+            results.append((name, size, elapsed, predictions))
+        
+        if ground_truths is None:
+            # No annotations: the baseline's confident detections stand in for ground truth
+            ground_truths = [
+                [detection for detection in detections if detection['confidence'] >= 0.5]
+                for detections in results[0][3]
+            ]
+            self.stdout.write('No annotations.json; scoring against fp32 detections')
+        
+        self.stdout.write(
+            f"{'backend':<10}{'input':>7}{'ms/image':>12}{'images/s':>11}{'mAP':>9}{'delta':>9}"
+        )
+        baseline_map = None
+        failed = []
+        for name, size, elapsed, predictions in results:
+            score = mean_average_precision(predictions, ground_truths)
+            if baseline_map is None:
+                baseline_map = score
+            delta = score - baseline_map
+            if options['max_map_drop'] is not None and -delta > options['max_map_drop']:
+                failed.append(f"{name}@{size}")
+            self.stdout.write(
+                f"{name:<10}{size:>7}{elapsed * 1000 / len(images):>12.1f}"
+                f"{len(images) / elapsed:>11.2f}{score:>9.3f}{delta:>+9.3f}"
+            )
+        
+        if failed:
+            raise CommandError(f"mAP dropped by more than {options['max_map_drop']}: {', '.join(failed)}")
+    
+    def _run(self, backend, images, options):
+        """Fastest of the timed passes, after one untimed warm-up batch"""
+        batch_size = max(1, options['batch_size'])
+        backend.detect(images[:batch_size], options['threshold'])
+        
+        best = None
+        for _ in range(max(1, options['repeat'])):
+            predictions = []
+            start = time.perf_counter()
+            for index in range(0, len(images), batch_size):
+                predictions.extend(backend.detect(images[index:index + batch_size], options['threshold']))
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best, predictions
+    
+    def _load_images(self, sample_dir):
+        names, images = [], []
+        for name in sorted(os.listdir(sample_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with Image.open(os.path.join(sample_dir, name)) as img:
+                    images.append(img.convert('RGB'))
+                names.append(name)
+        return names, images
+    
+    def _load_annotations(self, sample_dir, names):
+        """Per-image ground truth from annotations.json: {file name: [{label, bbox}]}"""
+        path = os.path.join(sample_dir, 'annotations.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as annotations_file:
+            annotations = json.load(annotations_file)
+        return [annotations.get(name, []) for name in names]
@@ -0,0 +1,82 @@
+import base64
+import struct
+import zlib
+
+import cv2
+import numpy as np
+from django.db import migrations, models
+
+# Frozen copy of the version 1 format from apps.processing.mask_codec, so this
+# migration keeps working however the codec changes later
+MAGIC = b'FBM'
+VERSION = 1
+HEADER = struct.Struct('<3sBIIIIII')
+
+
+def encode_mask(mask):
+    binary = (np.asarray(mask) != 0).astype(np.uint8)
+    x, y, width, height = cv2.boundingRect(binary)
+    cropped = binary[y:y + height, x:x + width]
+    header = HEADER.pack(MAGIC, VERSION, mask.shape[1], mask.shape[0], x, y, width, height)
+    return header + zlib.compress(np.packbits(cropped, axis=None).tobytes(), 6)
+
+
+def decode_mask(blob):
+    _, _, frame_width, frame_height, x, y, width, height = HEADER.unpack_from(blob)
+    frame = np.zeros((frame_height, frame_width), dtype=np.uint8)
+    bits = np.frombuffer(zlib.decompress(blob[HEADER.size:]), dtype=np.uint8)
+    frame[y:y + height, x:x + width] = np.unpackbits(bits, count=width * height).reshape(height, width) * np.uint8(255)
+    return frame
+
+
+def convert_masks(apps, schema_editor):
+    """Re-encode base64 PNG masks as bbox-cropped mask_codec blobs"""
+    DetectedSubject = apps.get_model('editor', 'DetectedSubject')
+    for subject in DetectedSubject.objects.exclude(mask_data='').iterator():
+        try:
+            png = np.frombuffer(base64.b64decode(subject.mask_data), dtype=np.uint8)
+            mask = cv2.imdecode(png, cv2.IMREAD_GRAYSCALE)
+        except (ValueError, cv2.error):
+            mask = None
+        if mask is None:
+            continue
+        subject.mask = encode_mask(mask)
+        subject.save(update_fields=['mask'])
+
+
+def restore_masks(apps, schema_editor):
+    """Expand blobs back into full-frame base64 PNG masks"""
+    DetectedSubject = apps.get_model('editor', 'DetectedSubject')
+    for subject in DetectedSubject.objects.exclude(mask=b'').iterator():
+        blob = bytes(subject.mask)
+        if len(blob) < HEADER.size or blob[:3] != MAGIC:
+            continue
+        _, png = cv2.imencode('.png', decode_mask(blob))
+        subject.mask_data = base64.b64encode(png.tobytes()).decode('ascii')
+        subject.save(update_fields=['mask_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('editor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectedsubject',
+            name='mask',
+            field=models.BinaryField(default=b''),
+        ),
+        # A default lets a reverse migration re-add the column to existing rows
+        migrations.AlterField(
+            model_name='detectedsubject',
+            name='mask_data',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(convert_masks, restore_masks),
+        migrations.RemoveField(
+            model_name='detectedsubject',
+            name='mask_data',
+        ),
+    ]
@@ -3,6 +3,10 @@ from django.db import models
 from django.contrib.auth.models import User
 import uuid
 
+from apps.processing.mask_codec import SubjectMask
+from apps.processing.matte_store import MatteStore
+from apps.processing.proxies import delete_proxies
+
 class Project(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -35,6 +39,12 @@ class Photo(models.Model):
     processing_progress = models.PositiveIntegerField(default=0)
     
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    def delete_derived_files(self):
+        """Remove the preview proxies and background-removal mattes made from the original"""
+        delete_proxies(self.id)
+        if self.original_image:
+            MatteStore().delete_source(self.original_image.path)
 
 class DetectedSubject(models.Model):
     SUBJECT_TYPES = [
@@ -47,9 +57,19 @@ class DetectedSubject(models.Model):
     
     photo = models.ForeignKey(Photo, on_delete=models.CASCADE)
     subject_type = models.CharField(max_length=20, choices=SUBJECT_TYPES)
-    mask_data = models.TextField()  # Base64 encoded mask
+    mask = models.BinaryField(default=b'')  # apps.processing.mask_codec blob, cropped to the bbox
     confidence = models.FloatField()
     bounding_box = models.JSONField()  # x, y, width, height
+    
+    @property
+    def subject_mask(self):
+        """Lazily decoded SubjectMask, or None when no mask is stored"""
+        if not self.mask:
+            return None
+        cached = getattr(self, '_subject_mask', None)
+        if cached is None:
+            cached = self._subject_mask = SubjectMask(self.mask)
+        return cached
 
 class EditingSettings(models.Model):
     photo = models.OneToOneField(Photo, on_delete=models.CASCADE)
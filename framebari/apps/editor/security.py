@@ -1,11 +1,53 @@
 # apps/editor/security.py
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from django.utils import timezone
 from PIL import Image
 import magic
 import hashlib
 import os
 
+EXIF_ORIENTATION = 0x0112
+
+class ImageMetadata:
+    """What an upload inspection learned from the file headers"""
+    
+    def __init__(self, width, height, format, mode, mime_type, file_size, orientation=1, icc_profile=None, exif=None):
+        self.width = width
+        self.height = height
+        self.format = format
+        self.mode = mode
+        self.mime_type = mime_type
+        self.file_size = file_size
+        self.orientation = orientation
+        self.icc_profile = icc_profile
+        self.exif = exif or {}
+    
+    @property
+    def pixels(self):
+        return self.width * self.height
+    
+    @property
+    def display_size(self):
+        """(width, height) once the EXIF orientation is applied"""
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+    
+    def as_dict(self):
+        """JSON-safe form, as stored in FileStorage.metadata"""
+        metadata = {
+            'width': self.width,
+            'height': self.height,
+            'format': self.format,
+            'mode': self.mode,
+            'orientation': self.orientation,
+            'has_icc_profile': self.icc_profile is not None,
+        }
+        if self.exif:
+            metadata['exif'] = self.exif
+        return metadata
+
 class SecurityValidator:
     ALLOWED_MIME_TYPES = [
         'image/jpeg',
@@ -13,38 +55,91 @@ class SecurityValidator:
         'image/webp',
         'image/tiff'
     ]
+    # PIL plugins tried when opening uploads; nothing else is parsed
+    ALLOWED_FORMATS = ['JPEG', 'PNG', 'WEBP', 'TIFF']
     
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
     MAX_DIMENSIONS = (8000, 8000)
+    MAX_PIXELS = 50 * 1000 * 1000  # Decoded size is what costs memory, not file size
+    
+    def __init__(self):
+        self.max_pixels = getattr(settings, 'MAX_UPLOAD_PIXELS', self.MAX_PIXELS)
     
     def validate_upload(self, uploaded_file):
-        """Comprehensive file validation"""
+        """Comprehensive file validation; returns the upload's ImageMetadata"""
+        return self.inspect_upload(uploaded_file)
+    
+    def inspect_upload(self, uploaded_file):
+        """Validate an upload and read its metadata without decoding any pixels
+        
+        ``uploaded_file`` is an uploaded file object or a path. Type,
+        dimensions, EXIF orientation and ICC profile all come from the file
+        headers, and the pixel-count limit is enforced before anything is
+        decoded, so a decompression bomb costs no more than a header read.
+        """
+        if isinstance(uploaded_file, (str, os.PathLike)):
+            with open(uploaded_file, 'rb') as handle:
+                return self._inspect(handle, os.path.getsize(uploaded_file))
+        
+        try:
+            return self._inspect(uploaded_file, uploaded_file.size)
+        finally:
+            uploaded_file.seek(0)
+    
+    def _inspect(self, handle, file_size):
         # Check file size
-        if uploaded_file.size > self.MAX_FILE_SIZE:
+        if file_size > self.MAX_FILE_SIZE:
             raise ValidationError(f'File too large. Maximum size is {self.MAX_FILE_SIZE // (1024*1024)}MB')
         
         # Check MIME type
-        mime_type = magic.from_buffer(uploaded_file.read(1024), mime=True)
-        uploaded_file.seek(0)
+        mime_type = magic.from_buffer(handle.read(2048), mime=True)
+        handle.seek(0)
         
         if mime_type not in self.ALLOWED_MIME_TYPES:
             raise ValidationError(f'Invalid file type: {mime_type}')
         
-        # Check image validity and dimensions
+        # Image.open only parses headers; pixels are decoded on first load().
+        # Named formats are looked up directly, so every plugin must be registered first
+        Image.init()
         try:
-            with Image.open(uploaded_file) as img:
-                if img.width > self.MAX_DIMENSIONS[0] or img.height > self.MAX_DIMENSIONS[1]:
-                    raise ValidationError(f'Image too large. Maximum dimensions: {self.MAX_DIMENSIONS}')
-                
-                # Verify image integrity
-                img.verify()
-        except Exception as e:
+            img = Image.open(handle, formats=self.ALLOWED_FORMATS)
+        except Image.DecompressionBombError:
+            raise ValidationError(f'Image too large. Maximum is {self.max_pixels} pixels')
+        except Exception:
             raise ValidationError('Invalid or corrupted image file')
         
-        # Reset file pointer
-        uploaded_file.seek(0)
-        
-        return True
+        with img:
+            if img.width * img.height > self.max_pixels:
+                raise ValidationError(f'Image too large. Maximum is {self.max_pixels} pixels')
+            if img.width > self.MAX_DIMENSIONS[0] or img.height > self.MAX_DIMENSIONS[1]:
+                raise ValidationError(f'Image too large. Maximum dimensions: {self.MAX_DIMENSIONS}')
+            
+            exif = self._read_exif(img)
+            return ImageMetadata(
+                width=img.width,
+                height=img.height,
+                format=img.format,
+                mode=img.mode,
+                mime_type=mime_type,
+                file_size=file_size,
+                orientation=exif.get(EXIF_ORIENTATION, 1),
+                icc_profile=img.info.get('icc_profile'),
+                exif={k: v for k, v in exif.items() if isinstance(v, (str, int, float))},
+            )
+    
+    @staticmethod
+    def _read_exif(img):
+        """EXIF from the header segments; PNG's getexif() would decode the image"""
+        if hasattr(img, 'tag_v2'):
+            # TIFF keeps EXIF tags in the header IFD
+            return img.getexif()
+        exif = Image.Exif()
+        if img.info.get('exif'):
+            try:
+                exif.load(img.info['exif'])
+            except Exception:
+                pass
+        return exif
     
     def sanitize_filename(self, filename):
         """Sanitize uploaded filename"""
@@ -59,4 +154,3 @@ class SecurityValidator:
         timestamp_hash = hashlib.md5(str(timezone.now()).encode()).hexdigest()[:8]
         
         return f"{safe_name}_{timestamp_hash}{ext}"
-
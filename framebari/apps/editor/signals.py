@@ -0,0 +1,10 @@
+# apps/editor/signals.py
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Photo
+
+@receiver(post_delete, sender=Photo)
+def delete_photo_derived_files(sender, instance, **kwargs):
+    """Proxies and mattes are keyed by photo id and source hash, and would otherwise outlive the photo"""
+    instance.delete_derived_files()
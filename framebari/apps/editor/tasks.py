@@ -1,8 +1,29 @@
 # apps/editor/tasks.py
 from celery import shared_task
-from .models import Photo
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.core.files.storage import default_storage
+from .models import Photo, DetectedSubject
+from .cache import RenderCache
+from .security import SecurityValidator
 from apps.processing.engine import PhotoProcessor
+from apps.processing.hashing import get_source_hash
+from apps.processing.fast_decode import open_reduced
+from apps.processing.proxies import build_proxy_pyramid, get_proxy_levels
+from apps.processing.pipeline import EditGraph
+from apps.processing.registry import warm_up
+from apps.processing.tiling import processing_job
 from PIL import Image
+import os
+
+@worker_process_init.connect
+def warm_up_processing(**kwargs):
+    """Build shared processing engines before this worker process takes a task"""
+    warm_up()
+    if getattr(settings, 'AI_DETECTION_PRELOAD', False):
+        # Imported here so workers that never detect do not load torch
+        from apps.processing.ai_detection import get_subject_detector
+        get_subject_detector()
 
 @shared_task
 def process_photo_async(photo_id):
@@ -11,22 +32,47 @@ def process_photo_async(photo_id):
         photo.status = 'processing'
         photo.save()
         
-        # Get image dimensions
-        with Image.open(photo.original_image.path) as img:
-            photo.width = img.width
-            photo.height = img.height
+        # Uploads are sized by SecurityValidator.inspect_upload before the Photo is saved;
+        # anything stored without that is inspected here, from its headers only
+        if not (photo.width and photo.height):
+            metadata = SecurityValidator().inspect_upload(photo.original_image.path)
+            photo.width = metadata.width
+            photo.height = metadata.height
             photo.save()
         
+        # Decode once at reduced scale (JPEG DCT scaling) for the proxies and thumbnail;
+        # the pyramid resamples with LANCZOS itself, so no extra headroom is needed
+        largest_proxy = max(get_proxy_levels())
+        reduced = open_reduced(
+            photo.original_image.path, (largest_proxy, largest_proxy), reducing_gap=1.0
+        )
+        
+        # Create preview proxies once so slider previews never touch the original
+        build_proxy_pyramid(reduced, photo.id)
+        
         # Create thumbnail
-        processor = PhotoProcessor(photo.original_image.path)
+        processor = PhotoProcessor.from_image(reduced)
         processor.working_image.thumbnail((300, 300), Image.Resampling.LANCZOS)
         
         thumbnail_path = f"thumbnails/{photo.id}_thumb.jpg"
-        processor.save(thumbnail_path, quality=80)
+        thumbnail_full_path = default_storage.path(thumbnail_path)
+        os.makedirs(os.path.dirname(thumbnail_full_path), exist_ok=True)
+        processor.save(thumbnail_full_path, quality=80)
         photo.thumbnail = thumbnail_path
         
         # Detect subjects
         subjects = processor.detect_subjects()
+        DetectedSubject.objects.filter(photo=photo).delete()
+        DetectedSubject.objects.bulk_create([
+            DetectedSubject(
+                photo=photo,
+                subject_type=subject['type'],
+                mask=subject['mask'],
+                confidence=subject['confidence'],
+                bounding_box=subject['bbox'],
+            )
+            for subject in subjects
+        ])
         
         photo.status = 'completed'
         photo.processing_progress = 100
@@ -41,46 +87,36 @@ def process_photo_async(photo_id):
 
 # apps/editor/tasks.py (additional task)
 @shared_task
+@processing_job()
 def process_single_photo_batch(photo_id, settings):
     """Process single photo in batch"""
     try:
         photo = Photo.objects.get(id=photo_id)
         
-        processor = PhotoProcessor(photo.original_image.path)
+        output_path = f"batch_processed/{photo.id}_batch.jpg"
+        full_path = default_storage.path(output_path)
+        quality = settings.get('quality', 85)
         
-        # Apply all settings
-        processor.enhance_photo(
-            brightness=settings.get('brightness', 0),
-            contrast=settings.get('contrast', 0),
-            saturation=settings.get('saturation', 0),
-            vibrance=settings.get('vibrance', 0),
-            exposure=settings.get('exposure', 0)
+        # Reruns with identical source and settings skip processing entirely
+        render_cache = RenderCache()
+        cache_key = render_cache.make_key(
+            get_source_hash(photo.original_image.path), settings, 'JPEG', quality
         )
+        if render_cache.fetch_to(cache_key, full_path):
+            photo.processed_image = output_path
+            photo.status = 'completed'
+            photo.save()
+            return f"Successfully processed {photo_id} (cached)"
         
-        # Apply color grading if specified
-        if settings.get('color_grade'):
-            color_engine = ColorGradingEngine()
-            processor.working_image = color_engine.apply_lut(
-                processor.working_image,
-                settings['color_grade'],
-                settings.get('grade_intensity', 1.0)
-            )
-        
-        # Apply background replacement if specified
-        if settings.get('replace_background'):
-            processor.remove_background()
-            
-            bg_engine = AdvancedBackgroundEngine()
-            processor.working_image = bg_engine.replace_background(
-                processor.working_image,
-                None,  # Mask already applied
-                settings.get('background_style', 'blue_default')
-            )
+        # Adjustments, grading and point filters run as one fused pass
+        processor = PhotoProcessor(photo.original_image.path)
+        edit = EditGraph.from_settings(settings, source_path=photo.original_image.path).compile()
+        processor.working_image = edit.run(processor.working_image)
         
         # Save result
-        output_path = f"batch_processed/{photo.id}_batch.jpg"
-        full_path = default_storage.path(output_path)
-        processor.save(full_path, quality=settings.get('quality', 85))
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        processor.save(full_path, quality=quality)
+        render_cache.put_file(cache_key, full_path)
         
         photo.processed_image = output_path
         photo.status = 'completed'
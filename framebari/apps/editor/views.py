@@ -4,12 +4,20 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
 import json
 import uuid
 import tempfile
 import zipfile
 import os
 
+from .models import Photo
+from apps.processing.optimized_engine import OptimizedPhotoProcessor
+from apps.processing.proxies import get_proxy_levels
+
+# Largest preview the editor canvas requests; renders come from the proxy pyramid
+PREVIEW_MAX_SIZE = (800, 600)
+
 # Mock data to simulate database records
 MOCK_PROJECTS = {}
 MOCK_PHOTOS = {}
@@ -152,11 +160,38 @@ def apply_effects(request, photo_id):
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+def _get_stored_photo(request, photo_id):
+    """Return the user's Photo record, or None for mock/unknown ids"""
+    try:
+        return Photo.objects.select_related('project').get(id=photo_id, project__user=request.user)
+    except (Photo.DoesNotExist, ValidationError, ValueError):
+        return None
+
 @csrf_exempt
 @login_required
 def generate_preview(request, photo_id):
     """Generate real-time preview"""
     if request.method == 'POST':
+        stored_photo = _get_stored_photo(request, photo_id)
+        if stored_photo:
+            try:
+                data = json.loads(request.body or '{}')
+                settings = data.get('settings', data)
+                width = int(data.get('width', PREVIEW_MAX_SIZE[0]))
+                height = int(data.get('height', PREVIEW_MAX_SIZE[1]))
+                
+                largest_proxy = max(get_proxy_levels())
+                processor = OptimizedPhotoProcessor(
+                    stored_photo.original_image.path,
+                    max_preview_size=(min(width, largest_proxy), min(height, largest_proxy)),
+                    photo_id=stored_photo.id
+                )
+                response = HttpResponse(processor.get_optimized_preview(settings), content_type='image/jpeg')
+                response['Cache-Control'] = 'private, max-age=60'
+                return response
+            except Exception as e:
+                return JsonResponse({'success': False, 'error': str(e)})
+        
         photo = MOCK_PHOTOS.get(photo_id)
         if not photo or photo.get('user_id') != request.user.id:
             return JsonResponse({'success': False, 'error': 'Photo not found'})
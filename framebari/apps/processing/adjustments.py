@@ -0,0 +1,141 @@
+# apps/processing/adjustments.py
+import cv2
+import numpy as np
+from PIL import Image, ImageStat
+
+from .tiling import TiledExecutor
+
+# ITU-R 601-2 luma weights, the same ones PIL uses for convert('L')
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class AdjustmentPipeline:
+    """Fused brightness/contrast/saturation/exposure/vibrance adjustment
+
+    Brightness, contrast, saturation and exposure are all linear in RGB, so
+    they are folded into a single 3x4 color matrix and applied with one
+    ``cv2.transform`` call (uint8 in, saturated uint8 out). Vibrance is
+    not linear; when it is set the matrix and the vibrance weighting run
+    together in one float32 pass over row strips, writing into a single
+    output buffer.
+    """
+    STRIP_ROWS = 256
+    SETTING_KEYS = ('brightness', 'contrast', 'saturation', 'vibrance', 'exposure')
+
+    def __init__(self, brightness=0, contrast=0, saturation=0, vibrance=0, exposure=0):
+        self.brightness = 1 + float(brightness) / 100
+        self.contrast = 1 + float(contrast) / 100
+        self.saturation = 1 + float(saturation) / 100
+        self.exposure = 1 + float(exposure) / 100
+        self.vibrance = float(vibrance) / 100
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build a pipeline from a settings dict, ignoring unrelated keys"""
+        return cls(**{key: settings.get(key, 0) or 0 for key in cls.SETTING_KEYS})
+
+    @property
+    def is_identity(self):
+        return (self.brightness == 1 and self.contrast == 1 and self.saturation == 1
+                and self.exposure == 1 and self.vibrance == 0)
+
+    def color_matrix(self, mean_luma):
+        """Compose the linear adjustments into one 3x4 affine matrix
+
+        ``mean_luma`` is the mean luma of the source; like PIL's Contrast
+        enhancer, contrast pivots around the (brightness-adjusted) mean.
+        """
+        b, c, s, e = self.brightness, self.contrast, self.saturation, self.exposure
+        pivot = int(b * mean_luma + 0.5)
+
+        # Saturation: blend each pixel with its own luma
+        saturation = s * np.eye(3, dtype=np.float32) + (1 - s) * np.outer(np.ones(3), LUMA_WEIGHTS)
+
+        linear = e * c * b * saturation
+        # Luma weights sum to one, so the contrast offset passes through saturation unchanged
+        offset = np.full((3, 1), e * (1 - c) * pivot, dtype=np.float32)
+        return np.hstack([linear, offset]).astype(np.float32)
+
+    def apply(self, image):
+        """Return a new adjusted copy of a PIL image"""
+        if self.is_identity:
+            return image.copy()
+
+        if image.mode == 'L':
+            return self._apply_gray(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+
+        tiler = TiledExecutor()
+        if tiler.should_tile(image):
+            # Contrast pivots on the whole frame's mean, so every tile shares it
+            mean_luma = float(np.dot(LUMA_WEIGHTS, ImageStat.Stat(image).mean[:3]))
+            return tiler.map_array(
+                image, lambda pixels: self.apply_array(pixels, mean_luma), mode=image.mode
+            )
+
+        result = self.apply_array(np.asarray(image))
+        return Image.fromarray(result, image.mode)
+
+    def apply_array(self, pixels, mean_luma=None):
+        """Adjust an HxWx3 or HxWx4 uint8 array, returning a new array
+
+        Pass ``mean_luma`` when ``pixels`` is only part of a larger frame so
+        every part pivots contrast around the same value.
+        """
+        if mean_luma is None:
+            mean_luma = self.mean_luma(pixels)
+        matrix = self.color_matrix(mean_luma)
+
+        if self.vibrance == 0:
+            return cv2.transform(pixels, self._with_alpha(matrix, pixels.shape[2]))
+        return self._apply_with_vibrance(pixels, matrix)
+
+    @staticmethod
+    def mean_luma(pixels):
+        """Mean luma of an RGB(A) array without allocating a gray copy"""
+        channel_means = cv2.mean(pixels)[:3]
+        return float(np.dot(LUMA_WEIGHTS, channel_means))
+
+    def _with_alpha(self, matrix, channels):
+        """Extend a 3x4 matrix to pass an alpha channel through untouched"""
+        if channels == 3:
+            return matrix
+        extended = np.zeros((4, 5), dtype=np.float32)
+        extended[:3, :3] = matrix[:, :3]
+        extended[:3, 4] = matrix[:, 3]
+        extended[3, 3] = 1
+        return extended
+
+    def _apply_with_vibrance(self, pixels, matrix):
+        """Affine transform plus vibrance in one float32 pass over row strips"""
+        output = np.empty_like(pixels)
+        luma_row = LUMA_WEIGHTS[np.newaxis, :]
+
+        for top in range(0, pixels.shape[0], self.STRIP_ROWS):
+            strip = pixels[top:top + self.STRIP_ROWS]
+            rgb = cv2.transform(strip[:, :, :3].astype(np.float32), matrix)
+            red, green, blue = cv2.split(rgb)
+
+            # Vibrance boosts muted pixels more than already saturated ones
+            chroma = cv2.max(cv2.max(red, green), blue) - cv2.min(cv2.min(red, green), blue)
+            factor = 1 + self.vibrance * (1 - np.clip(chroma / 255, 0, 1))
+            luma = cv2.transform(rgb, luma_row)
+            rgb -= luma[:, :, np.newaxis]
+            rgb *= factor[:, :, np.newaxis]
+            rgb += luma[:, :, np.newaxis]
+
+            np.clip(rgb, 0, 255, out=rgb)
+            output[top:top + self.STRIP_ROWS, :, :3] = rgb
+            if pixels.shape[2] == 4:
+                output[top:top + self.STRIP_ROWS, :, 3] = strip[:, :, 3]
+
+        return output
+
+    def _apply_gray(self, image):
+        """Grayscale images reduce to a single 256-entry lookup table"""
+        matrix = self.color_matrix(float(np.asarray(image).mean()))
+        # For gray pixels saturation is a no-op, so each row sums to the overall gain
+        gain, offset = float(matrix[0, :3].sum()), float(matrix[0, 3])
+        table = np.clip(np.arange(256) * gain + offset, 0, 255).astype(np.uint8)
+        return image.point(table.tolist())
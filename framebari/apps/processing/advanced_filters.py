@@ -1,12 +1,44 @@
 # apps/processing/advanced_filters.py
 import cv2
 import numpy as np
-from PIL import Image, ImageFilter, ImageEnhance
+from PIL import Image, ImageFilter, ImageEnhance, ImageStat
 from scipy import ndimage
 import math
 
+from .curves import ToneCurve, apply_color_matrix
+from .masks import radial_falloff
+from .tiling import TiledExecutor
+
 class AdvancedFiltersEngine:
+    # Radius of influence of each neighbourhood/point filter, used as the tile halo.
+    # Filters that depend on pixel position or whole-frame statistics (vignettes,
+    # contrast around the mean, k-means) always run on the full frame.
+    TILE_HALOS = {
+        'sharpen': 1,
+        'emboss': 1,
+        'edge_detect': 1,
+        'sepia': 0,
+        'hdr': 7,
+        'oil_painting': 3,
+        'watercolor': 7,
+        'pencil_sketch': 5,
+        'cartoon': 7,
+    }
+    
+    # Sepia transformation matrix
+    SEPIA_MATRIX = np.array([
+        [0.393, 0.769, 0.189],
+        [0.349, 0.686, 0.168],
+        [0.272, 0.534, 0.131]
+    ])
+    # Local mean for HDR contrast enhancement
+    HDR_KERNEL = np.ones((15, 15), np.float32) / 225
+    # Cross processing: a different S-curve per channel (red, green, blue)
+    CROSS_PROCESS_CURVE = ToneCurve.s_curve((2.5, 2.0, 1.5), rounding='truncate')
+    
     def __init__(self):
+        # None: a TiledExecutor per call, sized for the jobs running at that moment
+        self.tiler = None
         self.filters = {
             'blur': self._apply_blur,
             'sharpen': self._apply_sharpen,
@@ -15,7 +47,6 @@ class AdvancedFiltersEngine:
             'vintage': self._apply_vintage,
             'sepia': self._apply_sepia,
             'black_white': self._apply_black_white,
-            'cross_process': self._apply_cross_process,
             'lomography': self._apply_lomography,
             'orton': self._apply_orton_effect,
             'hdr': self._apply_hdr_effect,
@@ -25,13 +56,37 @@ class AdvancedFiltersEngine:
             'cartoon': self._apply_cartoon,
             'pop_art': self._apply_pop_art
         }
+        
+        # Filters that are pure per-channel tone curves
+        self.curve_filters = {}
+        self.register_curve_filter('cross_process', self.CROSS_PROCESS_CURVE)
+    
+    def register_curve_filter(self, name, curve):
+        """Register a filter defined by a per-channel tone curve
+        
+        ``curve`` is a ToneCurve (possibly composed with then()) or a 256 /
+        256x3 table. Curve filters run as a single lookup, are tiled without
+        overlap, and fuse with neighbouring point operations in an EditGraph.
+        """
+        curve = ToneCurve.coerce(curve)
+        self.curve_filters[name] = curve
+        self.filters[name] = lambda image, **kwargs: curve.apply(image)
+        return curve
     
     def apply_filter(self, image, filter_name, intensity=1.0, **kwargs):
         """Apply specified filter to image"""
         if filter_name not in self.filters:
             return image
         
-        filtered = self.filters[filter_name](image, **kwargs)
+        filter_func = self.filters[filter_name]
+        halo = self._tile_halo(filter_name, kwargs)
+        tiler = self.tiler or TiledExecutor()
+        if halo is None:
+            filtered = filter_func(image, **kwargs)
+        elif tiler.backend == 'process' and filter_name not in self.curve_filters:
+            filtered = tiler.map_shared(image, _filter_tile, (filter_name, kwargs), halo)
+        else:
+            filtered = tiler.map(image, lambda tile: filter_func(tile, **kwargs), halo)
         
         # Blend with original based on intensity
         if intensity < 1.0:
@@ -39,6 +94,15 @@ class AdvancedFiltersEngine:
         
         return filtered
     
+    def _tile_halo(self, filter_name, kwargs):
+        """Tile overlap needed for a filter, or None if it cannot be tiled"""
+        if filter_name == 'blur':
+            # PIL approximates the Gaussian with three box passes of about radius each
+            return int(math.ceil(kwargs.get('radius', 2) * 3)) + 2
+        if filter_name in self.curve_filters:
+            return 0
+        return self.TILE_HALOS.get(filter_name)
+    
     def _apply_blur(self, image, radius=2):
         """Apply Gaussian blur"""
         return image.filter(ImageFilter.GaussianBlur(radius=radius))
@@ -64,15 +128,8 @@ class AdvancedFiltersEngine:
         img_array = np.array(image)
         
         # Add vignette
-        h, w = img_array.shape[:2]
-        center_x, center_y = w // 2, h // 2
-        max_distance = math.sqrt(center_x**2 + center_y**2)
-        
-        for y in range(h):
-            for x in range(w):
-                distance = math.sqrt((x - center_x)**2 + (y - center_y)**2)
-                vignette = 1 - (distance / max_distance) * 0.5
-                img_array[y, x] = img_array[y, x] * vignette
+        vignette = radial_falloff(image.size, 0.5)
+        img_array = (img_array * vignette[:, :, np.newaxis]).astype(np.uint8)
         
         # Add warm tone
         img_array[:, :, 0] = np.clip(img_array[:, :, 0] * 1.1, 0, 255)  # Red
@@ -86,60 +143,25 @@ class AdvancedFiltersEngine:
     
     def _apply_sepia(self, image):
         """Apply sepia tone effect"""
-        img_array = np.array(image)
-        
-        # Sepia transformation matrix
-        sepia_filter = np.array([
-            [0.393, 0.769, 0.189],
-            [0.349, 0.686, 0.168],
-            [0.272, 0.534, 0.131]
-        ])
-        
-        sepia_img = img_array.dot(sepia_filter.T)
-        sepia_img = np.clip(sepia_img, 0, 255)
-        
-        return Image.fromarray(sepia_img.astype(np.uint8))
+        # One saturating matrix transform instead of a float64 matrix product
+        sepia_img = apply_color_matrix(np.asarray(image), self.SEPIA_MATRIX)
+        return Image.fromarray(sepia_img, image.mode)
     
     def _apply_black_white(self, image):
         """Convert to black and white with enhanced contrast"""
         bw = image.convert('L')
-        enhancer = ImageEnhance.Contrast(bw)
-        bw = enhancer.enhance(1.2)
-        return bw.convert('RGB')
-    
-    def _apply_cross_process(self, image):
-        """Apply cross-processing effect"""
-        img_array = np.array(image)
-        
-        # Create S-curves for each channel
-        def s_curve(x, steepness=2):
-            return 255 * (1 / (1 + np.exp(-steepness * (x / 255 - 0.5))))
-        
-        # Apply different curves to each channel
-        img_array[:, :, 0] = s_curve(img_array[:, :, 0], 2.5)  # Red
-        img_array[:, :, 1] = s_curve(img_array[:, :, 1], 2.0)  # Green
-        img_array[:, :, 2] = s_curve(img_array[:, :, 2], 1.5)  # Blue
-        
-        return Image.fromarray(img_array.astype(np.uint8))
+        # ImageEnhance.Contrast(1.2) as a single lookup: stretch around the mean gray
+        mean = int(ImageStat.Stat(bw).mean[0] + 0.5)
+        contrast = ToneCurve.linear(1.2, pivot=mean, rounding='truncate')
+        return contrast.apply(bw).convert('RGB')
     
     def _apply_lomography(self, image):
         """Apply lomography effect"""
         img_array = np.array(image)
-        h, w = img_array.shape[:2]
-        
-        # Create radial gradient for vignette
-        center_x, center_y = w // 2, h // 2
-        Y, X = np.ogrid[:h, :w]
-        dist_from_center = np.sqrt((X - center_x)**2 + (Y - center_y)**2)
-        max_dist = np.sqrt(center_x**2 + center_y**2)
         
         # Strong vignette
-        vignette = 1 - (dist_from_center / max_dist) * 0.8
-        vignette = np.clip(vignette, 0.2, 1)
-        
-        # Apply vignette
-        for c in range(3):
-            img_array[:, :, c] = img_array[:, :, c] * vignette
+        vignette = radial_falloff(image.size, 0.8, minimum=0.2)
+        img_array[:, :, :3] = img_array[:, :, :3] * vignette[:, :, np.newaxis]
         
         # Increase saturation
         pil_img = Image.fromarray(img_array.astype(np.uint8))
@@ -177,8 +199,7 @@ class AdvancedFiltersEngine:
         l_channel = np.power(l_channel, 0.6)
         
         # Enhance local contrast
-        kernel = np.ones((15, 15), np.float32) / 225
-        local_mean = cv2.filter2D(l_channel, -1, kernel)
+        local_mean = cv2.filter2D(l_channel, -1, self.HDR_KERNEL)
         l_channel = l_channel + 0.5 * (l_channel - local_mean)
         
         lab[:, :, 0] = np.clip(l_channel * 255, 0, 255)
@@ -269,3 +290,14 @@ class AdvancedFiltersEngine:
         pil_img = enhancer.enhance(2.0)
         
         return pil_img
+
+_tile_engine = None
+
+def _filter_tile(pixels, filter_name, kwargs):
+    """Run one filter on a tile array; the picklable entry point for process-pool tiling"""
+    global _tile_engine
+    if _tile_engine is None:
+        _tile_engine = AdvancedFiltersEngine()
+    tile = Image.fromarray(pixels)
+    filtered = _tile_engine.filters[filter_name](tile, **kwargs)
+    return np.asarray(filtered.convert(tile.mode))
@@ -0,0 +1,130 @@
+# apps/processing/background_generators.py
+import cv2
+import numpy as np
+from PIL import Image
+
+from .fast_decode import fit_size
+from .masks import radial_distance, radial_falloff
+
+# Bokeh is drawn on a proxy with this long edge; disc sizes are given against a 1024px frame
+BOKEH_PROXY_EDGE = 256
+BOKEH_REFERENCE_EDGE = 1024
+BOKEH_DISC_OPACITY = 0.75
+
+
+def hex_to_rgb(color):
+    """Convert '#RRGGBB' to an (r, g, b) tuple"""
+    return tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
+
+
+def _axes(size, dtype=np.float64):
+    """Return broadcastable (ys, xs) coordinate axes for an image size"""
+    width, height = size
+    ys = np.arange(height, dtype=dtype)[:, np.newaxis]
+    xs = np.arange(width, dtype=dtype)[np.newaxis, :]
+    return ys, xs
+
+
+def _rgba(size, rgb, alpha):
+    """Build an RGBA image with a constant color and a per-pixel alpha plane"""
+    width, height = size
+    pixels = np.empty((height, width, 4), dtype=np.uint8)
+    pixels[:, :, :3] = rgb
+    pixels[:, :, 3] = alpha
+    return Image.fromarray(pixels, 'RGBA')
+
+
+def alpha_gradient(size, base_color):
+    """Solid color whose alpha ramps from transparent (top) to opaque (bottom)"""
+    width, height = size
+    ys, _ = _axes(size)
+    alpha = (255 * (ys / height)).astype(np.uint8)
+    return _rgba(size, hex_to_rgb(base_color), np.broadcast_to(alpha, (height, width)))
+
+
+def alpha_wave(size, base_color):
+    """Solid color with a sin/cos wave modulating the alpha channel"""
+    ys, xs = _axes(size)
+    wave = np.trunc((50 * np.sin(xs * 0.02)) * np.cos(ys * 0.02))
+    alpha = np.clip(200 + wave, 0, 255).astype(np.uint8)
+    return _rgba(size, hex_to_rgb(base_color), alpha)
+
+
+def wave_blue(size):
+    """Blue background with a horizontal/vertical wave in the green channel"""
+    width, height = size
+    ys, xs = _axes(size)
+    intensity = np.trunc((100 + np.sin(xs * 0.02) * 50) + np.cos(ys * 0.03) * 30)
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, :, 1] = np.clip(intensity, 0, 255)
+    pixels[:, :, 2] = 255
+    return Image.fromarray(pixels, 'RGB')
+
+
+def metallic_blue(size):
+    """Concentric metallic ripples around the image center"""
+    width, height = size
+    distance = radial_distance(size, width / 2, height / 2)
+    metallic = (150 + 50 * np.sin(distance * np.float32(0.1))).astype(np.int16)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[:, :, 0] = metallic // 3
+    pixels[:, :, 1] = metallic // 2
+    pixels[:, :, 2] = metallic
+    return Image.fromarray(pixels, 'RGB')
+
+
+def gradient_blue(size):
+    """Vertical gradient from dark to bright blue"""
+    width, height = size
+    ys, _ = _axes(size)
+    blue = (100 + 155 * (ys / height)).astype(np.uint8)
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, :, 1] = 50
+    pixels[:, :, 2] = blue
+    return Image.fromarray(pixels, 'RGB')
+
+
+def studio_lighting(size):
+    """Neutral radial falloff, bright in the center like a lit backdrop"""
+    intensity = (255 * radial_falloff(tuple(size)) * 0.5 + 128).astype(np.uint8)
+    return Image.fromarray(intensity, 'L').convert('RGB')
+
+
+def bokeh(size, rng, count=50, proxy_edge=BOKEH_PROXY_EDGE):
+    """Out-of-focus light discs on a dark backdrop
+    
+    Each disc is an analytic, antialiased circle that brightens toward its
+    center, and overlapping discs add like real highlights instead of
+    painting over each other. Everything is drawn and blurred on a small
+    proxy and upsampled, so the cost does not grow with size.
+    """
+    width, height = size
+    proxy_width, proxy_height = fit_size(size, (proxy_edge, proxy_edge))
+    scale = max(proxy_width, proxy_height) / BOKEH_REFERENCE_EDGE
+    ys, xs = _axes((proxy_width, proxy_height), np.float32)
+    canvas = np.full((proxy_height, proxy_width, 3), 10, np.float32)
+    
+    centers_x = rng.random(count) * proxy_width
+    centers_y = rng.random(count) * proxy_height
+    radii = np.maximum(rng.integers(10, 80, count) * scale, 0.75)
+    colors = np.stack([
+        rng.integers(50, 255, count),
+        rng.integers(50, 200, count),
+        rng.integers(100, 255, count),
+    ], axis=1).astype(np.float32)
+    
+    for center_x, center_y, radius, color in zip(centers_x, centers_y, radii, colors):
+        # Only the disc's bounding box is evaluated
+        left, right = max(0, int(center_x - radius) - 1), min(proxy_width, int(center_x + radius) + 2)
+        top, bottom = max(0, int(center_y - radius) - 1), min(proxy_height, int(center_y + radius) + 2)
+        distance = np.hypot(xs[:, left:right] - center_x, ys[top:bottom] - center_y)
+        
+        coverage = np.clip(radius + 0.5 - distance, 0, 1) * BOKEH_DISC_OPACITY
+        glow = 100 * np.clip(1 - distance / radius, 0, 1)
+        canvas[top:bottom, left:right] += coverage[:, :, np.newaxis] * (color + glow[:, :, np.newaxis])
+    
+    canvas = cv2.GaussianBlur(canvas, (0, 0), max(8 * scale, 0.5))
+    pixels = np.clip(canvas + 0.5, 0, 255).astype(np.uint8)
+    if (proxy_width, proxy_height) != (width, height):
+        pixels = cv2.resize(pixels, (width, height), interpolation=cv2.INTER_LINEAR)
+    return Image.fromarray(pixels, 'RGB')
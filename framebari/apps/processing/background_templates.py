@@ -0,0 +1,80 @@
+# apps/processing/background_templates.py
+import threading
+from django.conf import settings
+from PIL import Image
+
+from .image_cache import DecodedImageCache
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256MB per worker process
+# Long edges templates are rendered at; requests resample from the nearest one at or above
+CANONICAL_EDGES = (512, 1024, 2048, 4096)
+DEFAULT_SEED = 0
+
+_template_cache = None
+_template_cache_lock = threading.Lock()
+
+
+def canonical_size(size, edges=CANONICAL_EDGES):
+    """Template size for a requested (width, height): same aspect, long edge from edges
+    
+    Sizes beyond the largest edge are rendered as they are, never upscaled.
+    """
+    long_edge = max(size)
+    edge = next((edge for edge in edges if edge >= long_edge), None)
+    if edge is None:
+        return tuple(size)
+    scale = edge / long_edge
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+class BackgroundTemplateCache:
+    """Procedural backgrounds rendered once per style, seed and resolution
+    
+    Styles are rendered at a canonical resolution of the requested aspect
+    and resampled to each requested size, so only styles drawn relative to
+    the image size belong here; both the template and the resampled result are kept in
+    a memory-bounded LRU, so a batch of same-size photos renders its
+    background once. Cached images are shared and must be treated as
+    read-only.
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, edges=CANONICAL_EDGES):
+        self.edges = edges
+        self.images = DecodedImageCache(max_bytes)
+    
+    def get(self, style, size, render, seed=None):
+        """Background of style at size; render(size, seed) draws a template on a miss"""
+        seed = DEFAULT_SEED if seed is None else seed
+        size = tuple(size)
+        
+        key = ('sized', style, seed, size)
+        background = self.images.get(key)
+        if background is not None:
+            return background
+        
+        template_size = canonical_size(size, self.edges)
+        template = self.images.get_or_load(
+            ('template', style, seed, template_size),
+            lambda: render(template_size, seed)
+        )
+        if template.size == size:
+            return template
+        
+        background = template.resize(size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+        self.images.put(key, background)
+        return background
+    
+    def clear(self):
+        self.images.clear()
+
+
+def get_template_cache():
+    """The per-process background template cache, created on first use"""
+    global _template_cache
+    if _template_cache is None:
+        with _template_cache_lock:
+            if _template_cache is None:
+                _template_cache = BackgroundTemplateCache(
+                    getattr(settings, 'BACKGROUND_TEMPLATE_CACHE_BYTES', DEFAULT_MAX_BYTES)
+                )
+    return _template_cache
@@ -5,13 +5,12 @@ import zipfile
 import tempfile
 import os
 from .engine import PhotoProcessor
-from .color_grading import ColorGradingEngine
-from .background_engine import AdvancedBackgroundEngine
+from .registry import get_background_engine, get_color_engine
 
 class BatchProcessor:
     def __init__(self):
-        self.color_engine = ColorGradingEngine()
-        self.background_engine = AdvancedBackgroundEngine()
+        self.color_engine = get_color_engine()
+        self.background_engine = get_background_engine()
     
     def process_batch(self, photo_ids, settings):
         """Process multiple photos with same settings"""
@@ -0,0 +1,93 @@
+# apps/processing/batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+
+class MicroBatcher:
+    """Collect concurrent requests into batches for one batched call
+    
+    submit() queues an item and returns a Future. A single serving thread
+    takes the first waiting item, keeps collecting for up to
+    ``max_wait_ms`` (or until ``max_batch_size`` items are waiting), and
+    hands the whole batch to ``run_batch``, which must return one result
+    per item in order. Model forward passes amortize much better over a
+    batch than over the same images one at a time.
+    
+    call() and map() wait at most ``timeout`` seconds for the batch; an item
+    still unanswered by then is run on its own in the caller's thread, so a
+    stalled batch cannot hang its callers.
+    """
+    
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=20, timeout=None, name='micro-batcher'):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self.name = name
+        self.requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def submit(self, item):
+        future = Future()
+        self.requests.put((item, future))
+        self._ensure_running()
+        return future
+    
+    def call(self, item):
+        """Submit one item and wait for its result"""
+        return self.map([item])[0]
+    
+    def map(self, items):
+        """Submit several items and wait for all of their results"""
+        futures = [self.submit(item) for item in items]
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        return [self._result(item, future, deadline) for item, future in zip(items, futures)]
+    
+    def _result(self, item, future, deadline):
+        try:
+            return future.result(None if deadline is None else max(0, deadline - time.monotonic()))
+        except TimeoutError:
+            # The batch is stuck (or the queue is backed up): drop out of it and run unbatched
+            future.cancel()
+            return self.run_batch([item])[0]
+    
+    def _ensure_running(self):
+        # Started lazily so the thread belongs to the process that uses it (not a fork parent)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._serve, name=self.name, daemon=True)
+                self._thread.start()
+    
+    def _next_batch(self):
+        batch = [self.requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _serve(self):
+        while True:
+            batch = [
+                (item, future) for item, future in self._next_batch()
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+            
+            try:
+                results = self.run_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"run_batch returned {len(results)} results for {len(batch)} items")
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
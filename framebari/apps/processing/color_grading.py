@@ -1,23 +1,81 @@
 # apps/processing/color_grading.py
+import os
+import threading
+from functools import partial
 import numpy as np
+from django.conf import settings
 from PIL import Image
 import cv2
 
+from .hashing import get_source_hash
+from .lazy import LazyRegistry
+from .lut3d import LUT3D, load_cube
+from .tiling import TiledExecutor
+
+# Built-in look curves and their baked 3D LUTs, built lazily and shared by every engine
+_builtin_luts = None
+_baked_luts = None
+_builtin_luts_lock = threading.Lock()
+
 class ColorGradingEngine:
+    # Built-in look name -> curve factory method
+    BUILTIN_LUTS = {
+        'cinematic_warm': '_create_warm_lut',
+        'cinematic_cool': '_create_cool_lut',
+        'vintage': '_create_vintage_lut',
+        'dramatic': '_create_dramatic_lut',
+        'mono_blue': '_create_mono_blue_lut',
+        'neon': '_create_neon_lut',
+    }
+    
     def __init__(self):
         self.luts = self._load_luts()
+        self.cube_files = self._find_cube_files()
     
-    def _load_luts(self):
-        """Load predefined LUTs for different styles"""
+    def _find_cube_files(self):
+        """User .cube LUTs in COLOR_GRADING_LUT_DIR, named by file stem"""
+        lut_dir = getattr(settings, 'COLOR_GRADING_LUT_DIR', None)
+        if not lut_dir or not os.path.isdir(lut_dir):
+            return {}
         return {
-            'cinematic_warm': self._create_warm_lut(),
-            'cinematic_cool': self._create_cool_lut(),
-            'vintage': self._create_vintage_lut(),
-            'dramatic': self._create_dramatic_lut(),
-            'mono_blue': self._create_mono_blue_lut(),
-            'neon': self._create_neon_lut()
+            os.path.splitext(name)[0]: os.path.join(lut_dir, name)
+            for name in sorted(os.listdir(lut_dir))
+            if name.lower().endswith('.cube')
         }
     
+    def get_lut3d(self, lut_name):
+        """3D LUT for a built-in look or a .cube file, cached process-wide"""
+        if lut_name in _baked_luts:
+            return _baked_luts[lut_name]
+        if lut_name in self.cube_files:
+            return load_cube(self.cube_files[lut_name])
+        return None
+    
+    def lut_source_hash(self, lut_name):
+        """Content hash of a .cube LUT's file, or None for built-in looks"""
+        if lut_name in _baked_luts or lut_name not in self.cube_files:
+            return None
+        try:
+            return get_source_hash(self.cube_files[lut_name])
+        except FileNotFoundError:
+            return None
+    
+    def _load_luts(self):
+        """Predefined LUT curves, each created on first use and shared process-wide"""
+        global _builtin_luts, _baked_luts
+        with _builtin_luts_lock:
+            if _builtin_luts is None:
+                _builtin_luts = LazyRegistry({
+                    name: getattr(self, method) for name, method in self.BUILTIN_LUTS.items()
+                })
+                _baked_luts = LazyRegistry({
+                    name: partial(self._bake_lut, name) for name in self.BUILTIN_LUTS
+                })
+        return _builtin_luts
+    
+    def _bake_lut(self, lut_name):
+        return LUT3D.from_curves(_builtin_luts[lut_name], cache_key=f"builtin:{lut_name}")
+    
     def _create_warm_lut(self):
         """Create warm cinematic LUT"""
         lut = np.arange(256, dtype=np.float32)
@@ -91,36 +149,35 @@ class ColorGradingEngine:
     
     def apply_lut(self, image, lut_name, intensity=1.0):
         """Apply LUT to image with specified intensity"""
-        if lut_name not in self.luts:
+        lut = self.get_lut3d(lut_name)
+        if lut is None:
             return image
         
-        lut = self.luts[lut_name]
-        img_array = np.array(image)
+        dense = lut.wants_dense(image.width * image.height)
         
-        # Apply LUT
-        result = cv2.LUT(img_array, lut)
+        def grade(img_array):
+            # Apply LUT
+            result = lut.apply(img_array, dense)
+            
+            # Blend with original based on intensity
+            if intensity < 1.0:
+                result = cv2.addWeighted(img_array, 1 - intensity, result, intensity, 0)
+            return result
         
-        # Blend with original based on intensity
-        if intensity < 1.0:
-            result = cv2.addWeighted(img_array, 1 - intensity, result, intensity, 0)
-        
-        return Image.fromarray(result)
+        # Point operation: large frames are graded tile by tile
+        return TiledExecutor().map_array(image, grade)
     
     def apply_subject_specific_grading(self, image, subject_mask, lut_name, intensity=1.0):
         """Apply color grading only to specific subject"""
-        if lut_name not in self.luts:
+        lut = self.get_lut3d(lut_name)
+        if lut is None:
             return image
         
-        img_array = np.array(image)
-        mask_array = np.array(subject_mask) / 255.0
-        
-        # Apply LUT to entire image
-        graded = cv2.LUT(img_array, self.luts[lut_name])
+        img_array = np.asarray(image)
+        graded = lut.apply(img_array)
         
-        # Blend only where mask is present
-        result = img_array.copy()
-        for c in range(3):
-            result[:, :, c] = (img_array[:, :, c] * (1 - mask_array * intensity) + 
-                             graded[:, :, c] * mask_array * intensity)
+        # Blend only where mask is present, weighting per pixel in one pass
+        weights = np.asarray(subject_mask, dtype=np.float32) * np.float32(intensity / 255)
+        result = cv2.blendLinear(graded, img_array, weights, 1 - weights)
         
-        return Image.fromarray(result.astype(np.uint8))
+        return Image.fromarray(result, image.mode)
@@ -0,0 +1,68 @@
+# apps/processing/compositing.py
+import cv2
+import numpy as np
+from PIL import Image
+
+STRIP_ROWS = 512
+
+
+def as_alpha(mask, size):
+    """HxW uint8 alpha from a PIL mask or array, resized to size (width, height) if needed"""
+    if isinstance(mask, Image.Image):
+        mask = mask.convert('L') if mask.mode != 'L' else mask
+    alpha = np.asarray(mask)
+    if alpha.ndim == 3:
+        alpha = alpha[:, :, -1]
+    if alpha.dtype != np.uint8:
+        alpha = np.clip(alpha, 0, 255).astype(np.uint8)
+    if alpha.shape != (size[1], size[0]):
+        alpha = cv2.resize(alpha, size, interpolation=cv2.INTER_LINEAR)
+    return alpha
+
+
+def trimap_band(alpha, radius):
+    """Boolean mask of the unknown region: pixels within radius of the subject edge
+    
+    Includes every partially transparent pixel plus a ring on both sides
+    of the 50% contour; solid interior and background are excluded.
+    """
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+    solid = (alpha >= 128).astype(np.uint8)
+    band = cv2.dilate(solid, kernel) != cv2.erode(solid, kernel)
+    return band | ((alpha > 0) & (alpha < 255))
+
+
+def feather(alpha, radius=1):
+    """Soften the matte edge with a Gaussian, evaluated only inside the trimap band"""
+    band = trimap_band(alpha, 2 * radius)
+    if not band.any():
+        return alpha
+    
+    rows, cols = np.nonzero(band)
+    margin = 3 * radius + 1
+    top, bottom = max(0, rows.min() - margin), min(alpha.shape[0], rows.max() + margin + 1)
+    left, right = max(0, cols.min() - margin), min(alpha.shape[1], cols.max() + margin + 1)
+    
+    blurred = cv2.GaussianBlur(alpha[top:bottom, left:right], (0, 0), radius)
+    feathered = alpha.copy()
+    window = feathered[top:bottom, left:right]
+    window_band = band[top:bottom, left:right]
+    window[window_band] = blurred[window_band]
+    return feathered
+
+
+def composite(foreground, background, alpha):
+    """foreground over background with an HxW uint8 alpha, as RGB, in one blend
+    
+    out = F * a + B * (1 - a), row strip by row strip, with no RGBA
+    conversions and no full-frame float temporaries.
+    """
+    fg = np.asarray(foreground.convert('RGB') if foreground.mode != 'RGB' else foreground)
+    bg = np.asarray(background.convert('RGB') if background.mode != 'RGB' else background)
+    output = np.empty_like(fg)
+    
+    for top in range(0, fg.shape[0], STRIP_ROWS):
+        bottom = top + STRIP_ROWS
+        weight = alpha[top:bottom].astype(np.float32) * (1 / 255)
+        output[top:bottom] = cv2.blendLinear(fg[top:bottom], bg[top:bottom], weight, 1 - weight)
+    return Image.fromarray(output, 'RGB')
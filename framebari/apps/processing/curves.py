@@ -0,0 +1,112 @@
+# apps/processing/curves.py
+import cv2
+import numpy as np
+from PIL import Image
+
+_IDENTITY = np.arange(256, dtype=np.float32)
+
+
+class ToneCurve:
+    """Per-channel tone curve stored as a 256-entry uint8 table per channel
+    
+    Any per-channel mapping (S-curves, gamma, brightness/contrast, 1D LUT
+    presets) is a ToneCurve. Curves compose exactly with then(), so a chain
+    of curves is precomputed once into a single table and applied to an
+    image with one cv2.LUT call.
+    """
+    
+    def __init__(self, tables):
+        tables = np.asarray(tables)
+        if tables.shape == (256,):
+            tables = np.repeat(tables[:, np.newaxis], 3, axis=1)
+        if tables.shape != (256, 3):
+            raise ValueError(f"Expected 256 or 256x3 tables, got {tables.shape}")
+        self.tables = np.clip(tables, 0, 255).astype(np.uint8)
+        self.tables.setflags(write=False)
+    
+    @classmethod
+    def coerce(cls, curve):
+        return curve if isinstance(curve, cls) else cls(curve)
+    
+    @classmethod
+    def identity(cls):
+        return cls(np.arange(256))
+    
+    @classmethod
+    def from_function(cls, func, rounding='round'):
+        """Sample func over 0-255 (one function, or one per channel)
+        
+        ``rounding='truncate'`` reproduces code that assigned float results
+        straight into uint8 arrays.
+        """
+        funcs = func if isinstance(func, (list, tuple)) else (func,) * 3
+        values = np.stack([np.asarray(f(_IDENTITY), dtype=np.float32) for f in funcs], axis=1)
+        values = np.clip(values, 0, 255)
+        return cls(np.floor(values) if rounding == 'truncate' else np.rint(values))
+    
+    @classmethod
+    def s_curve(cls, steepness, rounding='round'):
+        """Logistic S-curve centred on mid-gray; steepness per channel or shared"""
+        steepness = steepness if isinstance(steepness, (list, tuple)) else (steepness,) * 3
+        return cls.from_function(
+            [lambda x, k=k: 255 / (1 + np.exp(-k * (x / 255 - 0.5))) for k in steepness],
+            rounding
+        )
+    
+    @classmethod
+    def gamma(cls, gamma):
+        return cls.from_function(lambda x: 255 * (x / 255) ** gamma)
+    
+    @classmethod
+    def linear(cls, gain=1.0, offset=0.0, pivot=0.0, rounding='round'):
+        """gain * (x - pivot) + pivot + offset, e.g. contrast around a mean"""
+        return cls.from_function(lambda x: gain * (x - pivot) + pivot + offset, rounding)
+    
+    def then(self, other):
+        """Curve equivalent to applying self, then other"""
+        other = ToneCurve.coerce(other)
+        return ToneCurve(np.stack([other.tables[self.tables[:, c], c] for c in range(3)], axis=1))
+    
+    def blend(self, intensity):
+        """Mix with the identity, like blending the curve's output with its input"""
+        if intensity >= 1.0:
+            return self
+        mixed = _IDENTITY[:, np.newaxis] + np.float32(intensity) * (self.tables - _IDENTITY[:, np.newaxis])
+        return ToneCurve(np.rint(mixed))
+    
+    def lut_tables(self, channels=3):
+        """256x1xC table for cv2.LUT; channels past the third (alpha) pass through"""
+        tables = np.empty((256, 1, channels), dtype=np.uint8)
+        tables[:, 0, :3] = self.tables[:, :channels]
+        tables[:, 0, 3:] = np.arange(256, dtype=np.uint8)[:, np.newaxis]
+        return tables
+    
+    def apply_array(self, pixels):
+        if pixels.ndim == 2:
+            return cv2.LUT(pixels, self.tables[:, 0])
+        return cv2.LUT(pixels, self.lut_tables(pixels.shape[2]))
+    
+    def apply(self, image):
+        """Apply to a PIL image with a single lookup"""
+        if image.mode == 'L':
+            return image.point(self.tables[:, 0].tolist())
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        return Image.fromarray(self.apply_array(np.asarray(image)), image.mode)
+
+
+def apply_color_matrix(pixels, matrix, truncate=True):
+    """Mix the RGB channels of a uint8 array through a 3x3 matrix in one pass
+    
+    cv2.transform saturates to uint8 with rounding; ``truncate`` biases
+    the result so it matches float math followed by astype(np.uint8).
+    Alpha passes through.
+    """
+    channels = pixels.shape[2]
+    affine = np.zeros((channels, channels + 1), dtype=np.float32)
+    affine[:3, :3] = matrix
+    if truncate:
+        affine[:3, channels] = -0.4999
+    if channels == 4:
+        affine[3, 3] = 1
+    return cv2.transform(pixels, affine)
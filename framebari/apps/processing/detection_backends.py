@@ -0,0 +1,207 @@
+# apps/processing/detection_backends.py
+import os
+import threading
+from functools import lru_cache
+from django.conf import settings
+import numpy as np
+import torch
+from transformers import DetrImageProcessor, DetrForObjectDetection
+from transformers.models.detr.modeling_detr import DetrObjectDetectionOutput
+
+DEFAULT_DETECTION_MODEL = "facebook/detr-resnet-50"
+# DETR resizes so the shortest edge is 800 and the longest at most 1333
+DETR_SHORTEST_EDGE = 800
+DETR_LONGEST_EDGE = 1333
+
+_backend_lock = threading.Lock()
+
+
+def configure_torch_threads():
+    """Apply AI_DETECTION_THREADS / AI_DETECTION_INTEROP_THREADS to torch
+    
+    On CPU-only hosts running several worker processes, torch's default of
+    one intra-op thread per core oversubscribes the machine.
+    """
+    threads = getattr(settings, 'AI_DETECTION_THREADS', None)
+    if threads:
+        torch.set_num_threads(threads)
+    interop_threads = getattr(settings, 'AI_DETECTION_INTEROP_THREADS', None)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only settable before the first parallel work in the process
+            pass
+
+
+class DetectionBackend:
+    """DETR pre/post-processing around a forward pass; subclasses change how the model runs
+    
+    ``input_size`` is the shortest edge images are resized to before the
+    forward pass (DETR's default is 800). Attention cost grows with the
+    square of the feature map, so smaller inputs are much faster on CPU.
+    """
+    name = None
+    
+    def __init__(self, model_name=DEFAULT_DETECTION_MODEL, input_size=None):
+        self.model_name = model_name
+        self.input_size = input_size or DETR_SHORTEST_EDGE
+        
+        configure_torch_threads()
+        self.processor = DetrImageProcessor.from_pretrained(model_name, size={
+            'shortest_edge': self.input_size,
+            'longest_edge': round(self.input_size * DETR_LONGEST_EDGE / DETR_SHORTEST_EDGE),
+        })
+        model = DetrForObjectDetection.from_pretrained(model_name)
+        model.eval()
+        self.id2label = model.config.id2label
+        self.model = self.prepare(model)
+    
+    def prepare(self, model):
+        """The runnable form of the model"""
+        return model
+    
+    def forward(self, inputs):
+        return self.model(**inputs)
+    
+    def detect(self, images, threshold=0.5):
+        """Detections for each RGB PIL image, shaped like detect_objects() output"""
+        with torch.inference_mode():
+            # The processor pads the batch to a common size and masks the padding
+            inputs = self.processor(images=images, return_tensors="pt")
+            outputs = self.forward(inputs)
+            
+            target_sizes = torch.tensor([image.size[::-1] for image in images])
+            results = self.processor.post_process_object_detection(
+                outputs, target_sizes=target_sizes, threshold=threshold
+            )
+        return [self._format_detections(result) for result in results]
+    
+    def _format_detections(self, results):
+        detections = []
+        for score, label, box in zip(results["scores"], results["labels"], results["boxes"]):
+            box = [round(i, 2) for i in box.tolist()]
+            
+            detections.append({
+                'label': self.id2label[label.item()],
+                'confidence': round(score.item(), 3),
+                'bbox': {
+                    'x': int(box[0]),
+                    'y': int(box[1]),
+                    'width': int(box[2] - box[0]),
+                    'height': int(box[3] - box[1])
+                }
+            })
+        
+        return detections
+
+
+class TorchBackend(DetectionBackend):
+    """Full-precision PyTorch, the reference backend"""
+    name = 'torch'
+
+
+class QuantizedTorchBackend(DetectionBackend):
+    """PyTorch with dynamic int8 quantization of every Linear layer
+    
+    Weights of the transformer and the prediction heads are stored as int8
+    and activations are quantized on the fly; the convolutional backbone
+    stays in float.
+    """
+    name = 'int8'
+    
+    def prepare(self, model):
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _DetrExportWrapper(torch.nn.Module):
+    """Plain-tensor outputs for ONNX export"""
+    
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, pixel_values, pixel_mask):
+        outputs = self.model(pixel_values=pixel_values, pixel_mask=pixel_mask)
+        return outputs.logits, outputs.pred_boxes
+
+
+class OnnxBackend(DetectionBackend):
+    """ONNX Runtime on CPU, exported from the PyTorch model on first use
+    
+    The exported graph has dynamic batch and spatial axes, so one file in
+    AI_DETECTION_ONNX_DIR serves every input size.
+    """
+    name = 'onnx'
+    
+    def prepare(self, model):
+        # Optional dependency, only needed when this backend is selected
+        import onnxruntime
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = getattr(settings, 'AI_DETECTION_THREADS', None)
+        if threads:
+            options.intra_op_num_threads = threads
+        interop_threads = getattr(settings, 'AI_DETECTION_INTEROP_THREADS', None)
+        if interop_threads:
+            options.inter_op_num_threads = interop_threads
+        
+        return onnxruntime.InferenceSession(
+            self.export(model), options, providers=['CPUExecutionProvider']
+        )
+    
+    def export(self, model):
+        export_dir = str(getattr(settings, 'AI_DETECTION_ONNX_DIR', os.path.join(settings.BASE_DIR, 'models')))
+        path = os.path.join(export_dir, f"{self.model_name.replace('/', '--')}.onnx")
+        if os.path.exists(path):
+            return path
+        
+        os.makedirs(export_dir, exist_ok=True)
+        # Written under a private name first so concurrent workers never load a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        sample_size = (1, 3, DETR_SHORTEST_EDGE, DETR_SHORTEST_EDGE)
+        torch.onnx.export(
+            _DetrExportWrapper(model),
+            (torch.zeros(sample_size), torch.ones((1,) + sample_size[2:], dtype=torch.int64)),
+            temp_path,
+            input_names=['pixel_values', 'pixel_mask'],
+            output_names=['logits', 'pred_boxes'],
+            dynamic_axes={
+                'pixel_values': {0: 'batch', 2: 'height', 3: 'width'},
+                'pixel_mask': {0: 'batch', 1: 'height', 2: 'width'},
+                'logits': {0: 'batch'},
+                'pred_boxes': {0: 'batch'},
+            },
+            opset_version=17,
+        )
+        os.replace(temp_path, path)
+        return path
+    
+    def forward(self, inputs):
+        logits, pred_boxes = self.model.run(None, {
+            'pixel_values': inputs['pixel_values'].numpy(),
+            'pixel_mask': inputs['pixel_mask'].numpy().astype(np.int64),
+        })
+        return DetrObjectDetectionOutput(logits=torch.from_numpy(logits), pred_boxes=torch.from_numpy(pred_boxes))
+
+
+DETECTION_BACKENDS = {
+    backend.name: backend for backend in (TorchBackend, QuantizedTorchBackend, OnnxBackend)
+}
+
+
+@lru_cache(maxsize=None)
+def _load_backend(name, model_name, input_size):
+    return DETECTION_BACKENDS[name](model_name, input_size)
+
+
+def load_detection_backend(name=None, model_name=None, input_size=None):
+    """Detection backend from settings (or arguments), loaded once per process per configuration"""
+    name = name or getattr(settings, 'AI_DETECTION_BACKEND', 'torch')
+    if name not in DETECTION_BACKENDS:
+        raise ValueError(f"Unknown detection backend: {name}")
+    model_name = model_name or getattr(settings, 'AI_DETECTION_MODEL', DEFAULT_DETECTION_MODEL)
+    input_size = input_size or getattr(settings, 'AI_DETECTION_INPUT_SIZE', None) or DETR_SHORTEST_EDGE
+    with _backend_lock:
+        return _load_backend(name, model_name, input_size)
@@ -0,0 +1,80 @@
+# apps/processing/detection_metrics.py
+import numpy as np
+
+COCO_IOU_THRESHOLDS = tuple(np.round(np.arange(0.5, 1.0, 0.05), 2))
+
+
+def _boxes(detections):
+    """Nx4 (x1, y1, x2, y2) array from detect_objects()-style bbox dicts"""
+    boxes = np.zeros((len(detections), 4), dtype=np.float64)
+    for i, detection in enumerate(detections):
+        bbox = detection['bbox']
+        boxes[i] = (bbox['x'], bbox['y'], bbox['x'] + bbox['width'], bbox['y'] + bbox['height'])
+    return boxes
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU of two Nx4 / Mx4 corner-format box arrays"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64)
+    top_left = np.maximum(boxes_a[:, np.newaxis, :2], boxes_b[np.newaxis, :, :2])
+    bottom_right = np.minimum(boxes_a[:, np.newaxis, 2:], boxes_b[np.newaxis, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = area_a[:, np.newaxis] + area_b[np.newaxis, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def average_precision(predictions, ground_truths, label, iou_threshold=0.5):
+    """All-point interpolated AP for one label over a set of images
+    
+    ``predictions`` and ``ground_truths`` are per-image lists of detections
+    shaped like detect_objects() output (ground truths need no confidence).
+    Returns None when the label has no ground truth.
+    """
+    scored = []
+    total_truths = 0
+    matched = []
+    for image_index, (predicted, truths) in enumerate(zip(predictions, ground_truths)):
+        truths = [truth for truth in truths if truth['label'] == label]
+        total_truths += len(truths)
+        matched.append(np.zeros(len(truths), dtype=bool))
+        for detection in predicted:
+            if detection['label'] == label:
+                scored.append((detection['confidence'], image_index, detection))
+    if total_truths == 0:
+        return None
+    
+    scored.sort(key=lambda entry: -entry[0])
+    hits = np.zeros(len(scored), dtype=bool)
+    for rank, (_, image_index, detection) in enumerate(scored):
+        truths = [truth for truth in ground_truths[image_index] if truth['label'] == label]
+        if not truths:
+            continue
+        ious = box_iou(_boxes([detection]), _boxes(truths))[0]
+        # Greedy matching: the best still-unmatched truth above the threshold
+        ious[matched[image_index]] = -1
+        best = int(np.argmax(ious))
+        if ious[best] >= iou_threshold:
+            matched[image_index][best] = True
+            hits[rank] = True
+    
+    true_positives = np.cumsum(hits)
+    recall = np.concatenate([[0.0], true_positives / total_truths])
+    precision = np.concatenate([[1.0], true_positives / np.arange(1, len(hits) + 1)])
+    # Precision envelope, then area under the recall steps
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    return float(np.sum((recall[1:] - recall[:-1]) * precision[1:]))
+
+
+def mean_average_precision(predictions, ground_truths, iou_thresholds=COCO_IOU_THRESHOLDS):
+    """mAP over every labelled class, averaged over IoU thresholds (COCO-style by default)"""
+    labels = sorted({truth['label'] for truths in ground_truths for truth in truths})
+    scores = [
+        ap
+        for iou_threshold in iou_thresholds
+        for ap in (average_precision(predictions, ground_truths, label, iou_threshold) for label in labels)
+        if ap is not None
+    ]
+    return float(np.mean(scores)) if scores else 0.0
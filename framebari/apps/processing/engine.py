@@ -1,53 +1,61 @@
 # apps/processing/engine.py
 import cv2
+from django.conf import settings
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
-from rembg import remove
-import base64
-from io import BytesIO
+from PIL import Image, ImageFilter
+
+from . import background_generators, matting
+from .adjustments import AdjustmentPipeline
+from .image_cache import open_image
+from .mask_codec import encode_mask
+from .matte_store import MatteStore
 
 class PhotoProcessor:
-    def __init__(self, image_path):
-        self.original = Image.open(image_path)
+    def __init__(self, image_path, use_cache=True):
+        # The decoded original is shared through the per-worker LRU; never mutate it
+        self.original = open_image(image_path, use_cache=use_cache)
         self.working_image = self.original.copy()
+        self.source_path = image_path
+    
+    @classmethod
+    def from_image(cls, image, source_path=None):
+        """Create a processor around an already decoded image
         
+        ``source_path`` is the file the image was decoded from, if any; it
+        lets background removal reuse that file's stored matte.
+        """
+        processor = cls.__new__(cls)
+        processor.original = image
+        processor.working_image = image.copy()
+        processor.source_path = source_path
+        return processor
+    
     def enhance_photo(self, brightness=0, contrast=0, saturation=0, vibrance=0, exposure=0):
-        """Apply basic photo enhancements"""
-        img = self.working_image
-        
-        # Brightness
-        if brightness != 0:
-            enhancer = ImageEnhance.Brightness(img)
-            img = enhancer.enhance(1 + brightness/100)
-        
-        # Contrast
-        if contrast != 0:
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(1 + contrast/100)
-            
-        # Saturation
-        if saturation != 0:
-            enhancer = ImageEnhance.Color(img)
-            img = enhancer.enhance(1 + saturation/100)
-            
-        # Exposure (simplified)
-        if exposure != 0:
-            img_array = np.array(img)
-            img_array = np.clip(img_array * (1 + exposure/100), 0, 255)
-            img = Image.fromarray(img_array.astype(np.uint8))
-            
-        self.working_image = img
+        """Apply basic photo enhancements in a single fused pass"""
+        pipeline = AdjustmentPipeline(
+            brightness=brightness,
+            contrast=contrast,
+            saturation=saturation,
+            vibrance=vibrance,
+            exposure=exposure
+        )
+        if not pipeline.is_identity:
+            self.working_image = pipeline.apply(self.working_image)
         return self
     
-    def remove_background(self):
-        """Remove background using AI"""
-        img_bytes = BytesIO()
-        self.working_image.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
+    def remove_background(self, quality=None):
+        """Remove background using AI
         
-        # Remove background
-        result = remove(img_bytes.getvalue())
-        self.working_image = Image.open(BytesIO(result))
+        ``quality`` is a matting preset ('fast', 'balanced', 'full') or the
+        long edge to matte at; defaults to BACKGROUND_REMOVAL_QUALITY.
+        """
+        if self.source_path:
+            # Matte computed once per source file and model, reused across edits
+            alpha = MatteStore().get_alpha(self.source_path, quality)
+            self.working_image = matting.cutout(self.working_image, alpha)
+        else:
+            # Shared per-process model session, no PNG round-trip
+            self.working_image = matting.remove_background(self.working_image, quality=quality)
         return self
     
     def replace_background(self, color='#0066FF', style='solid'):
@@ -70,38 +78,17 @@ class PhotoProcessor:
     
     def _create_gradient_background(self, size, base_color):
         """Create gradient background"""
-        width, height = size
-        gradient = Image.new('RGBA', size)
-        
-        # Convert hex to RGB
-        base_rgb = tuple(int(base_color[i:i+2], 16) for i in (1, 3, 5))
-        
-        for y in range(height):
-            alpha = int(255 * (y / height))
-            color = base_rgb + (alpha,)
-            for x in range(width):
-                gradient.putpixel((x, y), color)
-                
-        return gradient
+        return background_generators.alpha_gradient(size, base_color)
     
     def _create_wave_background(self, size, base_color):
         """Create wave pattern background"""
-        width, height = size
-        wave_bg = Image.new('RGBA', size)
-        
-        base_rgb = tuple(int(base_color[i:i+2], 16) for i in (1, 3, 5))
-        
-        for y in range(height):
-            for x in range(width):
-                wave = int(50 * np.sin(x * 0.02) * np.cos(y * 0.02))
-                alpha = max(0, min(255, 200 + wave))
-                color = base_rgb + (alpha,)
-                wave_bg.putpixel((x, y), color)
-                
-        return wave_bg
+        return background_generators.alpha_wave(size, base_color)
     
-    def detect_subjects(self):
-        """Detect and segment subjects in the image"""
+    def detect_subjects(self, max_subjects=None):
+        """Detect and segment subjects in the image, largest first"""
+        if max_subjects is None:
+            max_subjects = getattr(settings, 'SUBJECT_DETECTION_MAX_SUBJECTS', 20)
+        
         # Convert to OpenCV format
         cv_image = cv2.cvtColor(np.array(self.working_image), cv2.COLOR_RGB2BGR)
         
@@ -111,27 +98,32 @@ class PhotoProcessor:
         edges = cv2.Canny(blurred, 50, 150)
         
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        contours = [contour for contour in contours if cv2.contourArea(contour) > 1000]  # Filter small objects
+        
+        # Fill every kept contour into one map and label it in a single pass,
+        # instead of a full-frame mask per contour
+        filled = np.zeros(gray.shape, np.uint8)
+        cv2.drawContours(filled, contours, -1, 255, -1)
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(filled, connectivity=8)
+        
+        # Label 0 is the background; keep the largest components
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        largest = np.argsort(-areas, kind='stable')[:max_subjects] + 1
         
         subjects = []
-        for i, contour in enumerate(contours):
-            if cv2.contourArea(contour) > 1000:  # Filter small objects
-                x, y, w, h = cv2.boundingRect(contour)
-                
-                # Create mask
-                mask = np.zeros(gray.shape, np.uint8)
-                cv2.drawContours(mask, [contour], -1, 255, -1)
-                
-                # Encode mask as base64
-                _, buffer = cv2.imencode('.png', mask)
-                mask_b64 = base64.b64encode(buffer).decode('utf-8')
-                
-                subjects.append({
-                    'type': 'object',
-                    'mask': mask_b64,
-                    'bbox': {'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)},
-                    'confidence': 0.8
-                })
-                
+        for label in largest:
+            x, y, w, h = (int(v) for v in stats[label, :4])
+            
+            # Mask cropped to the component's bounding box
+            mask = labels[y:y + h, x:x + w] == label
+            
+            subjects.append({
+                'type': 'object',
+                'mask': encode_mask(mask, offset=(x, y), frame_size=self.working_image.size),
+                'bbox': {'x': x, 'y': y, 'width': w, 'height': h},
+                'confidence': 0.8
+            })
+            
         return subjects
     
     def optimize_for_web(self, quality=85, format='JPEG'):
@@ -0,0 +1,61 @@
+# apps/processing/fast_decode.py
+import math
+from PIL import Image
+
+
+def fit_size(size, max_size):
+    """Largest size with the same aspect ratio that fits in max_size (never upscales)"""
+    width, height = size
+    scale = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _select_tiff_level(img, target):
+    """Seek a multi-page TIFF to its smallest page that still covers target
+    
+    Pyramidal TIFFs store reduced-resolution copies as extra pages, so
+    decoding one of those avoids touching the full-resolution strips.
+    """
+    aspect = img.width / img.height
+    best_frame, best_area = 0, img.width * img.height
+    for frame in range(1, getattr(img, 'n_frames', 1)):
+        img.seek(frame)
+        width, height = img.size
+        if abs(width / height - aspect) > 0.01:
+            continue
+        if width >= target[0] and height >= target[1] and width * height < best_area:
+            best_frame, best_area = frame, width * height
+    img.seek(best_frame)
+
+
+def open_reduced(path, max_size, resample=Image.Resampling.LANCZOS, reducing_gap=2.0):
+    """Decode an image directly at (roughly) the resolution needed for max_size
+    
+    JPEGs use libjpeg DCT scaling through ``draft()``, decoding at 1/2, 1/4
+    or 1/8 scale without ever materializing the full frame. Pyramidal TIFFs
+    decode their smallest adequate page. Everything else is decoded once
+    and shrunk with an integer box ``reduce()`` before the final resample.
+    ``reducing_gap`` keeps the pre-reduced image at least that many times
+    larger than the target, so the final resample stays high quality.
+    """
+    img = Image.open(path)
+    target = fit_size(img.size, max_size)
+    headroom = (math.ceil(target[0] * reducing_gap), math.ceil(target[1] * reducing_gap))
+    
+    if img.format == 'JPEG':
+        img.draft('RGB', headroom)
+    elif img.format == 'TIFF' and getattr(img, 'n_frames', 1) > 1:
+        _select_tiff_level(img, headroom)
+    
+    img.load()
+    factor = min(img.width // headroom[0], img.height // headroom[1])
+    if factor > 1:
+        img = img.reduce(factor)
+    if img.size != target:
+        img = img.resize(target, resample)
+    return img
+
+
+def make_thumbnail(path, size=(300, 300)):
+    """Fast thumbnail of an image file, decoded at reduced scale"""
+    return open_reduced(path, size)
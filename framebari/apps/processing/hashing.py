@@ -0,0 +1,44 @@
+# apps/processing/hashing.py
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def calculate_file_hash(path):
+    """SHA-256 of a file on disk, the same digest as FileStorage.file_hash"""
+    hash_sha256 = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+
+@lru_cache(maxsize=1024)
+def _cached_file_hash(path, size, mtime_ns):
+    return calculate_file_hash(path)
+
+
+def get_source_hash(path):
+    """Content hash of a source image, memoized per (path, size, mtime)"""
+    stat = os.stat(path)
+    return _cached_file_hash(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _canonical(value):
+    """Normalize values so equivalent settings serialize identically"""
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def settings_hash(settings_dict):
+    """Stable SHA-256 of a settings dict, independent of key order and 10 vs 10.0"""
+    payload = json.dumps(_canonical(settings_dict), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
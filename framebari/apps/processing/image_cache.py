@@ -0,0 +1,123 @@
+# apps/processing/image_cache.py
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from PIL import Image
+
+from .hashing import get_source_hash
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512MB per worker process
+
+# PIL keeps multi-band 8-bit images in 32-bit pixels, so RGB costs 4 bytes
+BYTES_PER_PIXEL = {
+    '1': 1, 'L': 1, 'P': 1,
+    'LA': 4, 'La': 4, 'PA': 4, 'RGB': 4, 'RGBA': 4, 'RGBa': 4, 'RGBX': 4,
+    'CMYK': 4, 'YCbCr': 4, 'LAB': 4, 'HSV': 4,
+    'I': 4, 'F': 4, 'I;16': 2, 'I;16B': 2, 'I;16L': 2,
+}
+
+
+class DecodedImageCache:
+    """Memory-bounded LRU of decoded images, keyed by source file hash
+    
+    Cached images are shared between callers and must be treated as
+    read-only: copy before mutating in place (thumbnail, paste, putalpha).
+    """
+    
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def image_nbytes(image):
+        """Approximate decoded size of a PIL image"""
+        return image.width * image.height * BYTES_PER_PIXEL.get(image.mode, 4)
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key, image):
+        """Insert an image, evicting least recently used entries to make room"""
+        nbytes = self.image_nbytes(image)
+        if nbytes > self.max_bytes:
+            return False
+        
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (image, nbytes)
+            self.current_bytes += nbytes
+            
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+        return True
+    
+    def get_or_load(self, key, loader):
+        """Return the cached image for key, decoding it with loader() on a miss"""
+        image = self.get(key)
+        if image is None:
+            image = loader()
+            self.put(key, image)
+        return image
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+_decoded_cache = None
+_decoded_cache_lock = threading.Lock()
+
+
+def get_decoded_cache():
+    """The per-process decoded image cache, created on first use"""
+    global _decoded_cache
+    if _decoded_cache is None:
+        with _decoded_cache_lock:
+            if _decoded_cache is None:
+                _decoded_cache = DecodedImageCache(
+                    getattr(settings, 'PROCESSING_DECODED_CACHE_BYTES', DEFAULT_MAX_BYTES)
+                )
+    return _decoded_cache
+
+
+def decode_image(path):
+    """Fully decode an image file and release the file handle"""
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+def open_image(path, use_cache=True):
+    """Decoded image for a path, shared through the per-process LRU
+    
+    The returned image is shared; see DecodedImageCache.
+    """
+    if not use_cache:
+        return decode_image(path)
+    return get_decoded_cache().get_or_load(get_source_hash(path), lambda: decode_image(path))
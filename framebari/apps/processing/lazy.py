@@ -0,0 +1,45 @@
+# apps/processing/lazy.py
+import threading
+from collections.abc import Mapping
+
+
+class LazyRegistry(Mapping):
+    """Read-only name -> value mapping whose values are built on first access
+    
+    Each factory runs at most once per process; later lookups return the
+    shared value. Membership and iteration never trigger a build.
+    """
+    
+    def __init__(self, factories):
+        self._factories = dict(factories)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def __getitem__(self, name):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        
+        factory = self._factories[name]
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = factory()
+            return self._values[name]
+    
+    def __contains__(self, name):
+        return name in self._factories
+    
+    def __iter__(self):
+        return iter(self._factories)
+    
+    def __len__(self):
+        return len(self._factories)
+    
+    def is_built(self, name):
+        return name in self._values
+    
+    def warm(self, names=None):
+        """Build the given entries (all by default) ahead of first use"""
+        for name in names or self._factories:
+            self[name]
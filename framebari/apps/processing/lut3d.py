@@ -0,0 +1,275 @@
+# apps/processing/lut3d.py
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import cv2
+import numpy as np
+
+DEFAULT_LUT_SIZE = 33
+DENSE_CACHE_ENTRIES = 1  # 64MB each, per process
+# Below this many pixels, interpolating directly costs less than baking a dense table
+DENSE_MIN_PIXELS = 4 * 1000 * 1000
+STRIP_ROWS = 256
+CHUNK_POINTS = 1 << 20
+
+_dense_tables = OrderedDict()
+_dense_lock = threading.Lock()
+_anonymous_keys = itertools.count()
+
+
+class LUT3D:
+    """A 3D color lookup table with values in [0, 1], indexed [r, g, b]
+    
+    Large images grade through a dense RGBX table of all 256^3 8-bit
+    colors, baked once (one table is kept per process), so grading is a
+    single gather per pixel; smaller ones, such as previews, interpolate
+    the lattice directly.
+    """
+    
+    METHODS = ('trilinear', 'tetrahedral')
+    
+    def __init__(self, table, domain_min=(0, 0, 0), domain_max=(1, 1, 1),
+                 method='trilinear', title='', cache_key=None):
+        table = np.ascontiguousarray(table, dtype=np.float32)
+        if table.ndim != 4 or table.shape[3] != 3 or len(set(table.shape[:3])) != 1:
+            raise ValueError(f"Expected an NxNxNx3 table, got {table.shape}")
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown interpolation method: {method}")
+        
+        self.table = table
+        self.size = table.shape[0]
+        self.domain_min = np.asarray(domain_min, dtype=np.float32)
+        self.domain_max = np.asarray(domain_max, dtype=np.float32)
+        self.method = method
+        self.title = title
+        self.cache_key = cache_key or f"anonymous:{next(_anonymous_keys)}"
+        self.curves = None
+    
+    @classmethod
+    def from_curves(cls, curves, size=DEFAULT_LUT_SIZE, **kwargs):
+        """Bake per-channel 256-entry curves (256x3, 0-255) into a 3D LUT"""
+        curves = np.asarray(curves, dtype=np.float32)
+        grid = np.linspace(0, 255, size, dtype=np.float32)
+        samples = [np.interp(grid, np.arange(256), curves[:, c]) / 255 for c in range(3)]
+        
+        table = np.empty((size, size, size, 3), dtype=np.float32)
+        table[..., 0] = samples[0][:, np.newaxis, np.newaxis]
+        table[..., 1] = samples[1][np.newaxis, :, np.newaxis]
+        table[..., 2] = samples[2][np.newaxis, np.newaxis, :]
+        lut = cls(table, **kwargs)
+        # Separable LUTs keep their exact curves for the dense table
+        lut.curves = np.clip(curves + 0.5, 0, 255).astype(np.uint8)
+        return lut
+    
+    def grid_coordinates(self, rgb):
+        """Map 0-255 RGB values (Mx3) to fractional grid positions"""
+        normalized = (np.asarray(rgb, dtype=np.float32) / 255 - self.domain_min) / (
+            self.domain_max - self.domain_min
+        )
+        return np.clip(normalized * (self.size - 1), 0, self.size - 1)
+    
+    def interpolate(self, rgb, method=None):
+        """Interpolated LUT output (Mx3 floats in [0, 1]) for 0-255 RGB inputs"""
+        method = method or self.method
+        coords = self.grid_coordinates(rgb)
+        n = self.size
+        strides = np.array([n * n, n, 1], dtype=np.int32)
+        flat = self.table.reshape(-1, 3)
+        
+        index = np.minimum(coords.astype(np.int32), n - 2)
+        frac = coords - index
+        base = index @ strides
+        
+        if method == 'tetrahedral':
+            # Walk from the low corner to the high corner along the axes in
+            # order of decreasing fraction; the four visited vertices span the
+            # tetrahedron containing the point
+            order = np.argsort(-frac, axis=1)
+            sorted_frac = np.take_along_axis(frac, order, axis=1)
+            steps = strides[order]
+            first = base + steps[:, 0]
+            second = first + steps[:, 1]
+            return (
+                flat[base] * (1 - sorted_frac[:, 0:1])
+                + flat[first] * (sorted_frac[:, 0:1] - sorted_frac[:, 1:2])
+                + flat[second] * (sorted_frac[:, 1:2] - sorted_frac[:, 2:3])
+                + flat[base + strides.sum()] * sorted_frac[:, 2:3]
+            )
+        
+        result = np.zeros((len(coords), 3), dtype=np.float32)
+        for corner in itertools.product((0, 1), repeat=3):
+            weight = np.prod(np.where(corner, frac, 1 - frac), axis=1)
+            result += flat[base + int(np.dot(corner, strides))] * weight[:, np.newaxis]
+        return result
+    
+    def _bake_dense(self):
+        """Evaluate the LUT at every 8-bit color as packed RGBX uint32"""
+        dense = np.empty((256, 256, 256, 4), dtype=np.uint8)
+        dense[..., 3] = 255
+        
+        if self.curves is not None:
+            dense[..., 0] = self.curves[:, 0][:, np.newaxis, np.newaxis]
+            dense[..., 1] = self.curves[:, 1][np.newaxis, :, np.newaxis]
+            dense[..., 2] = self.curves[:, 2][np.newaxis, np.newaxis, :]
+        elif self.method == 'trilinear':
+            # Trilinear interpolation is separable: resample each axis with a
+            # 256xN weight matrix instead of interpolating 16.7M points
+            coords = self.grid_coordinates(np.repeat(np.arange(256)[:, np.newaxis], 3, axis=1))
+            weights = []
+            for axis in range(3):
+                index = np.minimum(coords[:, axis].astype(np.int32), self.size - 2)
+                frac = coords[:, axis] - index
+                matrix = np.zeros((256, self.size), dtype=np.float32)
+                matrix[np.arange(256), index] = 1 - frac
+                matrix[np.arange(256), index + 1] += frac
+                weights.append(matrix)
+            
+            # (r, g, b, c) <- W_r (r, i) W_g (g, j) W_b (b, k) T (i, j, k, c), as matmuls
+            n = self.size
+            along_r = (weights[0] @ self.table.reshape(n, -1)).reshape(256, n, n * 3)
+            along_g = (weights[1] @ along_r).reshape(256, 256, n, 3).transpose(0, 1, 3, 2)
+            for top in range(0, 256, 32):
+                block = along_g[top:top + 32] @ weights[2].T
+                dense[top:top + 32, ..., :3] = np.clip(block * 255 + 0.5, 0, 255).transpose(0, 1, 3, 2)
+        else:
+            colors = dense.reshape(-1, 4)
+            for start in range(0, len(colors), CHUNK_POINTS):
+                flat_index = np.arange(start, min(start + CHUNK_POINTS, len(colors)))
+                rgb = np.stack([flat_index >> 16, (flat_index >> 8) & 255, flat_index & 255], axis=1)
+                colors[start:start + len(rgb), :3] = np.clip(self.interpolate(rgb) * 255 + 0.5, 0, 255)
+        
+        return dense.reshape(-1, 4).view(np.uint32).ravel()
+    
+    def dense_table(self):
+        """Packed 256^3 lookup table, baked on first use and shared process-wide"""
+        key = (self.cache_key, self.method)
+        with _dense_lock:
+            dense = _dense_tables.get(key)
+            if dense is not None:
+                _dense_tables.move_to_end(key)
+                return dense
+        
+        dense = self._bake_dense()
+        with _dense_lock:
+            _dense_tables[key] = dense
+            while len(_dense_tables) > DENSE_CACHE_ENTRIES:
+                _dense_tables.popitem(last=False)
+        return dense
+    
+    @staticmethod
+    def wants_dense(pixel_count):
+        """Whether grading this many pixels pays for baking the dense table"""
+        return pixel_count >= DENSE_MIN_PIXELS
+    
+    def apply(self, pixels, dense=None):
+        """Grade an HxWx3 or HxWx4 uint8 array; alpha passes through untouched
+        
+        ``dense`` picks the dense table over direct interpolation; by default
+        it is used for arrays of at least DENSE_MIN_PIXELS. Tiled callers
+        decide once for the whole frame.
+        """
+        if self.curves is not None:
+            # Separable: one 256-entry table per channel (identity for alpha)
+            tables = np.empty((256, 1, pixels.shape[2]), dtype=np.uint8)
+            tables[:, 0, :3] = self.curves
+            tables[:, 0, 3:] = np.arange(256, dtype=np.uint8)[:, np.newaxis]
+            return cv2.LUT(pixels, tables)
+        
+        if dense is None:
+            dense = self.wants_dense(pixels.shape[0] * pixels.shape[1])
+        table = self.dense_table() if dense else None
+        output = np.empty_like(pixels)
+        
+        for top in range(0, pixels.shape[0], STRIP_ROWS):
+            strip = pixels[top:top + STRIP_ROWS]
+            if table is None:
+                graded = self.interpolate(strip[:, :, :3].reshape(-1, 3))
+                output[top:top + STRIP_ROWS, :, :3] = np.clip(graded * 255 + 0.5, 0, 255).reshape(
+                    strip.shape[:2] + (3,)
+                )
+                continue
+            index = strip[:, :, 0].astype(np.uint32) << 16
+            index |= strip[:, :, 1].astype(np.uint32) << 8
+            index |= strip[:, :, 2]
+            graded = table[index].view(np.uint8).reshape(index.shape + (4,))
+            output[top:top + STRIP_ROWS, :, :3] = graded[:, :, :3]
+        
+        if pixels.shape[2] == 4:
+            output[:, :, 3] = pixels[:, :, 3]
+        return output
+
+
+def parse_cube(text, cache_key=None):
+    """Parse the contents of an Adobe/Resolve .cube file
+    
+    1D .cube files are accepted too and baked into an equivalent 3D LUT.
+    """
+    title = ''
+    size_3d = size_1d = None
+    domain_min, domain_max = (0.0, 0.0, 0.0), (1.0, 1.0, 1.0)
+    values = []
+    
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        keyword, _, rest = line.partition(' ')
+        if keyword == 'TITLE':
+            title = rest.strip().strip('"')
+        elif keyword == 'LUT_3D_SIZE':
+            size_3d = int(rest)
+        elif keyword == 'LUT_1D_SIZE':
+            size_1d = int(rest)
+        elif keyword == 'DOMAIN_MIN':
+            domain_min = tuple(float(v) for v in rest.split())
+        elif keyword == 'DOMAIN_MAX':
+            domain_max = tuple(float(v) for v in rest.split())
+        elif keyword in ('LUT_1D_INPUT_RANGE', 'LUT_3D_INPUT_RANGE'):
+            low, high = (float(v) for v in rest.split())
+            domain_min, domain_max = (low,) * 3, (high,) * 3
+        else:
+            values.append(line.split())
+    
+    try:
+        data = np.array(values, dtype=np.float32)
+    except ValueError:
+        raise ValueError("Malformed .cube data line")
+    
+    if size_3d:
+        if data.shape != (size_3d ** 3, 3):
+            raise ValueError(f"Expected {size_3d ** 3} RGB entries, found {len(data)}")
+        # Red varies fastest in the file, so the raw reshape is indexed [b, g, r]
+        table = data.reshape(size_3d, size_3d, size_3d, 3).transpose(2, 1, 0, 3)
+        return LUT3D(table, domain_min, domain_max, title=title, cache_key=cache_key)
+    
+    if size_1d:
+        if data.shape != (size_1d, 3):
+            raise ValueError(f"Expected {size_1d} RGB entries, found {len(data)}")
+        # Resample the curve onto 0-255 inputs across its domain
+        inputs = np.arange(256, dtype=np.float32) / 255
+        curves = np.stack([
+            np.interp(
+                inputs,
+                np.linspace(domain_min[c], domain_max[c], size_1d),
+                data[:, c],
+            )
+            for c in range(3)
+        ], axis=1)
+        return LUT3D.from_curves(np.clip(curves, 0, 1) * 255, title=title, cache_key=cache_key)
+    
+    raise ValueError("Missing LUT_3D_SIZE or LUT_1D_SIZE")
+
+
+@lru_cache(maxsize=32)
+def _load_cube(path, mtime_ns, size):
+    with open(path, encoding='utf-8') as cube_file:
+        return parse_cube(cube_file.read(), cache_key=f"cube:{path}:{mtime_ns}:{size}")
+
+
+def load_cube(path):
+    """Parsed .cube file, cached process-wide until the file changes"""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return _load_cube(path, stat.st_mtime_ns, stat.st_size)
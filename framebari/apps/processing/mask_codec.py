@@ -0,0 +1,88 @@
+# apps/processing/mask_codec.py
+import struct
+import zlib
+import cv2
+import numpy as np
+from PIL import Image
+
+MAGIC = b'FBM'
+VERSION = 1
+# magic, version, frame width/height, bbox x/y/width/height
+HEADER = struct.Struct('<3sBIIIIII')
+CONTENT_TYPE = 'application/x-framebari-mask'
+
+
+def encode_mask(mask, offset=(0, 0), frame_size=None):
+    """Pack a binary mask into a compact blob cropped to its bounding box
+    
+    ``mask`` is any 2D array where nonzero means subject; ``offset`` places
+    it within a frame of ``frame_size`` (width, height), defaulting to the
+    mask itself. Pixels are bit-packed (8 per byte) and deflated, so a
+    typical subject costs a few hundred bytes instead of a full-frame PNG
+    in base64.
+    """
+    mask = np.asarray(mask)
+    if frame_size is None:
+        frame_size = (offset[0] + mask.shape[1], offset[1] + mask.shape[0])
+    
+    binary = (mask != 0).astype(np.uint8)
+    x, y, width, height = cv2.boundingRect(binary)
+    cropped = binary[y:y + height, x:x + width]
+    
+    header = HEADER.pack(MAGIC, VERSION, frame_size[0], frame_size[1], offset[0] + x, offset[1] + y, width, height)
+    return header + zlib.compress(np.packbits(cropped, axis=None).tobytes(), 6)
+
+
+class SubjectMask:
+    """A decoded-on-demand view of an encode_mask() blob
+    
+    The header (frame size and bounding box) is read eagerly and is cheap;
+    pixels are only inflated the first time they are asked for.
+    """
+    
+    def __init__(self, blob):
+        self.blob = bytes(blob)
+        if len(self.blob) < HEADER.size:
+            raise ValueError("Mask blob is truncated")
+        magic, version, frame_width, frame_height, x, y, width, height = HEADER.unpack_from(self.blob)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a subject mask blob")
+        self.frame_size = (frame_width, frame_height)
+        self.bbox = {'x': x, 'y': y, 'width': width, 'height': height}
+        self._crop = None
+    
+    @classmethod
+    def from_array(cls, mask, offset=(0, 0), frame_size=None):
+        return cls(encode_mask(mask, offset, frame_size))
+    
+    def __len__(self):
+        return len(self.blob)
+    
+    @property
+    def is_empty(self):
+        return self.bbox['width'] == 0 or self.bbox['height'] == 0
+    
+    def crop(self):
+        """Mask pixels (uint8, 0/255) within the bounding box"""
+        if self._crop is None:
+            width, height = self.bbox['width'], self.bbox['height']
+            bits = np.frombuffer(zlib.decompress(self.blob[HEADER.size:]), dtype=np.uint8)
+            crop = np.unpackbits(bits, count=width * height).reshape(height, width) * np.uint8(255)
+            crop.setflags(write=False)
+            self._crop = crop
+        return self._crop
+    
+    def to_array(self):
+        """Full-frame mask (uint8, 0/255)"""
+        frame = np.zeros((self.frame_size[1], self.frame_size[0]), dtype=np.uint8)
+        x, y = self.bbox['x'], self.bbox['y']
+        frame[y:y + self.bbox['height'], x:x + self.bbox['width']] = self.crop()
+        return frame
+    
+    def to_image(self, full_frame=True):
+        return Image.fromarray(self.to_array() if full_frame else self.crop(), 'L')
+    
+    def to_png(self, full_frame=False):
+        """1-bit PNG bytes, cropped to the bounding box unless full_frame"""
+        _, buffer = cv2.imencode('.png', self.to_array() if full_frame else self.crop(), [cv2.IMWRITE_PNG_BILEVEL, 1])
+        return buffer.tobytes()
@@ -0,0 +1,49 @@
+# apps/processing/masks.py
+import math
+from functools import lru_cache
+import numpy as np
+
+
+def radial_distance(size, center_x, center_y):
+    """Distance of every pixel from a center point (float32 to bound memory)"""
+    width, height = size
+    ys = np.arange(height, dtype=np.float32)[:, np.newaxis]
+    xs = np.arange(width, dtype=np.float32)[np.newaxis, :]
+    return np.hypot(xs - np.float32(center_x), ys - np.float32(center_y))
+
+
+# Falloffs up to this size are memoized; the cache then holds at most 4 x 16MB.
+# Larger frames are rare enough that recomputing beats pinning them in memory
+MAX_CACHED_PIXELS = 4 * 1000 * 1000
+
+
+def radial_falloff(size, strength=1.0, minimum=None):
+    """Vignette-style multiplier: 1 at the center, 1 - strength at the corners
+    
+    Distances are measured from (width // 2, height // 2) and normalized by
+    the distance to the corner. Memoized per size and strength up to
+    MAX_CACHED_PIXELS, so repeated vignettes cost a single multiply; the
+    returned float32 array may be shared and is read-only.
+    """
+    size = tuple(size)
+    if size[0] * size[1] <= MAX_CACHED_PIXELS:
+        return _cached_radial_falloff(size, strength, minimum)
+    return _radial_falloff(size, strength, minimum)
+
+
+def _radial_falloff(size, strength, minimum):
+    width, height = size
+    center_x, center_y = width // 2, height // 2
+    max_distance = max(math.hypot(center_x, center_y), 1)
+    
+    falloff = radial_distance(size, center_x, center_y)
+    falloff *= np.float32(-strength / max_distance)
+    falloff += np.float32(1)
+    if minimum is not None:
+        np.maximum(falloff, np.float32(minimum), out=falloff)
+    
+    falloff.setflags(write=False)
+    return falloff
+
+
+_cached_radial_falloff = lru_cache(maxsize=4)(_radial_falloff)
@@ -0,0 +1,140 @@
+# apps/processing/matte_store.py
+import glob
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from django.core.cache import cache
+import cv2
+
+from . import matting
+from .hashing import get_source_hash, settings_hash
+from .image_cache import open_image
+
+# Bump when matting changes output for the same model and resolution
+MATTE_VERSION = 1
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # 1GB
+
+
+class MatteStore:
+    """Background-removal alpha mattes persisted per source image
+    
+    A matte depends only on the source pixels, the matting model and the
+    matting resolution, so it is keyed by the source content hash plus a
+    hash of those and reused by every later edit of the photo: changing
+    the background style or color becomes a composite, not an inference.
+    Mattes are lossless grayscale PNGs under MATTE_CACHE_DIR; like the
+    RenderCache, the least recently used are evicted once their total
+    size exceeds MATTE_CACHE_MAX_BYTES.
+    """
+    
+    def __init__(self, matte_dir=None, max_bytes=None):
+        self.matte_dir = str(matte_dir or getattr(
+            settings, 'MATTE_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'mattes')
+        ))
+        self.max_bytes = max_bytes or getattr(settings, 'MATTE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        self.bytes_key = f"matte_store:bytes:{hashlib.md5(self.matte_dir.encode()).hexdigest()}"
+    
+    def model_version(self, quality=None):
+        return settings_hash({
+            'version': MATTE_VERSION,
+            'model': getattr(settings, 'BACKGROUND_REMOVAL_MODEL', matting.DEFAULT_MODEL),
+            'edge': matting.proxy_edge(quality),
+        })[:16]
+    
+    def path_for(self, source_hash, quality=None):
+        return os.path.join(self.matte_dir, source_hash[:2], f"{source_hash}_{self.model_version(quality)}.png")
+    
+    def get_alpha(self, source_path, quality=None, session=None):
+        """Alpha matte (HxW uint8) of a source file, computed on first request"""
+        path = self.path_for(get_source_hash(source_path), quality)
+        alpha = cv2.imread(path, cv2.IMREAD_GRAYSCALE) if os.path.exists(path) else None
+        if alpha is not None:
+            try:
+                os.utime(path)  # Mark as recently used
+            except FileNotFoundError:
+                pass
+            return alpha
+        
+        alpha = matting.predict_alpha(open_image(source_path), quality, session)
+        self.put(path, alpha)
+        return alpha
+    
+    def put(self, path, alpha):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so concurrent readers never see partial data
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            _, buffer = cv2.imencode('.png', alpha)
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(buffer.tobytes())
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        
+        try:
+            total = cache.incr(self.bytes_key, buffer.nbytes)
+        except ValueError:
+            total = None
+        if total is None or total > self.max_bytes:
+            self.evict()
+        return path
+    
+    def delete_source(self, source_path):
+        """Remove every matte of a source file, for all models and qualities"""
+        try:
+            source_hash = get_source_hash(source_path)
+        except FileNotFoundError:
+            return 0
+        
+        removed = 0
+        for path in glob.glob(os.path.join(self.matte_dir, source_hash[:2], f"{source_hash}_*.png")):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            # The running total is rebuilt by the next put's scan
+            cache.delete(self.bytes_key)
+        return removed
+    
+    def _entries(self):
+        """List (mtime, size, path) for every stored matte"""
+        entries = []
+        if not os.path.isdir(self.matte_dir):
+            return entries
+        for shard in os.scandir(self.matte_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+    
+    def evict(self):
+        """Remove least recently used mattes until under the size budget"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        
+        removed = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+        
+        cache.set(self.bytes_key, total, None)
+        return removed
@@ -0,0 +1,133 @@
+# apps/processing/matting.py
+import threading
+from functools import lru_cache
+from django.conf import settings
+import cv2
+import numpy as np
+from PIL import Image
+
+from .fast_decode import fit_size
+
+DEFAULT_MODEL = 'u2net'
+# Long edge of the image the matting model sees; None mattes at full resolution
+QUALITY_PRESETS = {
+    'fast': 512,
+    'balanced': 1024,
+    'full': None,
+}
+STRIP_ROWS = 512
+
+_session_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _new_session(model_name):
+    # Imported here so processes that never remove backgrounds do not load onnxruntime
+    import onnxruntime
+    from rembg import new_session
+    
+    options = onnxruntime.SessionOptions()
+    threads = getattr(settings, 'BACKGROUND_REMOVAL_THREADS', None)
+    if threads:
+        options.intra_op_num_threads = threads
+    return new_session(model_name, sess_opts=options)
+
+
+def get_session(model_name=None):
+    """The rembg model session, created once per process
+    
+    rembg.remove() without a session builds a new ONNX session (and
+    re-reads the model file) on every call.
+    """
+    model_name = model_name or getattr(settings, 'BACKGROUND_REMOVAL_MODEL', DEFAULT_MODEL)
+    with _session_lock:
+        return _new_session(model_name)
+
+
+def proxy_edge(quality=None):
+    """Matting resolution for a quality preset name or an explicit long edge"""
+    if quality is None:
+        quality = getattr(settings, 'BACKGROUND_REMOVAL_QUALITY', 'balanced')
+    if isinstance(quality, str) and quality.isdigit():
+        quality = int(quality)
+    if isinstance(quality, str):
+        if quality not in QUALITY_PRESETS:
+            raise ValueError(f"Unknown background removal quality: {quality}")
+        return QUALITY_PRESETS[quality]
+    return quality
+
+
+def guided_upsample(alpha, guide, radius=2, eps=1e-3):
+    """Upsample a low-resolution matte to the guide's size along the guide's edges
+    
+    Fast guided filter (He & Sun): the local linear model alpha ~ a * I + b
+    is fitted on the low-resolution grid, and only the coefficients are
+    upsampled, so full-resolution detail (hair, fine edges) comes from the
+    image itself. ``radius`` is in low-resolution pixels; ``eps`` trades
+    edge sharpness against copying texture into the matte.
+    """
+    height, width = guide.shape[:2]
+    small_height, small_width = alpha.shape[:2]
+    
+    guide_small = cv2.resize(guide, (small_width, small_height), interpolation=cv2.INTER_AREA)
+    guide_small = guide_small.astype(np.float32) / 255
+    matte = alpha.astype(np.float32) / 255
+    
+    ksize = (2 * radius + 1, 2 * radius + 1)
+    mean_guide = cv2.boxFilter(guide_small, -1, ksize)
+    mean_matte = cv2.boxFilter(matte, -1, ksize)
+    covariance = cv2.boxFilter(guide_small * matte, -1, ksize) - mean_guide * mean_matte
+    variance = cv2.boxFilter(guide_small * guide_small, -1, ksize) - mean_guide * mean_guide
+    
+    a = covariance / (variance + eps)
+    b = mean_matte - a * mean_guide
+    a = cv2.boxFilter(a, -1, ksize)
+    b = cv2.boxFilter(b, -1, ksize)
+    
+    # Coefficients are smooth, so bilinear upsampling loses nothing; evaluate in strips
+    # to keep the full-resolution float intermediates small
+    output = np.empty((height, width), dtype=np.uint8)
+    row_scale = small_height / height
+    for top in range(0, height, STRIP_ROWS):
+        bottom = min(top + STRIP_ROWS, height)
+        # Source rows covering this strip, with a row of margin for interpolation
+        src_top = max(0, int(top * row_scale) - 1)
+        src_bottom = min(small_height, int(np.ceil(bottom * row_scale)) + 2)
+        map_y = ((np.arange(top, bottom, dtype=np.float32) + 0.5) * row_scale - 0.5 - src_top)
+        map_x = (np.arange(width, dtype=np.float32) + 0.5) * (small_width / width) - 0.5
+        grid_x, grid_y = np.meshgrid(map_x, map_y)
+        strip_a = cv2.remap(a[src_top:src_bottom], grid_x, grid_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        strip_b = cv2.remap(b[src_top:src_bottom], grid_x, grid_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        
+        strip = strip_a * (guide[top:bottom].astype(np.float32) * (1 / 255)) + strip_b
+        output[top:bottom] = np.clip(strip * 255 + 0.5, 0, 255).astype(np.uint8)
+    return output
+
+
+def predict_alpha(image, quality=None, session=None):
+    """Foreground alpha (HxW uint8) for a PIL image, matted at the quality's resolution"""
+    image = image.convert('RGB')
+    session = session or get_session()
+    
+    edge = proxy_edge(quality)
+    if edge is None or max(image.size) <= edge:
+        return np.asarray(session.predict(image)[0].convert('L'))
+    
+    proxy = image.resize(fit_size(image.size, (edge, edge)), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    alpha = np.asarray(session.predict(proxy)[0].convert('L'))
+    guide = np.asarray(image.convert('L'))
+    return guided_upsample(alpha, guide)
+
+
+def cutout(image, alpha):
+    """RGBA image with the original colors and alpha, resized to fit if needed"""
+    if alpha.shape[:2] != (image.height, image.width):
+        alpha = cv2.resize(alpha, image.size, interpolation=cv2.INTER_LINEAR)
+    result = image.convert('RGB')
+    result.putalpha(Image.fromarray(alpha, 'L'))
+    return result
+
+
+def remove_background(image, quality=None, session=None):
+    """RGBA cutout of image: the original colors with the predicted alpha"""
+    return cutout(image, predict_alpha(image, quality, session))
@@ -1,60 +1,60 @@
 # apps/processing/optimized_engine.py
-from django.core.cache import cache
-from concurrent.futures import ThreadPoolExecutor
-import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 
+from apps.editor.cache import PhotoCache
+from .adjustments import AdjustmentPipeline
+from .image_cache import open_image
+from .proxies import find_proxy
+
 class OptimizedPhotoProcessor:
-    def __init__(self, image_path, max_preview_size=(800, 600)):
+    def __init__(self, image_path, max_preview_size=(800, 600), photo_id=None):
         self.image_path = image_path
-        self.max_preview_size = max_preview_size
+        self.max_preview_size = tuple(max_preview_size)
+        self.photo_id = photo_id
         self.cache = PhotoCache()
-        
+    
     def get_optimized_preview(self, settings):
-        """Get optimized preview with caching"""
+        """Get preview JPEG bytes with caching"""
+        cache_id = self.photo_id or self.image_path
+        cache_settings = dict(settings, preview_size=list(self.max_preview_size))
+        
         # Check cache first
-        cached_url = self.cache.get_preview(self.image_path, settings)
-        if cached_url:
-            return cached_url
+        cached_preview = self.cache.get_preview(cache_id, cache_settings)
+        if cached_preview:
+            return cached_preview
         
         # Generate preview
-        preview_url = self._generate_preview(settings)
+        preview = self._generate_preview(settings)
         
         # Cache result
-        self.cache.set_preview(self.image_path, settings, preview_url)
+        self.cache.set_preview(cache_id, cache_settings, preview)
         
-        return preview_url
+        return preview
+    
+    def _open_preview_source(self):
+        """Decoded smallest proxy that covers the preview size (shared, read-only)"""
+        proxy_path = find_proxy(self.photo_id, self.max_preview_size) if self.photo_id else None
+        return open_image(proxy_path or self.image_path)
     
     def _generate_preview(self, settings):
-        """Generate optimized preview image"""
-        with Image.open(self.image_path) as img:
-            # Resize for faster processing
-            img.thumbnail(self.max_preview_size, Image.Resampling.LANCZOS)
-            
-            # Apply effects
-            processed = self._apply_effects_optimized(img, settings)
-            
-            # Save preview
-            preview_buffer = io.BytesIO()
-            processed.save(preview_buffer, format='JPEG', quality=70, optimize=True)
-            
-            # Save to storage and return URL
-            # Implementation depends on your storage backend
-            return self._save_preview_to_storage(preview_buffer)
+        """Render preview JPEG bytes from the proxy pyramid"""
+        img = self._open_preview_source()
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        if img.width > self.max_preview_size[0] or img.height > self.max_preview_size[1]:
+            # contain() returns a new image; the decoded proxy is shared through the image cache
+            img = ImageOps.contain(img, self.max_preview_size, Image.Resampling.BILINEAR)
+        
+        # Apply effects
+        processed = self._apply_effects_optimized(img, settings)
+        
+        # Encode without optimize=True: the extra Huffman pass costs more than it saves here
+        preview_buffer = io.BytesIO()
+        processed.save(preview_buffer, format='JPEG', quality=70)
+        return preview_buffer.getvalue()
     
     def _apply_effects_optimized(self, image, settings):
         """Apply effects with optimizations"""
-        # Use numpy arrays for faster operations
-        img_array = np.array(image)
-        
-        # Apply brightness/contrast in one operation
-        if settings.get('brightness', 0) != 0 or settings.get('contrast', 0) != 0:
-            brightness = settings.get('brightness', 0) / 100.0
-            contrast = settings.get('contrast', 0) / 100.0 + 1.0
-            
-            img_array = img_array * contrast + brightness * 255
-            img_array = np.clip(img_array, 0, 255)
-        
-        return Image.fromarray(img_array.astype(np.uint8))
-
+        # Same fused single-pass adjustments as the full-resolution pipeline
+        return AdjustmentPipeline.from_settings(settings).apply(image)
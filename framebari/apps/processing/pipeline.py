@@ -0,0 +1,282 @@
+# apps/processing/pipeline.py
+from abc import ABC, abstractmethod
+import cv2
+import numpy as np
+from PIL import ImageStat
+
+from .adjustments import LUMA_WEIGHTS, AdjustmentPipeline
+from .curves import ToneCurve, apply_color_matrix
+from .engine import PhotoProcessor
+from .registry import get_background_engine, get_color_engine, get_filters_engine
+from .tiling import TiledExecutor
+
+# PhotoProcessor.replace_background styles; anything else is an AdvancedBackgroundEngine style
+SIMPLE_BACKGROUND_STYLES = ('solid', 'gradient', 'wave')
+
+class PointOp(ABC):
+    """A per-pixel operation on HxWx3 or HxWx4 uint8 arrays
+    
+    bind() sees the whole stage input once, for any frame statistics the
+    operation needs, and returns the kernel that is run on every tile.
+    """
+    label = 'point'
+    needs_stats = False
+    
+    @abstractmethod
+    def bind(self, image):
+        """The kernel (pixels -> pixels) for one stage input"""
+    
+    def fuse(self, other):
+        """A single op equivalent to self followed by other, or None"""
+        return None
+
+
+class AdjustOp(PointOp):
+    """Brightness/contrast/saturation/vibrance/exposure; contrast pivots on the frame mean"""
+    label = 'adjust'
+    needs_stats = True
+    
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+    
+    def bind(self, image):
+        mean_luma = float(np.dot(LUMA_WEIGHTS, ImageStat.Stat(image).mean[:3]))
+        return lambda pixels: self.pipeline.apply_array(pixels, mean_luma)
+
+
+class CurveOp(PointOp):
+    """A ToneCurve; consecutive curves compose into one table"""
+    
+    def __init__(self, curve, label):
+        self.curve = ToneCurve.coerce(curve)
+        self.label = label
+    
+    @classmethod
+    def blended(cls, curve, intensity, label):
+        """The curve mixed with the identity, the same as blending the result with its input"""
+        return cls(ToneCurve.coerce(curve).blend(intensity), label)
+    
+    def fuse(self, other):
+        if not isinstance(other, CurveOp):
+            return None
+        return CurveOp(self.curve.then(other.curve), f"{self.label}+{other.label}")
+    
+    def bind(self, image):
+        tables = self.curve.lut_tables(len(image.getbands()))
+        return lambda pixels: cv2.LUT(pixels, tables)
+
+
+class ColorMatrixOp(PointOp):
+    """3x3 color mix such as sepia, blended with its input by intensity"""
+    
+    def __init__(self, matrix, intensity, label):
+        self.matrix = np.asarray(matrix, dtype=np.float32)
+        self.intensity = intensity
+        self.label = label
+    
+    def bind(self, image):
+        matrix, intensity = self.matrix, self.intensity
+        
+        def kernel(pixels):
+            result = apply_color_matrix(pixels, matrix)
+            if intensity < 1.0:
+                result = cv2.addWeighted(pixels, 1 - intensity, result, intensity, 0)
+            return result
+        return kernel
+
+
+class Lut3DOp(PointOp):
+    """Non-separable 3D LUT, blended with its input by intensity"""
+    
+    def __init__(self, lut, intensity, label):
+        self.lut = lut
+        self.intensity = intensity
+        self.label = label
+    
+    def bind(self, image):
+        lut, intensity = self.lut, self.intensity
+        dense = lut.wants_dense(image.width * image.height)
+        
+        def kernel(pixels):
+            result = lut.apply(pixels, dense)
+            if intensity < 1.0:
+                result = cv2.addWeighted(pixels, 1 - intensity, result, intensity, 0)
+            return result
+        return kernel
+
+
+class PointStage:
+    """Consecutive point operations run as one kernel, tile by tile
+    
+    Every tile goes through all operations while it is hot in cache, and
+    only one output frame is allocated for the whole stage.
+    """
+    
+    def __init__(self, ops):
+        self.ops = []
+        for op in ops:
+            self.add(op)
+    
+    @property
+    def label(self):
+        return '[' + ', '.join(op.label for op in self.ops) + ']'
+    
+    def add(self, op):
+        fused = self.ops[-1].fuse(op) if self.ops else None
+        if fused is not None:
+            self.ops[-1] = fused
+        else:
+            self.ops.append(op)
+    
+    def run(self, image):
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        kernels = [op.bind(image) for op in self.ops]
+        
+        def kernel(pixels):
+            for op_kernel in kernels:
+                pixels = op_kernel(pixels)
+            return pixels
+        return TiledExecutor().map_array(image, kernel, mode=image.mode)
+
+
+class FilterStep:
+    """A filter with spatial extent or whole-frame statistics, run as is"""
+    
+    def __init__(self, filter_name, intensity=1.0):
+        self.filter_name = filter_name
+        self.intensity = intensity
+        self.label = f"filter:{filter_name}"
+    
+    def run(self, image):
+        return get_filters_engine().apply_filter(image, self.filter_name, self.intensity)
+
+
+class RemoveBackgroundStep:
+    label = 'remove_background'
+    
+    def __init__(self, quality=None, source_path=None):
+        self.quality = quality
+        # Edits never move pixels, so the source file's stored matte fits the edited image
+        self.source_path = source_path
+    
+    def run(self, image):
+        processor = PhotoProcessor.from_image(image, source_path=self.source_path)
+        return processor.remove_background(self.quality).working_image
+
+
+class ReplaceBackgroundStep:
+    def __init__(self, style, color='#0066FF', seed=None):
+        self.style = style
+        self.color = color
+        self.seed = seed
+        self.label = f"background:{style}"
+    
+    def run(self, image):
+        if self.style in SIMPLE_BACKGROUND_STYLES:
+            processor = PhotoProcessor.from_image(image)
+            return processor.replace_background(color=self.color, style=self.style).working_image
+        # Mask already applied by background removal
+        return get_background_engine().replace_background(image, None, self.style, seed=self.seed)
+
+
+class CompiledEdit:
+    def __init__(self, stages):
+        self.stages = stages
+    
+    def describe(self):
+        return [stage.label for stage in self.stages]
+    
+    def run(self, image):
+        for stage in self.stages:
+            image = stage.run(image)
+        return image
+
+
+class EditGraph:
+    """Ordered edit operations, compiled into fused stages before running
+    
+    Adjacent point operations (enhancements, LUTs, curve and matrix
+    filters and their intensity blends) are fused into one tiled kernel;
+    operations with spatial extent break the chain and run on their own.
+    """
+    
+    def __init__(self, nodes=None):
+        self.nodes = list(nodes or [])
+    
+    @classmethod
+    def from_settings(cls, settings, default_background_style='blue_default', source_path=None):
+        """Build a graph from a batch/API settings dict
+        
+        ``source_path`` is the original file being edited, so background
+        removal can reuse its stored matte.
+        """
+        nodes = []
+        
+        adjustments = AdjustmentPipeline.from_settings(settings)
+        if not adjustments.is_identity:
+            nodes.append(AdjustOp(adjustments))
+        
+        if settings.get('color_grade'):
+            node = cls._grade_node(settings['color_grade'], settings.get('grade_intensity', 1.0))
+            if node is not None:
+                nodes.append(node)
+        
+        if settings.get('filter'):
+            nodes.append(cls._filter_node(settings['filter'], settings.get('filter_intensity', 1.0)))
+        
+        if settings.get('replace_background'):
+            nodes.append(RemoveBackgroundStep(settings.get('background_quality'), source_path))
+            nodes.append(ReplaceBackgroundStep(
+                settings.get('background_style') or default_background_style,
+                settings.get('background_color', '#0066FF'),
+                settings.get('background_seed')
+            ))
+        
+        return cls(nodes)
+    
+    @classmethod
+    def from_editing_settings(cls, editing_settings, replace_background=False, source_path=None):
+        """Build a graph from a photo's saved EditingSettings"""
+        settings = {key: getattr(editing_settings, key) for key in AdjustmentPipeline.SETTING_KEYS}
+        settings.update(
+            replace_background=replace_background,
+            background_color=editing_settings.background_color,
+            background_style=editing_settings.background_style,
+        )
+        return cls.from_settings(settings, default_background_style='solid', source_path=source_path)
+    
+    @staticmethod
+    def _grade_node(lut_name, intensity):
+        lut = get_color_engine().get_lut3d(lut_name)
+        if lut is None:
+            return None
+        label = f"grade:{lut_name}"
+        if lut.curves is not None:
+            return CurveOp.blended(lut.curves, intensity, label)
+        return Lut3DOp(lut, intensity, label)
+    
+    @staticmethod
+    def _filter_node(filter_name, intensity):
+        label = f"filter:{filter_name}"
+        engine = get_filters_engine()
+        curve = engine.curve_filters.get(filter_name)
+        if curve is not None:
+            return CurveOp.blended(curve, intensity, label)
+        if filter_name == 'sepia':
+            return ColorMatrixOp(engine.SEPIA_MATRIX, intensity, label)
+        return FilterStep(filter_name, intensity)
+    
+    def compile(self):
+        stages = []
+        for node in self.nodes:
+            if isinstance(node, PointOp):
+                previous = stages[-1] if stages else None
+                # Ops that need frame statistics must see a materialized input
+                if isinstance(previous, PointStage) and not node.needs_stats:
+                    previous.add(node)
+                else:
+                    stages.append(PointStage([node]))
+            else:
+                stages.append(node)
+        return CompiledEdit(stages)
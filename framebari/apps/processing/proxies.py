@@ -0,0 +1,76 @@
+# apps/processing/proxies.py
+import os
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+
+DEFAULT_PROXY_LEVELS = (256, 800, 1600)
+
+
+def get_proxy_levels():
+    """Long-edge sizes of the preview proxy pyramid, smallest first"""
+    return tuple(sorted(getattr(settings, 'PREVIEW_PROXY_LEVELS', DEFAULT_PROXY_LEVELS)))
+
+
+def proxy_name(photo_id, level):
+    """Storage name of one pyramid level"""
+    return f"proxies/{photo_id}_{level}.jpg"
+
+
+def build_proxy_pyramid(image, photo_id, quality=85):
+    """Save downscaled JPEG proxies of an already decoded image
+    
+    Levels are produced largest first and each one is resampled from the
+    previous level rather than the original, so the full-resolution frame
+    is only read once. Returns a {level: storage name} dict.
+    """
+    source = image.convert('RGB') if image.mode != 'RGB' else image
+    names = {}
+    
+    for level in sorted(get_proxy_levels(), reverse=True):
+        proxy = source.copy()
+        # reducing_gap lets PIL use a cheap box reduce before the final resample
+        proxy.thumbnail((level, level), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        
+        name = proxy_name(photo_id, level)
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        proxy.save(path, format='JPEG', quality=quality)
+        
+        names[level] = name
+        source = proxy
+    
+    return names
+
+
+def select_proxy_level(max_size, levels=None):
+    """Smallest pyramid level that covers the requested size"""
+    levels = levels or get_proxy_levels()
+    target = max(max_size)
+    for level in levels:
+        if level >= target:
+            return level
+    return levels[-1]
+
+
+def find_proxy(photo_id, max_size):
+    """Path of the best existing proxy for a preview size, or None"""
+    levels = get_proxy_levels()
+    preferred = select_proxy_level(max_size, levels)
+    
+    # Fall back to larger levels, then smaller ones, if the preferred one is missing
+    candidates = [level for level in levels if level >= preferred]
+    candidates += [level for level in reversed(levels) if level < preferred]
+    for level in candidates:
+        path = default_storage.path(proxy_name(photo_id, level))
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def delete_proxies(photo_id):
+    """Remove every pyramid level for a photo"""
+    for level in get_proxy_levels():
+        name = proxy_name(photo_id, level)
+        if default_storage.exists(name):
+            default_storage.delete(name)
@@ -0,0 +1,36 @@
+# apps/processing/registry.py
+from .advanced_filters import AdvancedFiltersEngine
+from .background_engine import AdvancedBackgroundEngine
+from .color_grading import ColorGradingEngine
+from .lazy import LazyRegistry
+
+# Engines are stateless between calls, so one instance per process is shared by all tasks
+engines = LazyRegistry({
+    'color_grading': ColorGradingEngine,
+    'filters': AdvancedFiltersEngine,
+    'background': AdvancedBackgroundEngine,
+})
+
+
+def get_color_engine():
+    return engines['color_grading']
+
+
+def get_filters_engine():
+    return engines['filters']
+
+
+def get_background_engine():
+    return engines['background']
+
+
+def warm_up():
+    """Build the shared engines and their lookup tables ahead of the first task
+    
+    Connected to Celery's worker_process_init so a fresh worker process
+    does not pay the build cost on its first request.
+    """
+    engines.warm()
+    color_engine = get_color_engine()
+    for lut_name in list(color_engine.luts) + list(color_engine.cube_files):
+        color_engine.get_lut3d(lut_name)
@@ -0,0 +1,170 @@
+# apps/processing/segmentation.py
+import threading
+from django.conf import settings
+import cv2
+import numpy as np
+
+FACE_CASCADE_FILE = 'haarcascade_frontalface_default.xml'
+DEFAULT_PROXY_EDGE = 640
+# Context around a subject's box that GrabCut samples its background model from
+CONTEXT_MARGIN = 0.5
+# Boundary refinement tiles span this many band radii, and at least MIN_BAND_TILE pixels
+BAND_TILE_RADII = 3
+MIN_BAND_TILE = 32
+
+_local = threading.local()
+
+
+def get_face_cascade():
+    """The frontal face cascade, loaded once per thread
+    
+    Parsing the cascade XML costs more than detecting on a proxy-sized
+    image, and a CascadeClassifier must not be shared between threads.
+    """
+    cascade = getattr(_local, 'face_cascade', None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + FACE_CASCADE_FILE)
+        _local.face_cascade = cascade
+    return cascade
+
+
+def _expand(rect, margin, size):
+    """rect (x, y, w, h) grown by margin * its larger side, clamped to size; as (x1, y1, x2, y2)"""
+    x, y, w, h = rect
+    pad = int(round(max(w, h) * margin))
+    return max(0, x - pad), max(0, y - pad), min(size[0], x + w + pad), min(size[1], y + h + pad)
+
+
+class ProxySegmenter:
+    """GrabCut subject masks computed on a downscaled proxy
+    
+    Faces are detected and GrabCut runs its full iterations on a proxy
+    whose long edge is SEGMENTATION_PROXY_EDGE, cropped to each subject
+    and its surroundings. The proxy mask is then upsampled and only a
+    band around its boundary, a few proxy pixels wide, is re-solved at full
+    resolution in small tiles along the contour; everything inside or
+    outside the band keeps its label.
+    """
+    
+    def __init__(self, proxy_edge=None, iterations=5, refine_iterations=2):
+        self.proxy_edge = proxy_edge or getattr(settings, 'SEGMENTATION_PROXY_EDGE', DEFAULT_PROXY_EDGE)
+        self.iterations = iterations
+        self.refine_iterations = refine_iterations
+        self.refined_pixels = 0
+    
+    def proxy_scale(self, shape):
+        return min(1.0, self.proxy_edge / max(shape[:2]))
+    
+    def detect_faces(self, bgr):
+        """Face boxes (x, y, w, h) in full-resolution coordinates"""
+        scale = self.proxy_scale(bgr.shape)
+        proxy = bgr if scale == 1.0 else cv2.resize(bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(proxy, cv2.COLOR_BGR2GRAY)
+        faces = get_face_cascade().detectMultiScale(gray, 1.3, 5)
+        return [tuple(int(round(v / scale)) for v in face) for face in faces]
+    
+    def segment_rect(self, bgr, rect):
+        """0/255 mask (full frame) of the subject GrabCut finds inside rect (x, y, w, h)"""
+        height, width = bgr.shape[:2]
+        mask = np.zeros((height, width), np.uint8)
+        x1, y1, x2, y2 = _expand(rect, CONTEXT_MARGIN, (width, height))
+        roi = bgr[y1:y2, x1:x2]
+        local_rect = (rect[0] - x1, rect[1] - y1, rect[2], rect[3])
+        
+        scale = self.proxy_scale(bgr.shape)
+        if scale == 1.0:
+            mask[y1:y2, x1:x2] = self._grabcut_rect(roi, local_rect, self.iterations)
+            return mask
+        
+        # Coarse solve on the downscaled crop
+        proxy = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        proxy_rect = tuple(max(1, int(round(v * scale))) for v in local_rect)
+        coarse = self._grabcut_rect(proxy, proxy_rect, self.iterations)
+        if not coarse.any():
+            return mask
+        
+        upsampled = cv2.resize(coarse, (roi.shape[1], roi.shape[0]), interpolation=cv2.INTER_LINEAR)
+        mask[y1:y2, x1:x2] = self._refine_band(roi, upsampled >= 128, local_rect, scale)
+        return mask
+    
+    def _grabcut_rect(self, image, rect, iterations):
+        """Foreground (0/255) of GrabCut initialised from rect"""
+        labels = np.zeros(image.shape[:2], np.uint8)
+        bgd_model = np.zeros((1, 65), np.float64)
+        fgd_model = np.zeros((1, 65), np.float64)
+        try:
+            cv2.grabCut(image, labels, rect, bgd_model, fgd_model, iterations, cv2.GC_INIT_WITH_RECT)
+        except cv2.error:
+            # Degenerate rect (e.g. covering the whole crop): nothing to separate
+            return labels
+        return np.where((labels == cv2.GC_FGD) | (labels == cv2.GC_PR_FGD), 255, 0).astype(np.uint8)
+    
+    def _refine_band(self, image, foreground, rect, scale):
+        """Re-solve only the pixels near the upsampled boundary at full resolution"""
+        # One proxy pixel spans 1/scale full-resolution pixels; cover two of them
+        radius = max(2, int(np.ceil(2 / scale)))
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * radius + 1, 2 * radius + 1))
+        foreground = foreground.astype(np.uint8)
+        inner = cv2.erode(foreground, kernel).astype(bool)
+        outer = cv2.dilate(foreground, kernel).astype(bool)
+        
+        labels = np.full(image.shape[:2], cv2.GC_BGD, np.uint8)
+        labels[outer] = cv2.GC_PR_BGD
+        labels[foreground.astype(bool)] = cv2.GC_PR_FGD
+        labels[inner] = cv2.GC_FGD
+        # As with the rect initialisation, nothing outside the subject's box is foreground
+        x, y, w, h = rect
+        outside = np.ones(image.shape[:2], bool)
+        outside[y:y + h, x:x + w] = False
+        labels[outside] = cv2.GC_BGD
+        
+        band = (labels == cv2.GC_PR_BGD) | (labels == cv2.GC_PR_FGD)
+        self.refined_pixels = 0
+        if band.any() and self.refine_iterations:
+            labels = self._solve_band_tiles(image, labels, band, radius)
+        
+        return np.where((labels == cv2.GC_FGD) | (labels == cv2.GC_PR_FGD), 255, 0).astype(np.uint8)
+    
+    def _solve_band_tiles(self, image, labels, band, radius):
+        """GrabCut on small tiles strung along the band, each with a ring of definite labels
+        
+        The band's bounding box would take in the whole subject interior,
+        costing about as much as a full-resolution solve; tiles only cover
+        the boundary. Each tile learns its own color models from its
+        surroundings and keeps the labels of its own cell.
+        """
+        tile = max(MIN_BAND_TILE, BAND_TILE_RADII * radius)
+        # Enough context for neighbouring tiles to agree along their shared edges
+        halo = max(2, radius // 2)
+        rows, cols = np.nonzero(band)
+        solved = labels.copy()
+        height, width = labels.shape
+        
+        for top in range(rows.min(), rows.max() + 1, tile):
+            for left in range(cols.min(), cols.max() + 1, tile):
+                bottom, right = min(top + tile, height), min(left + tile, width)
+                if not band[top:bottom, left:right].any():
+                    continue
+                
+                y1, x1 = max(0, top - halo), max(0, left - halo)
+                y2, x2 = min(height, bottom + halo), min(width, right + halo)
+                window = labels[y1:y2, x1:x2].copy()
+                foreground = (window == cv2.GC_FGD) | (window == cv2.GC_PR_FGD)
+                if foreground.all() or not foreground.any():
+                    # GrabCut needs samples of both classes
+                    continue
+                
+                bgd_model = np.zeros((1, 65), np.float64)
+                fgd_model = np.zeros((1, 65), np.float64)
+                cv2.grabCut(
+                    np.ascontiguousarray(image[y1:y2, x1:x2]), window, None,
+                    bgd_model, fgd_model, self.refine_iterations, cv2.GC_INIT_WITH_MASK
+                )
+                self.refined_pixels += window.size
+                solved[top:bottom, left:right] = window[top - y1:bottom - y1, left - x1:right - x1]
+        
+        return solved
+    
+    def segment_faces(self, bgr):
+        """(bbox, mask) for every detected face"""
+        return [(face, self.segment_rect(bgr, face)) for face in self.detect_faces(bgr)]
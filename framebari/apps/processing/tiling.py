@@ -0,0 +1,267 @@
+# apps/processing/tiling.py
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+import numpy as np
+from PIL import Image
+
+DEFAULT_TILE_SIZE = 1024
+DEFAULT_MIN_PIXELS = 16 * 1000 * 1000  # Below ~16MP whole-frame processing is cheap enough
+DEFAULT_MAX_WORKERS = 4
+ACTIVE_JOBS_KEY = 'processing:active_jobs'
+# A worker killed mid-job never decrements; the count lapses this long after the last change
+ACTIVE_JOBS_TTL = 15 * 60
+COPY_ROWS = 256
+
+
+def has_shared_cache():
+    """Whether the default cache is visible to every worker process
+    
+    The local-memory default is private to each process, so a job counter
+    kept there only ever sees the current process's own jobs.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def parallel_workers():
+    """Tile workers available to the current job
+    
+    PROCESSING_PARALLEL_WORKERS pins the count per Celery worker process.
+    Left unset with a shared cache, the host's cores are split between the
+    jobs currently inside processing_job(), so a lone job on an idle queue
+    uses them all. Without one, each process gets an equal share of the
+    cores across CELERY_WORKER_CONCURRENCY processes, at most
+    DEFAULT_MAX_WORKERS.
+    """
+    configured = getattr(settings, 'PROCESSING_PARALLEL_WORKERS', None)
+    if configured:
+        return configured
+    
+    cores = os.cpu_count() or 1
+    if not has_shared_cache():
+        concurrency = getattr(settings, 'CELERY_WORKER_CONCURRENCY', None) or 1
+        return max(1, min(DEFAULT_MAX_WORKERS, cores // concurrency))
+    
+    active_jobs = cache.get(ACTIVE_JOBS_KEY) or 1
+    return max(1, cores // max(1, active_jobs))
+
+
+@contextmanager
+def processing_job():
+    """Count a running processing job for parallel_workers()
+    
+    Usable as a decorator: ``@processing_job()``. Only counts when the
+    cache is shared between worker processes.
+    """
+    if not has_shared_cache():
+        yield
+        return
+    
+    cache.add(ACTIVE_JOBS_KEY, 0, timeout=ACTIVE_JOBS_TTL)
+    try:
+        cache.incr(ACTIVE_JOBS_KEY)
+        cache.touch(ACTIVE_JOBS_KEY, ACTIVE_JOBS_TTL)
+    except ValueError:
+        # Evicted or expired between add() and incr()
+        cache.set(ACTIVE_JOBS_KEY, 1, timeout=ACTIVE_JOBS_TTL)
+    try:
+        yield
+    finally:
+        try:
+            if cache.decr(ACTIVE_JOBS_KEY) < 0:
+                cache.set(ACTIVE_JOBS_KEY, 0, timeout=ACTIVE_JOBS_TTL)
+            else:
+                cache.touch(ACTIVE_JOBS_KEY, ACTIVE_JOBS_TTL)
+        except ValueError:
+            pass
+
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def process_pool_size():
+    """Workers in the per-process tile pool: the most any one job may be given"""
+    return getattr(settings, 'PROCESSING_PARALLEL_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_process_pool():
+    """The per-process tile worker pool, created on first use
+    
+    Sized once and never replaced, since other threads may be submitting
+    tiles to it; each job bounds its own share with bounded_map(). Workers
+    are spawned rather than forked (Celery workers run threads, and
+    forking those is unsafe), and only as tiles need them.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=process_pool_size(), mp_context=multiprocessing.get_context('spawn')
+            )
+        return _process_pool
+
+
+def bounded_map(executor, func, items, limit):
+    """executor.map(func, items) with at most limit calls in flight, results in order"""
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= limit:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _run_shared_tile(spec):
+    """Worker-side: run one tile from shared source memory into shared output memory"""
+    func, args, source_name, output_name, shape, box, padded = spec
+    # Pool workers share the parent's resource tracker, and the parent unlinks the blocks
+    source = shared_memory.SharedMemory(name=source_name)
+    output = shared_memory.SharedMemory(name=output_name)
+    try:
+        src = np.ndarray(shape, dtype=np.uint8, buffer=source.buf)
+        dst = np.ndarray(shape, dtype=np.uint8, buffer=output.buf)
+        result = func(src[padded[1]:padded[3], padded[0]:padded[2]], *args)
+        dst[box[1]:box[3], box[0]:box[2]] = result[
+            box[1] - padded[1]:box[3] - padded[1],
+            box[0] - padded[0]:box[2] - padded[0],
+        ]
+        del src, dst, result
+    finally:
+        source.close()
+        output.close()
+    return box
+
+
+def iter_tiles(size, tile_size, halo=0):
+    """Yield (box, padded_box) pairs covering an image of the given size
+    
+    ``box`` is the region a tile writes to the output; ``padded_box`` grows
+    it by ``halo`` pixels on every side, clamped to the image, so
+    neighbourhood filters see the same pixels they would on the full frame.
+    """
+    width, height = size
+    for top in range(0, height, tile_size):
+        for left in range(0, width, tile_size):
+            right, bottom = min(left + tile_size, width), min(top + tile_size, height)
+            padded = (
+                max(0, left - halo), max(0, top - halo),
+                min(width, right + halo), min(height, bottom + halo),
+            )
+            yield (left, top, right, bottom), padded
+
+
+class TiledExecutor:
+    """Run point operations and bounded-radius filters tile by tile
+    
+    Only the source and the output are ever full-frame; each worker holds
+    one padded tile plus whatever intermediates the operation allocates
+    for it, so peak memory no longer scales with the number of full-frame
+    copies an operation makes. Tiles are independent and run on a thread
+    pool (PIL and OpenCV release the GIL for pixel work), or with
+    map_shared() on a process pool reading and writing shared memory.
+    
+    Operations must be position-independent and must not depend on global
+    image statistics; compute those once up front and close over them.
+    """
+    
+    def __init__(self, tile_size=None, max_workers=None, min_pixels=None, backend=None):
+        self.tile_size = tile_size or getattr(settings, 'PROCESSING_TILE_SIZE', DEFAULT_TILE_SIZE)
+        self.max_workers = max_workers or parallel_workers()
+        if min_pixels is None:
+            min_pixels = getattr(settings, 'PROCESSING_TILE_MIN_PIXELS', DEFAULT_MIN_PIXELS)
+        self.min_pixels = min_pixels
+        self.backend = backend or getattr(settings, 'PROCESSING_PARALLEL_BACKEND', 'thread')
+    
+    def should_tile(self, image):
+        return image.width * image.height > self.min_pixels
+    
+    def map(self, image, func, halo=0):
+        """Apply func (PIL image -> same-sized PIL image) over tiles of image
+        
+        ``halo`` must be at least the operation's radius of influence for the
+        result to match a whole-frame run. Small images are passed straight
+        to func.
+        """
+        if not self.should_tile(image):
+            return func(image)
+        
+        # Decode before fanning out so workers only ever read pixels
+        image.load()
+        
+        def run(tile):
+            box, padded = tile
+            result = func(image.crop(padded))
+            if padded != box:
+                result = result.crop((
+                    box[0] - padded[0], box[1] - padded[1],
+                    box[2] - padded[0], box[3] - padded[1],
+                ))
+            return box, result
+        
+        output = None
+        tiles = iter_tiles(image.size, self.tile_size, halo)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for box, result in executor.map(run, tiles):
+                if output is None:
+                    output = Image.new(result.mode, image.size)
+                output.paste(result, box[:2])
+        return output
+    
+    def map_array(self, image, func, halo=0, mode=None):
+        """Like map(), for functions on HxWxC uint8 arrays"""
+        def run(tile):
+            return Image.fromarray(func(np.asarray(tile)), mode)
+        return self.map(image, run, halo)
+    
+    def map_shared(self, image, func, args=(), halo=0):
+        """Run func(pixels, *args) over tiles in worker processes
+        
+        For operations that hold the GIL. func must be a picklable
+        module-level function returning an array shaped like its input.
+        The source frame and the output live in shared memory, so tiles are
+        never pickled. Falls back to threads unless the process backend is
+        configured and more than one worker is available.
+        """
+        if self.backend != 'process' or self.max_workers < 2 or not self.should_tile(image):
+            return self.map_array(image, lambda pixels: func(pixels, *args), halo, image.mode)
+        
+        image.load()
+        shape = (image.height, image.width) + np.asarray(image.crop((0, 0, 1, 1))).shape[2:]
+        nbytes = int(np.prod(shape))
+        source = shared_memory.SharedMemory(create=True, size=nbytes)
+        output = shared_memory.SharedMemory(create=True, size=nbytes)
+        try:
+            src = np.ndarray(shape, dtype=np.uint8, buffer=source.buf)
+            # Copy in row strips to avoid a second full-frame temporary
+            for top in range(0, image.height, COPY_ROWS):
+                bottom = min(top + COPY_ROWS, image.height)
+                src[top:bottom] = np.asarray(image.crop((0, top, image.width, bottom)))
+            
+            specs = [
+                (func, args, source.name, output.name, shape, box, padded)
+                for box, padded in iter_tiles(image.size, self.tile_size, halo)
+            ]
+            list(bounded_map(get_process_pool(), _run_shared_tile, specs, self.max_workers))
+            
+            dst = np.ndarray(shape, dtype=np.uint8, buffer=output.buf)
+            return Image.fromarray(dst.copy(), image.mode)
+        finally:
+            # Views into the blocks must be released before they can be closed
+            src = dst = None
+            for block in (source, output):
+                block.close()
+                block.unlink()
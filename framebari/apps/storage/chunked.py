@@ -0,0 +1,236 @@
+# apps/storage/chunked.py
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB; S3 multipart parts must be at least 5MB
+MIN_CHUNK_SIZE = 5 * 1024 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024  # Stays under DATA_UPLOAD_MAX_MEMORY_SIZE
+MAX_TRACKED_HASHERS = 256
+RANGE_BLOCK_SIZE = 64 * 1024
+# Out-of-order chunks held by all hashers in a process; past it a hasher gives up and
+# its file is hashed at commit instead
+MAX_PENDING_BYTES = 128 * 1024 * 1024
+
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def chunk_count(total_size, chunk_size):
+    return max(1, -(-total_size // chunk_size))
+
+
+def chunk_span(index, total_size, chunk_size):
+    """(offset, size) of chunk index within a file of total_size"""
+    offset = index * chunk_size
+    return offset, min(chunk_size, total_size - offset)
+
+
+def write_at(path, offset, data):
+    """Write data at offset in an existing file; concurrent writers to disjoint ranges are safe"""
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+    finally:
+        os.close(fd)
+
+
+def read_at(path, offset, size):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.pread(fd, size, offset)
+    finally:
+        os.close(fd)
+
+
+class RangeReader(io.RawIOBase):
+    """Seekable read-only file over read_range(offset, size), fetched in blocks on demand
+    
+    Lets header parsers follow offsets anywhere in a stored file (a TIFF
+    keeps its IFD after the pixel data) while only the blocks they touch
+    are read, one ranged request each.
+    """
+    
+    def __init__(self, read_range, size, block_size=RANGE_BLOCK_SIZE, max_blocks=16):
+        super().__init__()
+        self.read_range = read_range
+        self.size = size
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+        self.bytes_fetched = 0
+        self._position = 0
+        self._blocks = OrderedDict()
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self._position
+    
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("Negative seek position")
+        self._position = offset
+        return offset
+    
+    def _block(self, index):
+        block = self._blocks.get(index)
+        if block is None:
+            offset = index * self.block_size
+            block = self.read_range(offset, min(self.block_size, self.size - offset))
+            self.bytes_fetched += len(block)
+            self._blocks[index] = block
+            while len(self._blocks) > self.max_blocks:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(index)
+        return block
+    
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view) and self._position < self.size:
+            index, start = divmod(self._position, self.block_size)
+            data = self._block(index)[start:start + len(view) - filled]
+            if not data:
+                break
+            view[filled:filled + len(data)] = data
+            filled += len(data)
+            self._position += len(data)
+        return filled
+
+
+class PendingBudget:
+    """Bytes of out-of-order chunks that hashers in this process may hold, shared by all of them"""
+    
+    def __init__(self, max_bytes=MAX_PENDING_BYTES):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._lock = threading.Lock()
+    
+    def acquire(self, nbytes):
+        with self._lock:
+            if self.used_bytes + nbytes > self.max_bytes:
+                return False
+            self.used_bytes += nbytes
+            return True
+    
+    def release(self, nbytes):
+        with self._lock:
+            self.used_bytes = max(0, self.used_bytes - nbytes)
+
+
+pending_budget = PendingBudget()
+
+
+class PrefixHasher:
+    """Whole-file SHA-256 advanced as chunks arrive, in any order
+    
+    SHA-256 is sequential, so the digest covers the contiguous prefix of
+    received chunks. A chunk that arrives ahead of the prefix is hashed
+    once the gap fills: read back with read_chunk(index) when the bytes
+    are already in their final place, or held in memory until then when
+    they cannot be read back (S3 parts). Held chunks count against a
+    process-wide PendingBudget; when it is spent the hasher gives up and
+    never completes.
+    """
+    
+    def __init__(self, chunk_count, read_chunk=None, budget=None):
+        self.chunk_count = chunk_count
+        self.read_chunk = read_chunk
+        self.budget = budget or pending_budget
+        self.next_index = 0
+        self._sha256 = hashlib.sha256()
+        self._received = set()
+        self._pending = {}
+        self._pending_bytes = 0
+        self.abandoned = False
+        self._lock = threading.Lock()
+    
+    def add(self, index, data):
+        """Record chunk index; call only once its bytes are fully written"""
+        with self._lock:
+            if self.abandoned or index < self.next_index or index in self._received:
+                return
+            self._received.add(index)
+            if index != self.next_index:
+                if self.read_chunk is None:
+                    if self.budget.acquire(len(data)):
+                        self._pending[index] = bytes(data)
+                        self._pending_bytes += len(data)
+                    else:
+                        self._abandon()
+                return
+            
+            self._sha256.update(data)
+            self.next_index += 1
+            while self.next_index in self._received:
+                data = self._pending.pop(self.next_index, None)
+                if data is not None:
+                    self._pending_bytes -= len(data)
+                    self.budget.release(len(data))
+                else:
+                    data = self.read_chunk(self.next_index)
+                self._sha256.update(data)
+                self.next_index += 1
+    
+    def abandon(self):
+        """Stop hashing and give held chunks back to the budget"""
+        with self._lock:
+            self._abandon()
+    
+    def _abandon(self):
+        self.abandoned = True
+        self._pending.clear()
+        self.budget.release(self._pending_bytes)
+        self._pending_bytes = 0
+    
+    @property
+    def complete(self):
+        return not self.abandoned and self.next_index >= self.chunk_count
+    
+    def hexdigest(self):
+        if not self.complete:
+            raise ValueError("Not every chunk has been hashed")
+        return self._sha256.hexdigest()
+
+
+def get_hasher(session_id, chunk_count, read_chunk=None):
+    """The process-local hasher for an upload session
+    
+    Hashers live in the process that received the chunks; a commit that
+    lands on another worker finds none (or an incomplete one) and hashes
+    the stored file instead.
+    """
+    with _hashers_lock:
+        hasher = _hashers.get(session_id)
+        if hasher is None:
+            hasher = _hashers[session_id] = PrefixHasher(chunk_count, read_chunk)
+            while len(_hashers) > MAX_TRACKED_HASHERS:
+                _, evicted = _hashers.popitem(last=False)
+                evicted.abandon()
+        else:
+            _hashers.move_to_end(session_id)
+        return hasher
+
+
+def discard_hasher(session_id):
+    """Stop tracking a session's hasher, releasing anything it held; returns it"""
+    with _hashers_lock:
+        hasher = _hashers.pop(session_id, None)
+    if hasher is not None and not hasher.complete:
+        hasher.abandon()
+    return hasher
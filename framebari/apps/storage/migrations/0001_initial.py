@@ -0,0 +1,194 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:05
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageProvider',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('provider_type', models.CharField(choices=[('local', 'Local Storage'), ('s3', 'Amazon S3'), ('gcs', 'Google Cloud Storage'), ('azure', 'Azure Blob Storage'), ('cloudinary', 'Cloudinary')], max_length=20)),
+                ('is_active', models.BooleanField(default=True)),
+                ('is_primary', models.BooleanField(default=False)),
+                ('config', models.JSONField(default=dict)),
+                ('max_file_size', models.BigIntegerField(default=52428800)),
+                ('allowed_formats', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'storage_providers',
+            },
+        ),
+        migrations.CreateModel(
+            name='StorageStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('total_files', models.PositiveIntegerField(default=0)),
+                ('total_storage_used', models.BigIntegerField(default=0)),
+                ('files_uploaded', models.PositiveIntegerField(default=0)),
+                ('files_deleted', models.PositiveIntegerField(default=0)),
+                ('total_bandwidth', models.BigIntegerField(default=0)),
+                ('upload_bandwidth', models.BigIntegerField(default=0)),
+                ('download_bandwidth', models.BigIntegerField(default=0)),
+                ('avg_upload_time', models.FloatField(default=0)),
+                ('avg_download_time', models.FloatField(default=0)),
+                ('error_rate', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'storage_statistics',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FileStorage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_filename', models.CharField(max_length=255)),
+                ('stored_filename', models.CharField(max_length=255)),
+                ('file_path', models.TextField()),
+                ('file_size', models.BigIntegerField()),
+                ('content_type', models.CharField(max_length=100)),
+                ('file_hash', models.CharField(db_index=True, max_length=64)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('metadata', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('uploading', 'Uploading'), ('stored', 'Stored'), ('failed', 'Failed'), ('deleted', 'Deleted')], default='pending', max_length=20)),
+                ('upload_progress', models.PositiveIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('accessed_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='storage.storageprovider')),
+            ],
+            options={
+                'db_table': 'file_storage',
+            },
+        ),
+        migrations.CreateModel(
+            name='StorageQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_quota', models.BigIntegerField(default=1073741824)),
+                ('used_storage', models.BigIntegerField(default=0)),
+                ('max_files', models.PositiveIntegerField(default=1000)),
+                ('file_count', models.PositiveIntegerField(default=0)),
+                ('monthly_bandwidth_limit', models.BigIntegerField(default=10737418240)),
+                ('monthly_bandwidth_used', models.BigIntegerField(default=0)),
+                ('bandwidth_reset_date', models.DateField(default=django.utils.timezone.now)),
+                ('auto_cleanup_enabled', models.BooleanField(default=True)),
+                ('cleanup_after_days', models.PositiveIntegerField(default=30)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'storage_quotas',
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('original_filename', models.CharField(max_length=255)),
+                ('stored_filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=100)),
+                ('total_size', models.BigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('file_path', models.TextField(blank=True)),
+                ('upload_id', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('committed', 'Committed'), ('aborted', 'Aborted'), ('failed', 'Failed')], default='active', max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField()),
+                ('file_storage', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='storage.filestorage')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='storage.storageprovider')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'upload_sessions',
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='storage.uploadsession')),
+            ],
+            options={
+                'db_table': 'upload_chunks',
+                'ordering': ['index'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FileVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version_number', models.PositiveIntegerField()),
+                ('stored_filename', models.CharField(max_length=255)),
+                ('file_path', models.TextField()),
+                ('file_size', models.BigIntegerField()),
+                ('file_hash', models.CharField(max_length=64)),
+                ('processing_settings', models.JSONField(default=dict)),
+                ('created_by_operation', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('file_storage', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='storage.filestorage')),
+            ],
+            options={
+                'db_table': 'file_versions',
+                'ordering': ['-version_number'],
+                'unique_together': {('file_storage', 'version_number')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='filestorage',
+            index=models.Index(fields=['user', 'status'], name='file_storag_user_id_2e2711_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filestorage',
+            index=models.Index(fields=['file_hash'], name='file_storag_file_ha_e19e17_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filestorage',
+            index=models.Index(fields=['created_at'], name='file_storag_created_391493_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filestorage',
+            index=models.Index(fields=['expires_at'], name='file_storag_expires_94b236_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['user', 'status'], name='upload_sess_user_id_73c91f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['expires_at'], name='upload_sess_expires_aebd1e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='uploadchunk',
+            unique_together={('session', 'index')},
+        ),
+    ]
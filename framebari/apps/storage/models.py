@@ -6,6 +6,9 @@ from django.utils import timezone
 from datetime import timedelta
 import os
 import hashlib
+import uuid
+
+from .chunked import chunk_count, chunk_span
 
 class StorageProvider(models.Model):
     PROVIDER_TYPES = [
@@ -194,6 +197,81 @@ class FileVersion(models.Model):
         unique_together = ['file_storage', 'version_number']
         ordering = ['-version_number']
 
+class UploadSession(models.Model):
+    """A resumable chunked upload, written straight to its final storage location"""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('committed', 'Committed'),
+        ('aborted', 'Aborted'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    provider = models.ForeignKey(StorageProvider, on_delete=models.CASCADE)
+    
+    # File information
+    original_filename = models.CharField(max_length=255)
+    stored_filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    total_size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    
+    # Where chunks are written: the final local path or S3 key, and the S3 multipart upload id
+    file_path = models.TextField(blank=True)
+    upload_id = models.CharField(max_length=255, blank=True)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    file_storage = models.ForeignKey(FileStorage, null=True, blank=True, on_delete=models.SET_NULL)
+    error_message = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.original_filename} ({self.get_status_display()})"
+    
+    @property
+    def chunk_count(self):
+        return chunk_count(self.total_size, self.chunk_size)
+    
+    def chunk_span(self, index):
+        """(offset, size) of a chunk within the file"""
+        return chunk_span(index, self.total_size, self.chunk_size)
+    
+    def received_indices(self):
+        return list(self.chunks.values_list('index', flat=True))
+    
+    def missing_indices(self):
+        received = set(self.received_indices())
+        return [index for index in range(self.chunk_count) if index not in received]
+    
+    @property
+    def is_expired(self):
+        return timezone.now() > self.expires_at
+    
+    class Meta:
+        db_table = 'upload_sessions'
+        indexes = [
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['expires_at']),
+        ]
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    etag = models.CharField(max_length=255, blank=True)  # S3 part ETag
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'upload_chunks'
+        unique_together = ['session', 'index']
+        ordering = ['index']
+
 class StorageStatistics(models.Model):
     date = models.DateField(unique=True)
     
@@ -4,14 +4,19 @@ import hashlib
 import mimetypes
 from datetime import timedelta
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.utils import timezone
-from PIL import Image
 import boto3
 from botocore.exceptions import ClientError
 import requests
 
-from .models import StorageProvider, FileStorage, StorageQuota, FileVersion
+from apps.editor.models import Photo
+from apps.editor.security import SecurityValidator
+from apps.editor.tasks import process_photo_async
+from . import chunked
+from .models import StorageProvider, FileStorage, StorageQuota, FileVersion, UploadSession, UploadChunk
 
 class StorageService:
     def __init__(self):
@@ -26,19 +31,7 @@ class StorageService:
         """Upload file to storage provider"""
         try:
             # Get storage provider
-            if provider_name:
-                provider = StorageProvider.objects.get(
-                    name=provider_name, 
-                    is_active=True
-                )
-            else:
-                provider = StorageProvider.objects.filter(
-                    is_primary=True, 
-                    is_active=True
-                ).first()
-                
-            if not provider:
-                raise StorageError("No active storage provider found")
+            provider = self.get_provider(provider_name)
             
             # Check quota
             quota = self.get_or_create_quota(user)
@@ -49,6 +42,12 @@ class StorageService:
             if not self.is_allowed_file_type(file, provider):
                 raise StorageError("File type not allowed")
             
+            # Inspect images from their headers before storing: pixel limits are enforced
+            # here, and the metadata is reused below instead of reopening the stored file
+            image_metadata = None
+            if file.content_type and file.content_type.startswith('image/'):
+                image_metadata = self.inspect_image(file)
+            
             # Generate file hash
             file_hash = self.calculate_file_hash(file)
             
@@ -87,12 +86,11 @@ class StorageService:
             file_storage.status = 'stored'
             file_storage.upload_progress = 100
             
-            # Extract metadata for images
-            if file.content_type and file.content_type.startswith('image/'):
-                metadata = self.extract_image_metadata(file)
-                file_storage.width = metadata.get('width')
-                file_storage.height = metadata.get('height')
-                file_storage.metadata = metadata
+            # Metadata for images, from the inspection above
+            if image_metadata is not None:
+                file_storage.width = image_metadata.width
+                file_storage.height = image_metadata.height
+                file_storage.metadata = image_metadata.as_dict()
             
             file_storage.save()
             
@@ -108,6 +106,240 @@ class StorageService:
                 file_storage.save()
             raise StorageError(f"Upload failed: {str(e)}")
     
+    def get_provider(self, provider_name=None):
+        """The named active provider, or the primary one"""
+        if provider_name:
+            provider = StorageProvider.objects.filter(name=provider_name, is_active=True).first()
+        else:
+            provider = StorageProvider.objects.filter(is_primary=True, is_active=True).first()
+        
+        if not provider:
+            raise StorageError("No active storage provider found")
+        return provider
+    
+    def start_upload_session(self, user, filename, total_size, content_type=None, provider_name=None, chunk_size=None):
+        """Open a resumable chunked upload
+        
+        The destination is reserved up front (a preallocated local file or
+        an S3 multipart upload), so chunks are written straight into place
+        in any order and nothing is copied at commit.
+        """
+        provider = self.get_provider(provider_name)
+        if total_size <= 0:
+            raise UploadSessionError("Upload is empty")
+        if total_size > provider.max_file_size:
+            raise UploadSessionError(f"File too large. Maximum size is {provider.max_file_size // (1024*1024)}MB")
+        
+        quota = self.get_or_create_quota(user)
+        if not quota.can_upload_file(total_size):
+            raise QuotaExceededError("Storage quota exceeded")
+        
+        content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if provider.allowed_formats and content_type not in provider.allowed_formats:
+            raise UploadSessionError("File type not allowed")
+        
+        chunk_size = int(chunk_size or getattr(settings, 'UPLOAD_CHUNK_SIZE', chunked.DEFAULT_CHUNK_SIZE))
+        chunk_size = min(max(chunk_size, chunked.MIN_CHUNK_SIZE), chunked.MAX_CHUNK_SIZE)
+        
+        session = UploadSession(
+            user=user,
+            provider=provider,
+            original_filename=os.path.basename(filename),
+            content_type=content_type,
+            total_size=total_size,
+            chunk_size=chunk_size,
+            expires_at=timezone.now() + timedelta(hours=getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', 24)),
+        )
+        session.stored_filename = self.generate_filename(session.original_filename, session.id.hex)
+        
+        storage_provider = self.providers[provider.provider_type]
+        session.file_path, session.upload_id = storage_provider.begin_multipart(
+            session.stored_filename, total_size, content_type, provider.config
+        )
+        session.save()
+        return session
+    
+    def append_chunk(self, session, index, data, checksum=None):
+        """Write one chunk in place and fold it into the running file hash
+        
+        Chunks may arrive in parallel and in any order. Re-sending a chunk
+        that already arrived (a retry after a dropped response) is a no-op,
+        so clients can resume by sending whatever status reports missing.
+        """
+        if session.status != 'active' or session.is_expired:
+            raise UploadSessionError("Upload session is not active")
+        if not 0 <= index < session.chunk_count:
+            raise UploadSessionError(f"Chunk index out of range: {index}")
+        
+        offset, size = session.chunk_span(index)
+        if len(data) != size:
+            raise UploadSessionError(f"Chunk {index} must be {size} bytes, got {len(data)}")
+        
+        digest = hashlib.sha256(data).hexdigest()
+        if checksum and checksum.lower() != digest:
+            raise UploadSessionError(f"Checksum mismatch for chunk {index}")
+        
+        existing = session.chunks.filter(index=index).first()
+        if existing is not None:
+            if existing.sha256 != digest:
+                raise UploadSessionError(f"Chunk {index} was already received with different content")
+            return existing
+        
+        provider = session.provider
+        storage_provider = self.providers[provider.provider_type]
+        etag = storage_provider.write_part(session.file_path, session.upload_id, index, offset, data, provider.config)
+        # Only once the bytes are in place, since the hasher may read them back
+        self.get_session_hasher(session, storage_provider).add(index, data)
+        
+        chunk, _ = UploadChunk.objects.get_or_create(
+            session=session,
+            index=index,
+            defaults={'size': size, 'sha256': digest, 'etag': etag or ''}
+        )
+        return chunk
+    
+    def get_session_hasher(self, session, storage_provider):
+        read_chunk = None
+        if storage_provider.supports_partial_reads:
+            config = session.provider.config
+            read_chunk = lambda index: storage_provider.read_range(session.file_path, *session.chunk_span(index), config)
+        return chunked.get_hasher(session.pk, session.chunk_count, read_chunk)
+    
+    def commit_upload_session(self, session):
+        """Finish a fully received session and record it as a stored file"""
+        if session.status == 'committed':
+            return session.file_storage
+        if session.status != 'active':
+            raise UploadSessionError("Upload session is not active")
+        
+        missing = session.missing_indices()
+        if missing:
+            raise UploadSessionError(f"{len(missing)} chunks missing, first is {missing[0]}")
+        
+        provider = session.provider
+        storage_provider = self.providers[provider.provider_type]
+        try:
+            parts = list(session.chunks.values_list('index', 'etag'))
+            file_path = storage_provider.complete_multipart(session.file_path, session.upload_id, parts, provider.config)
+            session.file_path = file_path
+            file_hash = self.get_session_file_hash(session, storage_provider)
+            
+            # Images are inspected from their headers, wherever in the file those are
+            # (a TIFF's IFD usually follows the pixel data); bombs are rejected here
+            image_metadata = None
+            if session.content_type.startswith('image/'):
+                image_metadata = self.inspect_image(chunked.RangeReader(
+                    lambda offset, size: storage_provider.read_range(file_path, offset, size, provider.config),
+                    session.total_size
+                ))
+            
+            quota = self.get_or_create_quota(session.user)
+            existing_file = FileStorage.objects.filter(
+                user=session.user,
+                file_hash=file_hash,
+                status='stored'
+            ).first()
+            
+            if existing_file:
+                storage_provider.delete(file_path, provider.config)
+                existing_file.mark_accessed()
+                file_storage = existing_file
+            else:
+                if not quota.can_upload_file(session.total_size):
+                    raise QuotaExceededError("Storage quota exceeded")
+                
+                file_storage = FileStorage.objects.create(
+                    user=session.user,
+                    provider=provider,
+                    original_filename=session.original_filename,
+                    stored_filename=session.stored_filename,
+                    file_path=file_path,
+                    file_size=session.total_size,
+                    content_type=session.content_type,
+                    file_hash=file_hash,
+                    status='stored',
+                    upload_progress=100,
+                    width=image_metadata.width if image_metadata else None,
+                    height=image_metadata.height if image_metadata else None,
+                    metadata=image_metadata.as_dict() if image_metadata else {},
+                )
+                quota.update_usage(session.total_size, 1)
+        except Exception as e:
+            self._close_session(session, storage_provider, 'failed', str(e))
+            if isinstance(e, StorageError):
+                raise
+            raise StorageError(f"Upload failed: {str(e)}")
+        
+        session.status = 'committed'
+        session.file_storage = file_storage
+        session.save(update_fields=['status', 'file_storage', 'file_path', 'updated_at'])
+        return file_storage
+    
+    def create_photo(self, file_storage, project):
+        """Add a committed image to an editor project and queue its processing
+        
+        Local files already live in default_storage, so the Photo points at
+        the stored file rather than a copy of it.
+        """
+        if file_storage.provider.provider_type != 'local':
+            raise StorageError("Photos can only be created from local storage")
+        if not (file_storage.width and file_storage.height):
+            raise StorageError("Only images can be added to a project")
+        
+        photo = Photo.objects.create(
+            project=project,
+            original_image=file_storage.file_path,
+            width=file_storage.width,
+            height=file_storage.height,
+            file_size=file_storage.file_size,
+            format=file_storage.metadata.get('format', ''),
+        )
+        transaction.on_commit(lambda: process_photo_async.delay(str(photo.id)))
+        return photo
+    
+    def get_session_file_hash(self, session, storage_provider):
+        """SHA-256 of a completed session's file, from the running hash when it is complete"""
+        hasher = chunked.discard_hasher(session.pk)
+        if hasher is not None and hasher.complete:
+            return hasher.hexdigest()
+        
+        # Chunks were received by another worker process: hash the stored file once
+        config = session.provider.config
+        hash_sha256 = hashlib.sha256()
+        for index in range(session.chunk_count):
+            hash_sha256.update(storage_provider.read_range(session.file_path, *session.chunk_span(index), config))
+        return hash_sha256.hexdigest()
+    
+    def abort_upload_session(self, session):
+        """Drop an unfinished session and whatever it has written"""
+        if session.status != 'active':
+            return
+        storage_provider = self.providers[session.provider.provider_type]
+        self._close_session(session, storage_provider, 'aborted')
+    
+    def _close_session(self, session, storage_provider, status, error_message=''):
+        chunked.discard_hasher(session.pk)
+        try:
+            storage_provider.abort_multipart(session.file_path, session.upload_id, session.provider.config)
+        except Exception as e:
+            error_message = error_message or str(e)
+        session.status = status
+        session.error_message = error_message
+        session.save(update_fields=['status', 'error_message', 'updated_at'])
+    
+    def cleanup_expired_upload_sessions(self):
+        """Abort upload sessions that were never committed"""
+        expired_sessions = UploadSession.objects.filter(
+            expires_at__lt=timezone.now(),
+            status='active'
+        ).select_related('provider')
+        
+        for session in expired_sessions:
+            try:
+                self.abort_upload_session(session)
+            except Exception as e:
+                print(f"Failed to abort upload session {session.id}: {e}")
+    
     def delete_file(self, file_storage):
         """Delete file from storage"""
         try:
@@ -234,24 +466,18 @@ class StorageService:
         timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
         return f"{timestamp}_{file_hash[:8]}{ext}"
     
+    def inspect_image(self, file):
+        """Validated ImageMetadata for an image upload, read from its headers"""
+        try:
+            return SecurityValidator().inspect_upload(file)
+        except ValidationError as e:
+            raise StorageError(' '.join(e.messages))
+    
     def extract_image_metadata(self, file):
-        """Extract metadata from image file"""
+        """Extract metadata from image file headers"""
         try:
-            with Image.open(file) as img:
-                metadata = {
-                    'width': img.width,
-                    'height': img.height,
-                    'format': img.format,
-                    'mode': img.mode,
-                }
-                
-                # Extract EXIF data if available
-                if hasattr(img, '_getexif') and img._getexif():
-                    exif = img._getexif()
-                    metadata['exif'] = {k: v for k, v in exif.items() if isinstance(v, (str, int, float))}
-                
-                return metadata
-        except Exception:
+            return SecurityValidator().inspect_upload(file).as_dict()
+        except ValidationError:
             return {}
     
     def is_allowed_file_type(self, file, provider):
@@ -264,12 +490,35 @@ class StorageService:
 
 class LocalStorageProvider:
     """Local file system storage provider"""
+    supports_partial_reads = True
     
     def upload(self, file, filename, config):
         """Upload file to local storage"""
         file_path = default_storage.save(filename, file)
         return file_path
     
+    def begin_multipart(self, filename, total_size, content_type, config):
+        """Reserve the final file at its full size, so chunks are written in place"""
+        file_path = default_storage.get_available_name(filename)
+        full_path = default_storage.path(file_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'xb') as destination:
+            destination.truncate(total_size)
+        return file_path, ''
+    
+    def write_part(self, file_path, upload_id, index, offset, data, config):
+        chunked.write_at(default_storage.path(file_path), offset, data)
+        return ''
+    
+    def read_range(self, file_path, offset, size, config):
+        return chunked.read_at(default_storage.path(file_path), offset, size)
+    
+    def complete_multipart(self, file_path, upload_id, parts, config):
+        return file_path
+    
+    def abort_multipart(self, file_path, upload_id, config):
+        self.delete(file_path, config)
+    
     def delete(self, file_path, config):
         """Delete file from local storage"""
         if default_storage.exists(file_path):
@@ -281,6 +530,8 @@ class LocalStorageProvider:
 
 class S3StorageProvider:
     """Amazon S3 storage provider"""
+    # Parts of an unfinished multipart upload cannot be read back
+    supports_partial_reads = False
     
     def __init__(self):
         self.s3_client = None
@@ -308,6 +559,66 @@ class S3StorageProvider:
         except ClientError as e:
             raise StorageError(f"S3 upload failed: {e}")
     
+    def begin_multipart(self, filename, total_size, content_type, config):
+        """Start a multipart upload; each chunk becomes one part"""
+        s3_client = self._get_client(config)
+        key = f"{config.get('prefix', '')}{filename}"
+        
+        try:
+            response = s3_client.create_multipart_upload(
+                Bucket=config['bucket_name'], Key=key, ContentType=content_type
+            )
+            return key, response['UploadId']
+        except ClientError as e:
+            raise StorageError(f"S3 upload failed: {e}")
+    
+    def write_part(self, file_path, upload_id, index, offset, data, config):
+        s3_client = self._get_client(config)
+        
+        try:
+            response = s3_client.upload_part(
+                Bucket=config['bucket_name'], Key=file_path, UploadId=upload_id,
+                PartNumber=index + 1, Body=data
+            )
+            return response['ETag']
+        except ClientError as e:
+            raise StorageError(f"S3 part upload failed: {e}")
+    
+    def read_range(self, file_path, offset, size, config):
+        s3_client = self._get_client(config)
+        
+        try:
+            response = s3_client.get_object(
+                Bucket=config['bucket_name'], Key=file_path,
+                Range=f"bytes={offset}-{offset + size - 1}"
+            )
+            return response['Body'].read()
+        except ClientError as e:
+            raise StorageError(f"S3 read failed: {e}")
+    
+    def complete_multipart(self, file_path, upload_id, parts, config):
+        s3_client = self._get_client(config)
+        
+        try:
+            s3_client.complete_multipart_upload(
+                Bucket=config['bucket_name'], Key=file_path, UploadId=upload_id,
+                MultipartUpload={'Parts': [
+                    {'ETag': etag, 'PartNumber': index + 1} for index, etag in sorted(parts)
+                ]}
+            )
+            return file_path
+        except ClientError as e:
+            raise StorageError(f"S3 upload failed: {e}")
+    
+    def abort_multipart(self, file_path, upload_id, config):
+        """Abort an unfinished upload, or delete the object if it was already completed"""
+        s3_client = self._get_client(config)
+        
+        try:
+            s3_client.abort_multipart_upload(Bucket=config['bucket_name'], Key=file_path, UploadId=upload_id)
+        except ClientError:
+            self.delete(file_path, config)
+    
     def delete(self, file_path, config):
         """Delete file from S3"""
         s3_client = self._get_client(config)
@@ -345,6 +656,9 @@ class GCSStorageProvider:
     
     def get_url(self, file_path, config, expires_in=3600):
         raise NotImplementedError("GCS provider not implemented")
+    
+    def begin_multipart(self, filename, total_size, content_type, config):
+        raise NotImplementedError("GCS provider not implemented")
 
 class AzureStorageProvider:
     """Azure Blob Storage provider"""
@@ -358,6 +672,9 @@ class AzureStorageProvider:
     
     def get_url(self, file_path, config, expires_in=3600):
         raise NotImplementedError("Azure provider not implemented")
+    
+    def begin_multipart(self, filename, total_size, content_type, config):
+        raise NotImplementedError("Azure provider not implemented")
 
 class StorageError(Exception):
     """General storage error"""
@@ -366,3 +683,7 @@ class StorageError(Exception):
 class QuotaExceededError(StorageError):
     """Storage quota exceeded error"""
     pass
+
+class UploadSessionError(StorageError):
+    """Chunked upload session error"""
+    pass
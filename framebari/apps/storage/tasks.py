@@ -11,6 +11,12 @@ def cleanup_expired_files():
     storage_service = StorageService()
     storage_service.cleanup_expired_files()
 
+@shared_task
+def cleanup_expired_upload_sessions():
+    """Abort chunked uploads that were started but never committed"""
+    storage_service = StorageService()
+    storage_service.cleanup_expired_upload_sessions()
+
 @shared_task
 def auto_cleanup_user_files():
     """Auto cleanup old files for users with auto cleanup enabled"""
@@ -7,6 +7,11 @@ app_name = 'storage'
 urlpatterns = [
     path('', views.storage_dashboard, name='dashboard'),
     path('upload/', views.upload_file, name='upload'),
+    path('uploads/', views.start_upload, name='start_upload'),
+    path('uploads/<uuid:session_id>/', views.upload_status, name='upload_status'),
+    path('uploads/<uuid:session_id>/chunks/<int:index>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:session_id>/commit/', views.commit_upload, name='commit_upload'),
+    path('uploads/<uuid:session_id>/abort/', views.abort_upload, name='abort_upload'),
     path('files/<uuid:file_id>/', views.file_details, name='file_details'),
     path('files/<uuid:file_id>/download/', views.download_file, name='download'),
     path('files/<uuid:file_id>/delete/', views.delete_file, name='delete'),
@@ -3,13 +3,14 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from django.core.paginator import Paginator
 from django.db.models import Sum, Count
 import json
 
-from .models import FileStorage, StorageQuota, StorageProvider
-from .services import StorageService, StorageError, QuotaExceededError
+from apps.editor.models import Project
+from .models import FileStorage, StorageQuota, StorageProvider, UploadSession
+from .services import StorageService, StorageError, QuotaExceededError, UploadSessionError
 
 @login_required
 def storage_dashboard(request):
@@ -227,3 +228,170 @@ def storage_providers(request):
     ]
     
     return JsonResponse({'providers': data})
+
+def _upload_session_state(session):
+    """What a client needs to resume a chunked upload"""
+    received = session.received_indices()
+    received_set = set(received)
+    return {
+        'session_id': str(session.id),
+        'status': session.status,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'received': received,
+        'missing': [index for index in range(session.chunk_count) if index not in received_set],
+        'bytes_received': sum(session.chunk_span(index)[1] for index in received),
+        'expires_at': session.expires_at.isoformat(),
+    }
+
+@csrf_exempt
+@login_required
+@require_POST
+def start_upload(request):
+    """Open a resumable chunked upload session
+    
+    Body: JSON with filename, size and optionally content_type, provider
+    and chunk_size. Chunks are then PUT to the chunk endpoint, in parallel
+    and in any order, and the session is committed once all have arrived.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+        session = StorageService().start_upload_session(
+            request.user,
+            data['filename'],
+            int(data['size']),
+            content_type=data.get('content_type'),
+            provider_name=data.get('provider'),
+            chunk_size=data.get('chunk_size'),
+        )
+        return JsonResponse({'success': True, **_upload_session_state(session)}, status=201)
+        
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'error': 'filename and size are required'
+        }, status=400)
+        
+    except QuotaExceededError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Storage quota exceeded',
+            'error_type': 'quota_exceeded'
+        }, status=413)
+        
+    except StorageError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+@csrf_exempt
+@login_required
+@require_http_methods(['PUT', 'POST'])
+def upload_chunk(request, session_id, index):
+    """Append one chunk; the raw request body is the chunk
+    
+    An optional X-Chunk-SHA256 header is checked against the received
+    bytes. Re-sending a chunk that already arrived succeeds without
+    writing it again.
+    """
+    session = get_object_or_404(UploadSession.objects.select_related('provider'), id=session_id, user=request.user)
+    
+    try:
+        StorageService().append_chunk(session, index, request.body, request.headers.get('X-Chunk-SHA256'))
+        return JsonResponse({
+            'success': True,
+            'index': index,
+            'received_chunks': session.chunks.count(),
+            'chunk_count': session.chunk_count,
+        })
+        
+    except UploadSessionError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=409)
+        
+    except StorageError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=502)
+
+@login_required
+@require_GET
+def upload_status(request, session_id):
+    """Received and missing chunks, for resuming after a dropped connection"""
+    session = get_object_or_404(UploadSession, id=session_id, user=request.user)
+    return JsonResponse({'success': True, **_upload_session_state(session)})
+
+@csrf_exempt
+@login_required
+@require_POST
+def commit_upload(request, session_id):
+    """Finish a chunked upload once every chunk has arrived
+    
+    Body: optional JSON with project_id; the committed image is then added
+    to that editor project as a Photo and queued for processing.
+    """
+    session = get_object_or_404(UploadSession.objects.select_related('provider'), id=session_id, user=request.user)
+    
+    project = None
+    if request.content_type == 'application/json':
+        try:
+            project_id = json.loads(request.body).get('project_id')
+        except (ValueError, AttributeError):
+            return JsonResponse({
+                'success': False,
+                'error': 'Invalid JSON body'
+            }, status=400)
+        if project_id:
+            project = get_object_or_404(Project, id=project_id, user=request.user)
+    
+    try:
+        service = StorageService()
+        file_storage = service.commit_upload_session(session)
+        data = {
+            'success': True,
+            'file_id': str(file_storage.id),
+            'filename': file_storage.original_filename,
+            'size': file_storage.file_size,
+            'file_hash': file_storage.file_hash,
+            'url': file_storage.url,
+        }
+        if project is not None:
+            photo = service.create_photo(file_storage, project)
+            data.update({
+                'photo_id': str(photo.id),
+                'photo_url': photo.original_image.url,
+            })
+        return JsonResponse(data)
+        
+    except QuotaExceededError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Storage quota exceeded',
+            'error_type': 'quota_exceeded'
+        }, status=413)
+        
+    except UploadSessionError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+            **_upload_session_state(session)
+        }, status=409)
+        
+    except StorageError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+
+@csrf_exempt
+@login_required
+@require_POST
+def abort_upload(request, session_id):
+    """Discard an unfinished chunked upload"""
+    session = get_object_or_404(UploadSession.objects.select_related('provider'), id=session_id, user=request.user)
+    StorageService().abort_upload_session(session)
+    return JsonResponse({'success': True})
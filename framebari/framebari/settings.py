@@ -66,7 +66,7 @@ LOCAL_APPS = [
     'apps.editor',
     'apps.pwa',
     # 'apps.processing',
-    # 'apps.storage',
+    'apps.storage',
     # 'apps.api'
 ]
 
@@ -220,8 +220,63 @@ FILE_UPLOAD_PERMISSIONS = 0o644
 # Photo Processing Settings
 MAX_IMAGE_SIZE = (4000, 4000)  # Max dimensions
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_UPLOAD_PIXELS = 50 * 1000 * 1000  # Checked from the file headers before anything is decoded
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Resumable uploads; clamped to 5-16MB (S3 part minimum, request body limit)
+UPLOAD_SESSION_TTL_HOURS = 24  # Uncommitted chunked uploads are aborted after this
 ALLOWED_IMAGE_FORMATS = ['JPEG', 'PNG', 'WEBP', 'TIFF']
 
+# Render cache (encoded outputs keyed by source hash + settings)
+RENDER_CACHE_DIR = MEDIA_ROOT / 'render_cache'
+RENDER_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
+
+# Preview proxy pyramid (long edge in pixels), generated once at upload
+PREVIEW_PROXY_LEVELS = (256, 800, 1600)
+
+# Per-worker LRU of decoded source images (bytes of decoded pixels)
+PROCESSING_DECODED_CACHE_BYTES = 512 * 1024 * 1024  # 512MB
+
+# Extra color grading looks: .cube files here are available by file name
+COLOR_GRADING_LUT_DIR = BASE_DIR / 'luts'
+
+# Tiled execution of point operations and filters on large images
+PROCESSING_TILE_SIZE = 1024  # Tile edge in pixels
+PROCESSING_TILE_MIN_PIXELS = 16 * 1000 * 1000  # Smaller images are processed whole
+
+# Tile workers per Celery worker process. None splits the host's cores between running
+# jobs when CACHES is shared (e.g. Redis), so a single job on an idle queue uses all of
+# them; with the per-process default cache it is min(4, cores // CELERY_WORKER_CONCURRENCY)
+PROCESSING_PARALLEL_WORKERS = None
+PROCESSING_PARALLEL_BACKEND = 'thread'  # 'process': shared-memory process pool for GIL-bound work
+
+# AI subject detection: one DETR model per worker process, concurrent requests batched
+AI_DETECTION_MODEL = 'facebook/detr-resnet-50'
+AI_DETECTION_BACKEND = 'torch'  # 'torch' (fp32), 'int8' (dynamic quantization) or 'onnx' (ONNX Runtime)
+AI_DETECTION_INPUT_SIZE = None  # Shortest edge fed to the model; None keeps DETR's 800
+AI_DETECTION_ONNX_DIR = BASE_DIR / 'models'  # Exported ONNX graphs
+AI_DETECTION_SAMPLE_DIR = BASE_DIR / 'detection_samples'  # benchmark_detection images + annotations.json
+AI_DETECTION_BATCH_SIZE = 8
+AI_DETECTION_BATCH_WAIT_MS = 20  # How long a request waits for others to join its batch
+AI_DETECTION_BATCH_TIMEOUT = 30  # Seconds before a request gives up on its batch and runs alone
+AI_DETECTION_THREADS = None  # torch intra-op threads; None keeps torch's default (one per core)
+AI_DETECTION_INTEROP_THREADS = None
+AI_DETECTION_PRELOAD = False  # Load the model when the worker process starts
+
+# Background removal: rembg model (one session per worker process) and matting resolution,
+# 'fast' (512px), 'balanced' (1024px) or 'full'; the alpha is upsampled with a guided filter
+BACKGROUND_REMOVAL_MODEL = 'u2net'
+BACKGROUND_REMOVAL_QUALITY = 'balanced'
+BACKGROUND_REMOVAL_THREADS = None  # ONNX Runtime intra-op threads; None uses every core
+MATTE_CACHE_DIR = MEDIA_ROOT / 'mattes'  # Alpha mattes per source hash and model version
+MATTE_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1GB; least recently used mattes are evicted
+# Procedural background styles rendered at canonical sizes and resampled per photo
+BACKGROUND_TEMPLATE_CACHE_BYTES = 256 * 1024 * 1024  # 256MB
+
+# Subjects kept per photo by contour-based detection, largest first
+SUBJECT_DETECTION_MAX_SUBJECTS = 20
+
+# Face detection and GrabCut run on a proxy with this long edge, refined at full resolution
+SEGMENTATION_PROXY_EDGE = 640
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # EMAIL_HOST = 'smtp.gmail.com'
@@ -10,7 +10,7 @@ urlpatterns = [
     path('editor/', include('apps.editor.urls')),
     path('pwa/', include('apps.pwa.urls')),
     # path('api/', include('apps.api.urls')),
-    # path('storage/', include('apps.storage.urls')),
+    path('storage/', include('apps.storage.urls')),
 ]
 
 if settings.DEBUG:
@@ -336,12 +336,30 @@ class PhotoEditor {
             this.isProcessing = true;
             this.progressTracker.show('Generating preview...');
             
-            const response = await API.post(`/editor/${this.photoId}/preview/`, {
-                settings: this.settings
+            // Stored photos answer with JPEG bytes rendered from the proxy pyramid
+            const response = await fetch(`/editor/${this.photoId}/preview/`, {
+                method: 'POST',
+                headers: { ...API.defaultHeaders },
+                body: JSON.stringify({
+                    settings: this.settings,
+                    width: this.canvas.width,
+                    height: this.canvas.height
+                })
             });
+            const contentType = response.headers.get('content-type') || '';
             
-            if (response.success) {
-                await this.loadPreviewImage(response.preview_url);
+            if (contentType.startsWith('image/')) {
+                const blob = await response.blob();
+                if (this.previewObjectUrl) {
+                    URL.revokeObjectURL(this.previewObjectUrl);
+                }
+                this.previewObjectUrl = URL.createObjectURL(blob);
+                await this.loadPreviewImage(this.previewObjectUrl);
+            } else {
+                const data = await response.json();
+                if (data.success) {
+                    await this.loadPreviewImage(data.preview_url);
+                }
             }
         } catch (error) {
             console.error('Preview generation failed:', error);
@@ -364,7 +382,7 @@ class PhotoEditor {
             };
             
             img.onerror = reject;
-            img.src = url + '?t=' + Date.now();
+            img.src = url.startsWith('blob:') ? url : url + '?t=' + Date.now();
         });
     }
     
@@ -0,0 +1,138 @@
+# tests/test_cache.py
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+import os
+import shutil
+import tempfile
+import time
+
+from apps.editor.cache import PhotoCache, RenderCache
+from apps.processing.registry import get_color_engine
+from apps.processing.hashing import calculate_file_hash, get_source_hash, settings_hash
+
+class RenderCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache_dir = tempfile.mkdtemp()
+        self.render_cache = RenderCache(cache_dir=self.cache_dir, max_bytes=1000)
+    
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+    
+    def test_settings_hash_is_canonical(self):
+        """Key order and integral floats do not change the hash"""
+        first = settings_hash({'brightness': 10, 'lut': {'name': 'vintage', 'intensity': 1.0}})
+        second = settings_hash({'lut': {'intensity': 1, 'name': 'vintage'}, 'brightness': 10.0})
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, settings_hash({'brightness': 11, 'lut': {'name': 'vintage', 'intensity': 1}}))
+    
+    def test_key_depends_on_source_and_output(self):
+        """Keys change with the source hash, settings and output options"""
+        key = self.render_cache.make_key('a' * 64, {'brightness': 10})
+        self.assertEqual(key, self.render_cache.make_key('a' * 64, {'brightness': 10}))
+        self.assertNotEqual(key, self.render_cache.make_key('b' * 64, {'brightness': 10}))
+        self.assertNotEqual(key, self.render_cache.make_key('a' * 64, {'brightness': 10}, quality=70))
+    
+    def test_key_depends_on_matte_model_and_lut_file(self):
+        """Renders are invalidated by a new matting model or quality and by an edited .cube file"""
+        background = {'replace_background': True, 'background_style': 'bokeh'}
+        key = self.render_cache.make_key('a' * 64, background)
+        with override_settings(BACKGROUND_REMOVAL_MODEL='isnet-general-use'):
+            self.assertNotEqual(self.render_cache.make_key('a' * 64, background), key)
+        with override_settings(BACKGROUND_REMOVAL_QUALITY='fast'):
+            self.assertNotEqual(self.render_cache.make_key('a' * 64, background), key)
+        
+        lut_path = os.path.join(self.cache_dir, 'look.cube')
+        
+        def write_cube(scale):
+            with open(lut_path, 'w') as cube:
+                cube.write('LUT_3D_SIZE 2\n')
+                for b in (0, 1):
+                    for g in (0, 1):
+                        for r in (0, 1):
+                            cube.write(f'{r * scale} {g * scale} {b * scale}\n')
+        
+        write_cube(1.0)
+        cube_files = get_color_engine().cube_files
+        cube_files['look'] = lut_path
+        try:
+            graded = {'color_grade': 'look'}
+            first = self.render_cache.make_key('a' * 64, graded)
+            self.assertEqual(self.render_cache.make_key('a' * 64, graded), first)
+            write_cube(0.5)
+            self.assertNotEqual(self.render_cache.make_key('a' * 64, graded), first)
+        finally:
+            del cube_files['look']
+    
+    def test_put_scans_only_when_over_budget(self):
+        """A running size total spares the directory scan on every put"""
+        scans = []
+        evict = self.render_cache.evict
+        self.render_cache.evict = lambda: scans.append(1) or evict()
+        
+        self.render_cache.put('a' * 64, b'x' * 300)
+        self.assertEqual(len(scans), 1)  # No running total yet
+        self.render_cache.put('b' * 64, b'x' * 300)
+        self.render_cache.put('c' * 64, b'x' * 300)
+        self.assertEqual(len(scans), 1)
+        self.render_cache.put('d' * 64, b'x' * 300)
+        self.assertEqual(len(scans), 2)
+        self.assertEqual(self.render_cache.stats()['bytes'], 900)
+        self.assertEqual(cache.get(self.render_cache.bytes_key), 900)
+    
+    def test_hit_miss_counters(self):
+        """Lookups are counted as hits or misses"""
+        key = self.render_cache.make_key('a' * 64, {})
+        self.assertIsNone(self.render_cache.get(key))
+        self.render_cache.put(key, b'encoded')
+        self.assertEqual(self.render_cache.get(key), b'encoded')
+        
+        stats = self.render_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['entries'], 1)
+    
+    def test_fetch_to_copies_cached_file(self):
+        """A hit is copied to the requested output path"""
+        key = self.render_cache.make_key('a' * 64, {})
+        self.render_cache.put(key, b'jpeg bytes')
+        output_path = os.path.join(self.cache_dir, 'out', 'result.jpg')
+        
+        self.assertTrue(self.render_cache.fetch_to(key, output_path))
+        with open(output_path, 'rb') as output:
+            self.assertEqual(output.read(), b'jpeg bytes')
+        self.assertFalse(self.render_cache.fetch_to('0' * 64, output_path))
+    
+    def test_lru_eviction(self):
+        """Least recently used entries are evicted past the size budget"""
+        keys = [self.render_cache.make_key(str(i), {}) for i in range(3)]
+        for index, key in enumerate(keys):
+            self.render_cache.put(key, b'x' * 400)
+            # Distinct mtimes so the LRU order is deterministic
+            past = time.time() - 100 + index
+            os.utime(self.render_cache._entry_path(key), (past, past))
+            if index == 1:
+                self.render_cache.get(keys[0])  # Refresh the oldest entry
+        
+        self.assertIsNotNone(self.render_cache.get_path(keys[0]))
+        self.assertIsNone(self.render_cache.get_path(keys[1]))
+        self.assertIsNotNone(self.render_cache.get_path(keys[2]))
+    
+    def test_source_hash_matches_file_hash(self):
+        """Source hashes are the SHA-256 used for FileStorage.file_hash"""
+        path = os.path.join(self.cache_dir, 'source.bin')
+        with open(path, 'wb') as source:
+            source.write(b'image data')
+        self.assertEqual(get_source_hash(path), calculate_file_hash(path))
+
+class PhotoCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+    
+    def test_invalidate_changes_key(self):
+        """Bumping the photo version invalidates cached previews"""
+        photo_cache = PhotoCache()
+        photo_cache.set_preview('photo-1', {'brightness': 10}, '/media/previews/1.jpg')
+        self.assertEqual(photo_cache.get_preview('photo-1', {'brightness': 10}), '/media/previews/1.jpg')
+        
+        photo_cache.invalidate_photo('photo-1')
+        self.assertIsNone(photo_cache.get_preview('photo-1', {'brightness': 10}))
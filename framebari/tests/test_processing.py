@@ -1,17 +1,53 @@
 # tests/test_processing.py
 import pytest
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import User
-from PIL import Image
+from PIL import Image, ImageEnhance
+import importlib
 import io
+import math
 import tempfile
 import os
+import numpy as np
 
-from apps.editor.models import Project, Photo, EditingSettings
+from apps.editor.models import Project, Photo, EditingSettings, DetectedSubject
+from apps.api.serializers import PhotoSerializer
 from apps.processing.engine import PhotoProcessor
 from apps.processing.advanced_filters import AdvancedFiltersEngine
 from apps.processing.color_grading import ColorGradingEngine
+from apps.processing.background_engine import AdvancedBackgroundEngine
+from apps.processing import background_generators
+from apps.processing.adjustments import AdjustmentPipeline
+from apps.processing.optimized_engine import OptimizedPhotoProcessor
+from apps.processing.image_cache import DecodedImageCache, get_decoded_cache
+from apps.processing.proxies import build_proxy_pyramid, find_proxy, select_proxy_level
+from apps.processing import masks
+from apps.processing.masks import radial_falloff
+from apps.processing import lut3d
+from apps.processing.lut3d import LUT3D, load_cube, parse_cube
+from apps.processing.lazy import LazyRegistry
+from apps.processing import registry
+from apps.processing.pipeline import EditGraph, PointOp
+from apps.processing.curves import ToneCurve
+from apps.processing.batching import MicroBatcher
+from apps.processing.segmentation import ProxySegmenter
+from apps.processing.mask_codec import SubjectMask, encode_mask
+from apps.processing import matting
+from apps.processing.hashing import get_source_hash
+from apps.processing.matte_store import MatteStore
+from apps.processing import compositing
+from apps.processing.background_templates import BackgroundTemplateCache, canonical_size
+import base64
+import cv2
+from apps.processing.detection_metrics import average_precision, box_iou, mean_average_precision
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from apps.processing.fast_decode import fit_size, make_thumbnail, open_reduced
+from apps.processing.tiling import ACTIVE_JOBS_KEY, TiledExecutor, bounded_map, get_process_pool, iter_tiles, parallel_workers, processing_job
+from django.core.cache import cache
+import shutil
 
 class PhotoProcessingTestCase(TestCase):
     def setUp(self):
@@ -107,3 +143,1135 @@ class PhotoProcessingTestCase(TestCase):
         partial_result = color_engine.apply_lut(image, 'cinematic_cool', intensity=0.5)
         self.assertIsInstance(partial_result, Image.Image)
 
+
+class BackgroundGeneratorRegressionTestCase(TestCase):
+    """Compare the vectorized generators against the original per-pixel loops"""
+    SIZES = [(37, 23), (64, 64), (90, 41)]
+    
+    def assertImagesClose(self, actual, expected, tolerance=1):
+        self.assertEqual(actual.mode, expected.mode)
+        self.assertEqual(actual.size, expected.size)
+        diff = np.abs(np.asarray(actual, dtype=np.int16) - np.asarray(expected, dtype=np.int16))
+        self.assertLessEqual(int(diff.max()), tolerance)
+    
+    def reference_alpha_gradient(self, size, base_color):
+        width, height = size
+        gradient = Image.new('RGBA', size)
+        base_rgb = tuple(int(base_color[i:i+2], 16) for i in (1, 3, 5))
+        for y in range(height):
+            alpha = int(255 * (y / height))
+            for x in range(width):
+                gradient.putpixel((x, y), base_rgb + (alpha,))
+        return gradient
+    
+    def reference_alpha_wave(self, size, base_color):
+        width, height = size
+        wave_bg = Image.new('RGBA', size)
+        base_rgb = tuple(int(base_color[i:i+2], 16) for i in (1, 3, 5))
+        for y in range(height):
+            for x in range(width):
+                wave = int(50 * np.sin(x * 0.02) * np.cos(y * 0.02))
+                alpha = max(0, min(255, 200 + wave))
+                wave_bg.putpixel((x, y), base_rgb + (alpha,))
+        return wave_bg
+    
+    def reference_wave_blue(self, size):
+        width, height = size
+        background = Image.new('RGB', size)
+        pixels = []
+        for y in range(height):
+            for x in range(width):
+                intensity = int(100 + math.sin(x * 0.02) * 50 + math.cos(y * 0.03) * 30)
+                pixels.append((0, max(0, min(255, intensity)), 255))
+        background.putdata(pixels)
+        return background
+    
+    def reference_metallic_blue(self, size):
+        width, height = size
+        background = Image.new('RGB', size)
+        for y in range(height):
+            for x in range(width):
+                distance = math.sqrt((x - width/2)**2 + (y - height/2)**2)
+                metallic = int(150 + 50 * math.sin(distance * 0.1))
+                background.putpixel((x, y), (metallic//3, metallic//2, metallic))
+        return background
+    
+    def reference_gradient_blue(self, size):
+        width, height = size
+        background = Image.new('RGB', size)
+        for y in range(height):
+            blue_intensity = int(100 + 155 * (y / height))
+            for x in range(width):
+                background.putpixel((x, y), (0, 50, blue_intensity))
+        return background
+    
+    def reference_studio_lighting(self, size):
+        width, height = size
+        background = Image.new('RGB', size, '#f0f0f0')
+        center_x, center_y = width // 2, height // 2
+        max_distance = math.sqrt(center_x**2 + center_y**2)
+        for y in range(height):
+            for x in range(width):
+                distance = math.sqrt((x - center_x)**2 + (y - center_y)**2)
+                intensity = int(255 * (1 - distance / max_distance) * 0.5 + 128)
+                background.putpixel((x, y), (intensity, intensity, intensity))
+        return background
+    
+    def test_photo_processor_backgrounds(self):
+        """Gradient and wave alpha backgrounds match the loop implementation"""
+        for size in self.SIZES:
+            self.assertImagesClose(
+                background_generators.alpha_gradient(size, '#0066FF'),
+                self.reference_alpha_gradient(size, '#0066FF'),
+                tolerance=0
+            )
+            self.assertImagesClose(
+                background_generators.alpha_wave(size, '#12AB34'),
+                self.reference_alpha_wave(size, '#12AB34')
+            )
+    
+    def test_advanced_engine_backgrounds(self):
+        """Blue styles and studio lighting match the loop implementation"""
+        for size in self.SIZES:
+            self.assertImagesClose(background_generators.wave_blue(size), self.reference_wave_blue(size))
+            self.assertImagesClose(background_generators.metallic_blue(size), self.reference_metallic_blue(size))
+            self.assertImagesClose(
+                background_generators.gradient_blue(size),
+                self.reference_gradient_blue(size),
+                tolerance=0
+            )
+            self.assertImagesClose(
+                background_generators.studio_lighting(size),
+                self.reference_studio_lighting(size)
+            )
+    
+    def reference_vintage(self, image):
+        img_array = np.array(image)
+        h, w = img_array.shape[:2]
+        center_x, center_y = w // 2, h // 2
+        max_distance = math.sqrt(center_x**2 + center_y**2)
+        for y in range(h):
+            for x in range(w):
+                distance = math.sqrt((x - center_x)**2 + (y - center_y)**2)
+                vignette = 1 - (distance / max_distance) * 0.5
+                img_array[y, x] = img_array[y, x] * vignette
+        img_array[:, :, 0] = np.clip(img_array[:, :, 0] * 1.1, 0, 255)
+        img_array[:, :, 2] = np.clip(img_array[:, :, 2] * 0.9, 0, 255)
+        noise = np.random.normal(0, 10, img_array.shape)
+        img_array = np.clip(img_array + noise, 0, 255)
+        return Image.fromarray(img_array.astype(np.uint8))
+    
+    def reference_lomography(self, image):
+        img_array = np.array(image)
+        h, w = img_array.shape[:2]
+        center_x, center_y = w // 2, h // 2
+        Y, X = np.ogrid[:h, :w]
+        dist_from_center = np.sqrt((X - center_x)**2 + (Y - center_y)**2)
+        max_dist = np.sqrt(center_x**2 + center_y**2)
+        vignette = np.clip(1 - (dist_from_center / max_dist) * 0.8, 0.2, 1)
+        for c in range(3):
+            img_array[:, :, c] = img_array[:, :, c] * vignette
+        return ImageEnhance.Color(Image.fromarray(img_array.astype(np.uint8))).enhance(1.5)
+    
+    def test_vignette_filters(self):
+        """Vintage and lomography vignettes match the original per-pixel versions"""
+        engine = AdvancedFiltersEngine()
+        for size in self.SIZES:
+            image = background_generators.wave_blue(size)
+            
+            np.random.seed(0)
+            expected = self.reference_vintage(image)
+            np.random.seed(0)
+            self.assertImagesClose(engine.apply_filter(image, 'vintage'), expected, tolerance=2)
+            
+            self.assertImagesClose(
+                engine.apply_filter(image, 'lomography'),
+                self.reference_lomography(image),
+                tolerance=2
+            )
+    
+    def test_radial_falloff_is_memoized(self):
+        falloff = radial_falloff((40, 30), 0.5)
+        self.assertIs(radial_falloff((40, 30), 0.5), falloff)
+        self.assertFalse(falloff.flags.writeable)
+        self.assertAlmostEqual(float(falloff[15, 20]), 1.0)
+        self.assertAlmostEqual(float(falloff[0, 0]), 0.5, places=5)
+    
+    def test_radial_falloff_skips_cache_above_pixel_cap(self):
+        max_cached_pixels = masks.MAX_CACHED_PIXELS
+        masks.MAX_CACHED_PIXELS = 40 * 30
+        try:
+            falloff = radial_falloff((41, 30), 0.5)
+            self.assertIsNot(radial_falloff((41, 30), 0.5), falloff)
+            self.assertFalse(falloff.flags.writeable)
+            self.assertIs(radial_falloff((40, 30), 0.5), radial_falloff((40, 30), 0.5))
+        finally:
+            masks.MAX_CACHED_PIXELS = max_cached_pixels
+    
+    def test_engines_use_generators(self):
+        """Both engines produce backgrounds of the requested size"""
+        engine = AdvancedBackgroundEngine()
+        for style in ['blue_wave', 'blue_metallic', 'blue_gradient', 'studio_light']:
+            background = engine.styles[style]((48, 32))
+            self.assertEqual(background.size, (48, 32))
+            self.assertEqual(background.mode, 'RGB')
+
+class AdjustmentPipelineTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        self.image = Image.fromarray((rng.random((48, 64, 3)) * 200 + 20).astype(np.uint8))
+    
+    def reference_enhance(self, image, brightness, contrast, saturation, exposure):
+        """The original chained ImageEnhance implementation"""
+        image = ImageEnhance.Brightness(image).enhance(1 + brightness/100)
+        image = ImageEnhance.Contrast(image).enhance(1 + contrast/100)
+        image = ImageEnhance.Color(image).enhance(1 + saturation/100)
+        img_array = np.clip(np.array(image) * (1 + exposure/100), 0, 255)
+        return Image.fromarray(img_array.astype(np.uint8))
+    
+    def test_matches_chained_enhancers(self):
+        """Fused pass stays within rounding distance of the chained passes"""
+        for brightness, contrast, saturation, exposure in [(10, 0, 0, 0), (0, 20, 0, 0), (0, 0, 30, 0),
+                                                          (10, 15, -20, 5), (-20, -10, 40, -10)]:
+            expected = np.asarray(self.reference_enhance(self.image, brightness, contrast, saturation, exposure), dtype=np.int16)
+            actual = np.asarray(AdjustmentPipeline(brightness, contrast, saturation, 0, exposure).apply(self.image), dtype=np.int16)
+            self.assertLessEqual(int(np.abs(actual - expected).max()), 4)
+    
+    def test_vibrance_favors_muted_colors(self):
+        """Vibrance boosts low-saturation pixels more than saturated ones"""
+        image = Image.fromarray(np.array([[[200, 10, 10], [120, 110, 100]]], dtype=np.uint8))
+        result = np.asarray(AdjustmentPipeline(vibrance=50).apply(image), dtype=np.int16)
+        source = np.asarray(image, dtype=np.int16)
+        saturated_gain = np.ptp(result[0, 0]) / np.ptp(source[0, 0])
+        muted_gain = np.ptp(result[0, 1]) / np.ptp(source[0, 1])
+        self.assertGreater(muted_gain, saturated_gain)
+    
+    def test_preserves_alpha_and_mode(self):
+        """RGBA alpha passes through and grayscale stays grayscale"""
+        rgba = self.image.convert('RGBA')
+        rgba.putalpha(128)
+        for vibrance in (0, 30):
+            result = AdjustmentPipeline(brightness=10, vibrance=vibrance).apply(rgba)
+            self.assertEqual(result.mode, 'RGBA')
+            self.assertEqual(result.getchannel('A').getextrema(), (128, 128))
+        self.assertEqual(AdjustmentPipeline(contrast=20).apply(self.image.convert('L')).mode, 'L')
+    
+    def test_identity_is_noop(self):
+        """Zero settings return an unchanged copy"""
+        pipeline = AdjustmentPipeline.from_settings({'brightness': 0, 'quality': 85})
+        self.assertTrue(pipeline.is_identity)
+        self.assertEqual(pipeline.apply(self.image).tobytes(), self.image.tobytes())
+
+class PreviewProxyTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.override = override_settings(MEDIA_ROOT=self.media_root, PREVIEW_PROXY_LEVELS=(64, 160, 320))
+        self.override.enable()
+        self.image = Image.new('RGB', (1000, 600), color='orange')
+        self.source_path = os.path.join(self.media_root, 'source.jpg')
+        self.image.save(self.source_path)
+    
+    def tearDown(self):
+        self.override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def test_pyramid_levels(self):
+        """Each level is bounded by its long edge"""
+        names = build_proxy_pyramid(self.image, 'photo-1')
+        self.assertEqual(sorted(names), [64, 160, 320])
+        for level, name in names.items():
+            with Image.open(os.path.join(self.media_root, name)) as proxy:
+                self.assertEqual(max(proxy.size), level)
+    
+    def test_select_smallest_adequate_level(self):
+        """Previews use the smallest level covering the requested size"""
+        self.assertEqual(select_proxy_level((100, 80)), 160)
+        self.assertEqual(select_proxy_level((160, 100)), 160)
+        self.assertEqual(select_proxy_level((2000, 1000)), 320)
+        
+        build_proxy_pyramid(self.image, 'photo-1')
+        self.assertTrue(find_proxy('photo-1', (100, 80)).endswith('photo-1_160.jpg'))
+        self.assertIsNone(find_proxy('missing', (100, 80)))
+    
+    def test_preview_renders_jpeg_from_proxy(self):
+        """Preview bytes are a JPEG no larger than the requested size"""
+        build_proxy_pyramid(self.image, 'photo-1')
+        processor = OptimizedPhotoProcessor(self.source_path, max_preview_size=(120, 90), photo_id='photo-1')
+        preview = processor.get_optimized_preview({'brightness': 20})
+        
+        with Image.open(io.BytesIO(preview)) as rendered:
+            self.assertEqual(rendered.format, 'JPEG')
+            self.assertLessEqual(rendered.width, 120)
+            self.assertLessEqual(rendered.height, 90)
+        
+        # Second request with the same settings is served from cache
+        self.assertEqual(processor.get_optimized_preview({'brightness': 20}), preview)
+    
+    def test_proxies_removed_with_photo(self):
+        user = User.objects.create_user(username='proxyuser', password='testpass123')
+        project = Project.objects.create(user=user, name='Proxies')
+        photo = Photo.objects.create(
+            project=project, original_image='source.jpg',
+            width=1000, height=600, file_size=1024, format='JPEG'
+        )
+        names = build_proxy_pyramid(self.image, photo.id)
+        
+        photo.delete()
+        for name in names.values():
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, name)))
+    
+    def test_reupload_replaces_previews(self):
+        user = User.objects.create_user(username='reuploader', password='testpass123')
+        project = Project.objects.create(user=user, name='Reupload')
+        photo = Photo.objects.create(
+            project=project, original_image='source.jpg',
+            width=1000, height=600, file_size=1024, format='JPEG'
+        )
+        build_proxy_pyramid(self.image, photo.id)
+        before = OptimizedPhotoProcessor(photo.original_image.path, (120, 90), photo.id).get_optimized_preview({})
+        
+        replacement = io.BytesIO()
+        Image.new('RGB', (500, 300), color='navy').save(replacement, format='JPEG')
+        serializer = PhotoSerializer(photo, data={
+            'original_image': SimpleUploadedFile('navy.jpg', replacement.getvalue(), content_type='image/jpeg')
+        }, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.captureOnCommitCallbacks() as callbacks:
+            photo = serializer.save()
+        
+        # Processing, which rebuilds the proxies, is queued for the new original
+        self.assertEqual(len(callbacks), 1)
+        self.assertIsNone(find_proxy(photo.id, (120, 90)))
+        self.assertEqual((photo.width, photo.height), (500, 300))
+        
+        after = OptimizedPhotoProcessor(photo.original_image.path, (120, 90), photo.id).get_optimized_preview({})
+        self.assertNotEqual(after, before)
+        with Image.open(io.BytesIO(after)) as preview:
+            red, green, blue = preview.convert('RGB').getpixel((10, 10))
+            self.assertGreater(blue, red)
+
+class DecodedImageCacheTestCase(TestCase):
+    def test_evicts_by_decoded_size(self):
+        """Entries are evicted least recently used first once over budget"""
+        image_cache = DecodedImageCache(max_bytes=3 * 100 * 100 * 4)
+        for key in ('a', 'b', 'c'):
+            image_cache.put(key, Image.new('RGB', (100, 100)))
+        image_cache.get('a')
+        image_cache.put('d', Image.new('RGB', (100, 100)))
+        
+        self.assertIsNotNone(image_cache.get('a'))
+        self.assertIsNone(image_cache.get('b'))
+        self.assertEqual(image_cache.stats()['bytes'], 3 * 100 * 100 * 4)
+    
+    def test_oversized_images_are_not_cached(self):
+        """An image larger than the whole budget is decoded but not kept"""
+        image_cache = DecodedImageCache(max_bytes=1000)
+        self.assertFalse(image_cache.put('big', Image.new('RGB', (100, 100))))
+        self.assertEqual(image_cache.stats()['entries'], 0)
+    
+    def test_processors_share_decoded_original(self):
+        """Consecutive processors on one file decode it only once"""
+        get_decoded_cache().clear()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'shared.png')
+            Image.new('RGB', (64, 64), color='purple').save(path)
+            
+            first = PhotoProcessor(path)
+            first.working_image.thumbnail((16, 16))
+            second = PhotoProcessor(path)
+            
+            self.assertIs(first.original, second.original)
+            self.assertEqual(second.working_image.size, (64, 64))
+            self.assertEqual(get_decoded_cache().stats()['hits'], 1)
+
+class FastDecodeTestCase(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        ys, xs = np.mgrid[0:1200, 0:1600]
+        pixels = np.dstack([xs % 256, ys % 256, (xs + ys) % 256]).astype(np.uint8)
+        self.image = Image.fromarray(pixels, 'RGB')
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def _save(self, name, **kwargs):
+        path = os.path.join(self.temp_dir, name)
+        self.image.save(path, **kwargs)
+        return path
+    
+    def test_thumbnail_matches_full_decode_size(self):
+        """Reduced decode produces the same size as a full-decode thumbnail"""
+        path = self._save('photo.jpg', quality=90)
+        
+        with Image.open(path) as img:
+            img.load()
+            expected = img.copy()
+        expected.thumbnail((300, 300), Image.Resampling.LANCZOS)
+        
+        thumbnail = make_thumbnail(path, (300, 300))
+        self.assertEqual(thumbnail.size, expected.size)
+        self.assertEqual(thumbnail.mode, 'RGB')
+        
+        difference = np.abs(np.asarray(thumbnail, np.int16) - np.asarray(expected, np.int16))
+        self.assertLess(difference.mean(), 6)
+    
+    def test_non_jpeg_sources(self):
+        """PNG goes through integer reduce and still fits the box"""
+        path = self._save('photo.png')
+        reduced = open_reduced(path, (200, 200))
+        self.assertEqual(reduced.size, fit_size(self.image.size, (200, 200)))
+    
+    def test_never_upscales(self):
+        path = self._save('photo.jpg')
+        self.assertEqual(open_reduced(path, (4000, 4000)).size, self.image.size)
+    
+    def test_processor_from_decoded_image(self):
+        """PhotoProcessor.from_image works on a copy of an in-memory image"""
+        processor = PhotoProcessor.from_image(self.image)
+        processor.working_image.thumbnail((100, 100))
+        self.assertEqual(self.image.size, (1600, 1200))
+        self.assertEqual(processor.original.size, (1600, 1200))
+
+class TiledExecutorTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.image = Image.fromarray(rng.integers(0, 256, (300, 420, 3), dtype=np.uint8))
+    
+    def test_tiles_cover_image(self):
+        """Output boxes partition the image and halos stay inside it"""
+        covered = np.zeros((300, 420), dtype=np.int32)
+        for box, padded in iter_tiles((420, 300), 128, halo=5):
+            covered[box[1]:box[3], box[0]:box[2]] += 1
+            self.assertGreaterEqual(box[0] - padded[0], 0)
+            self.assertLessEqual(padded[2], 420)
+            self.assertLessEqual(padded[3], 300)
+        self.assertTrue((covered == 1).all())
+    
+    def test_filters_match_whole_frame(self):
+        """Tiled neighbourhood and point filters reproduce the whole-frame result"""
+        engine = AdvancedFiltersEngine()
+        for filter_name in ('blur', 'sharpen', 'sepia', 'hdr', 'cartoon'):
+            engine.tiler = TiledExecutor(min_pixels=10 ** 9)
+            expected = np.asarray(engine.apply_filter(self.image, filter_name))
+            engine.tiler = TiledExecutor(tile_size=64, max_workers=2, min_pixels=0)
+            tiled = np.asarray(engine.apply_filter(self.image, filter_name))
+            np.testing.assert_array_equal(tiled, expected, err_msg=filter_name)
+    
+    def test_point_operations_match_whole_frame(self):
+        expected_lut = ColorGradingEngine().apply_lut(self.image, 'vintage', intensity=0.6)
+        expected_adjusted = AdjustmentPipeline(brightness=10, contrast=25, vibrance=30).apply(self.image)
+        
+        with override_settings(PROCESSING_TILE_SIZE=64, PROCESSING_TILE_MIN_PIXELS=0):
+            tiled_lut = ColorGradingEngine().apply_lut(self.image, 'vintage', intensity=0.6)
+            tiled_adjusted = AdjustmentPipeline(brightness=10, contrast=25, vibrance=30).apply(self.image)
+        
+        np.testing.assert_array_equal(np.asarray(tiled_lut), np.asarray(expected_lut))
+        difference = np.abs(np.asarray(tiled_adjusted, np.int16) - np.asarray(expected_adjusted, np.int16))
+        self.assertLessEqual(difference.max(), 1)
+    
+    def test_process_backend_matches_threads(self):
+        """Shared-memory process tiles give the same result as whole-frame filtering"""
+        engine = AdvancedFiltersEngine()
+        engine.tiler = TiledExecutor(min_pixels=10 ** 9)
+        expected = np.asarray(engine.apply_filter(self.image, 'hdr'))
+        
+        engine.tiler = TiledExecutor(tile_size=128, max_workers=2, min_pixels=0, backend='process')
+        np.testing.assert_array_equal(np.asarray(engine.apply_filter(self.image, 'hdr')), expected)
+    
+    def test_process_pool_outlives_changing_worker_counts(self):
+        """Jobs given different shares keep submitting to the one live pool"""
+        engine = AdvancedFiltersEngine()
+        engine.tiler = TiledExecutor(min_pixels=10 ** 9)
+        expected = np.asarray(engine.apply_filter(self.image, 'hdr'))
+        
+        pool = get_process_pool()
+        results = {}
+        
+        def run(max_workers):
+            job_engine = AdvancedFiltersEngine()
+            job_engine.tiler = TiledExecutor(tile_size=128, max_workers=max_workers, min_pixels=0, backend='process')
+            results[max_workers] = np.asarray(job_engine.apply_filter(self.image, 'hdr'))
+        
+        threads = [threading.Thread(target=run, args=(workers,)) for workers in (2, 3, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertIs(get_process_pool(), pool)
+        for workers in (2, 3, 4):
+            np.testing.assert_array_equal(results[workers], expected)
+    
+    def test_bounded_map_limits_calls_in_flight(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+        
+        def work(item):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.01)
+            with lock:
+                state['running'] -= 1
+            return item * 2
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            self.assertEqual(list(bounded_map(executor, work, range(20), 3)), [item * 2 for item in range(20)])
+        self.assertLessEqual(state['peak'], 3)
+    
+    def test_workers_bounded_without_shared_cache(self):
+        with override_settings(PROCESSING_PARALLEL_WORKERS=3):
+            self.assertEqual(parallel_workers(), 3)
+        
+        cores = os.cpu_count() or 1
+        self.assertEqual(parallel_workers(), max(1, min(4, cores)))
+        with override_settings(CELERY_WORKER_CONCURRENCY=cores * 2):
+            self.assertEqual(parallel_workers(), 1)
+        # A per-process cache cannot see other workers' jobs, so nothing is counted
+        with processing_job():
+            self.assertIsNone(cache.get(ACTIVE_JOBS_KEY))
+    
+    def test_workers_shared_between_running_jobs(self):
+        cache_dir = tempfile.mkdtemp()
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir}}
+        try:
+            with override_settings(CACHES=shared):
+                cores = os.cpu_count() or 1
+                self.assertEqual(parallel_workers(), cores)
+                with processing_job():
+                    with processing_job():
+                        self.assertEqual(cache.get(ACTIVE_JOBS_KEY), 2)
+                        self.assertEqual(parallel_workers(), max(1, cores // 2))
+                self.assertEqual(cache.get(ACTIVE_JOBS_KEY), 0)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+class Lut3DTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 256, (40, 60, 3), dtype=np.uint8)
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def write_cube(self, name, size, func):
+        """Write a .cube file whose entries are func(r, g, b) on a size^3 grid"""
+        grid = np.linspace(0, 1, size)
+        lines = ['TITLE "test"', f'LUT_3D_SIZE {size}']
+        for b in grid:
+            for g in grid:
+                for r in grid:
+                    lines.append('%.6f %.6f %.6f' % func(r, g, b))
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as cube_file:
+            cube_file.write('\n'.join(lines))
+        return path
+    
+    def test_cube_files(self):
+        """Identity and channel-swapping .cube files are parsed in red-fastest order"""
+        identity = load_cube(self.write_cube('identity.cube', 5, lambda r, g, b: (r, g, b)))
+        np.testing.assert_array_equal(identity.apply(self.pixels), self.pixels)
+        self.assertIs(load_cube(os.path.join(self.temp_dir, 'identity.cube')), identity)
+        
+        swapped = load_cube(self.write_cube('swap.cube', 2, lambda r, g, b: (g, r, b)))
+        result = swapped.apply(self.pixels)
+        np.testing.assert_array_equal(result[:, :, 0], self.pixels[:, :, 1])
+        np.testing.assert_array_equal(result[:, :, 1], self.pixels[:, :, 0])
+        
+        with self.assertRaises(ValueError):
+            parse_cube('LUT_3D_SIZE 2\n0 0 0\n')
+    
+    def test_dense_table_matches_interpolation(self):
+        """Baked lookups equal direct trilinear and tetrahedral interpolation"""
+        table = np.random.default_rng(1).random((5, 5, 5, 3), dtype=np.float32)
+        samples = self.pixels.reshape(-1, 3)
+        for method in LUT3D.METHODS:
+            lut = LUT3D(table, method=method)
+            expected = np.clip(lut.interpolate(samples) * 255 + 0.5, 0, 255).astype(np.uint8)
+            np.testing.assert_array_equal(lut.apply(self.pixels, dense=True).reshape(-1, 3), expected)
+            np.testing.assert_array_equal(lut.apply(self.pixels, dense=False).reshape(-1, 3), expected)
+    
+    def test_small_images_skip_the_dense_table(self):
+        """Preview-sized grades interpolate directly; at most one dense table is kept"""
+        table = np.random.default_rng(2).random((5, 5, 5, 3), dtype=np.float32)
+        first, second = LUT3D(table), LUT3D(table[::-1])
+        lut3d._dense_tables.clear()
+        
+        first.apply(self.pixels)
+        self.assertEqual(len(lut3d._dense_tables), 0)
+        first.apply(self.pixels, dense=True)
+        second.apply(self.pixels, dense=True)
+        self.assertEqual(list(lut3d._dense_tables), [(second.cache_key, second.method)])
+    
+    def test_builtin_looks_keep_their_curves(self):
+        engine = ColorGradingEngine()
+        image = Image.fromarray(self.pixels)
+        curves = engine.luts['vintage']
+        expected = np.stack([curves[self.pixels[:, :, c], c] for c in range(3)], axis=-1)
+        
+        np.testing.assert_array_equal(np.asarray(engine.apply_lut(image, 'vintage')), expected)
+        self.assertEqual(engine.get_lut3d('vintage').table.shape, (33, 33, 33, 3))
+        self.assertIs(ColorGradingEngine().get_lut3d('vintage'), engine.get_lut3d('vintage'))
+    
+    def test_lut_directory_and_subject_grading(self):
+        self.write_cube('invert.cube', 2, lambda r, g, b: (1 - r, 1 - g, 1 - b))
+        with override_settings(COLOR_GRADING_LUT_DIR=self.temp_dir):
+            engine = ColorGradingEngine()
+        
+        image = Image.fromarray(self.pixels)
+        mask = np.zeros((40, 60), dtype=np.uint8)
+        mask[:, 30:] = 255
+        result = np.asarray(engine.apply_subject_specific_grading(image, Image.fromarray(mask), 'invert'))
+        
+        np.testing.assert_array_equal(result[:, :30], self.pixels[:, :30])
+        np.testing.assert_array_equal(result[:, 30:], 255 - self.pixels[:, 30:])
+
+class EngineRegistryTestCase(TestCase):
+    def test_values_built_once_on_first_access(self):
+        calls = []
+        lazy = LazyRegistry({'a': lambda: calls.append('a') or 1, 'b': lambda: calls.append('b') or 2})
+        
+        self.assertIn('a', lazy)
+        self.assertEqual(sorted(lazy), ['a', 'b'])
+        self.assertEqual(calls, [])
+        
+        self.assertEqual(lazy['a'], 1)
+        self.assertEqual(lazy['a'], 1)
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(lazy.is_built('b'))
+        with self.assertRaises(KeyError):
+            lazy['missing']
+    
+    def test_engines_shared_and_warmed(self):
+        registry.warm_up()
+        
+        color_engine = registry.get_color_engine()
+        self.assertIs(registry.get_color_engine(), color_engine)
+        self.assertTrue(registry.engines.is_built('filters'))
+        self.assertTrue(all(color_engine.luts.is_built(name) for name in color_engine.luts))
+        self.assertIs(ColorGradingEngine().luts, color_engine.luts)
+
+class EditGraphTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.image = Image.fromarray(rng.integers(0, 256, (60, 80, 3), dtype=np.uint8))
+    
+    def assertArraysClose(self, actual, expected, tolerance):
+        difference = np.abs(np.asarray(actual, np.int16) - np.asarray(expected, np.int16))
+        self.assertLessEqual(int(difference.max()), tolerance)
+    
+    def test_point_operations_fused(self):
+        """Adjustments, a curve LUT and a curve filter compile into one stage"""
+        settings = {
+            'brightness': 10, 'contrast': 20, 'vibrance': 15,
+            'color_grade': 'vintage', 'grade_intensity': 0.7,
+            'filter': 'cross_process', 'filter_intensity': 0.5,
+        }
+        edit = EditGraph.from_settings(settings).compile()
+        self.assertEqual(edit.describe(), ['[adjust, grade:vintage+filter:cross_process]'])
+        
+        processor = PhotoProcessor.from_image(self.image)
+        processor.enhance_photo(brightness=10, contrast=20, vibrance=15)
+        expected = ColorGradingEngine().apply_lut(processor.working_image, 'vintage', 0.7)
+        expected = AdvancedFiltersEngine().apply_filter(expected, 'cross_process', 0.5)
+        
+        self.assertArraysClose(edit.run(self.image), expected, tolerance=1)
+    
+    def test_spatial_filters_break_stages(self):
+        edit = EditGraph.from_settings({'exposure': 10, 'filter': 'hdr', 'color_grade': 'neon'}).compile()
+        self.assertEqual(edit.describe(), ['[adjust, grade:neon]', 'filter:hdr'])
+        
+        sepia = EditGraph.from_settings({'filter': 'sepia', 'filter_intensity': 0.6}).compile()
+        expected = AdvancedFiltersEngine().apply_filter(self.image, 'sepia', 0.6)
+        self.assertArraysClose(sepia.run(self.image), expected, tolerance=2)
+    
+    def test_editing_settings_graph(self):
+        editing_settings = EditingSettings(brightness=15, background_style='gradient')
+        self.assertEqual(EditGraph.from_editing_settings(editing_settings).compile().describe(), ['[adjust]'])
+        
+        with_background = EditGraph.from_editing_settings(editing_settings, replace_background=True)
+        self.assertEqual(
+            with_background.compile().describe(),
+            ['[adjust]', 'remove_background', 'background:gradient']
+        )
+    
+    def test_point_op_requires_bind(self):
+        class Unbound(PointOp):
+            label = 'unbound'
+        
+        with self.assertRaises(TypeError):
+            Unbound()
+
+
+class ToneCurveTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.pixels = rng.integers(0, 256, (60, 80, 3), dtype=np.uint8)
+        self.image = Image.fromarray(self.pixels)
+    
+    def test_composition_matches_sequential(self):
+        first, second = ToneCurve.gamma(0.8), ToneCurve.s_curve((2.5, 2.0, 1.5))
+        sequential = second.apply_array(first.apply_array(self.pixels))
+        np.testing.assert_array_equal(first.then(second).apply_array(self.pixels), sequential)
+        np.testing.assert_array_equal(ToneCurve.identity().apply_array(self.pixels), self.pixels)
+    
+    def test_blend_mixes_with_identity(self):
+        curve = ToneCurve.linear(gain=-1, offset=255)
+        self.assertIs(curve.blend(1.0), curve)
+        np.testing.assert_array_equal(curve.blend(0.0).tables, ToneCurve.identity().tables)
+        self.assertEqual(int(curve.blend(0.5).tables[0, 0]), 128)
+    
+    def test_curve_filters_match_reference(self):
+        engine = AdvancedFiltersEngine()
+        
+        reference = self.pixels.copy()
+        for channel, steepness in enumerate((2.5, 2.0, 1.5)):
+            reference[:, :, channel] = 255 * (
+                1 / (1 + np.exp(-steepness * (reference[:, :, channel] / 255 - 0.5)))
+            )
+        np.testing.assert_array_equal(np.asarray(engine.filters['cross_process'](self.image)), reference)
+        
+        black_white = ImageEnhance.Contrast(self.image.convert('L')).enhance(1.2).convert('RGB')
+        np.testing.assert_array_equal(np.asarray(engine.filters['black_white'](self.image)), np.asarray(black_white))
+        
+        sepia = np.clip(self.pixels.dot(engine.SEPIA_MATRIX.T), 0, 255).astype(np.uint8)
+        difference = np.abs(np.asarray(engine.filters['sepia'](self.image), np.int16) - sepia)
+        self.assertLessEqual(int(difference.max()), 1)
+    
+    def test_registered_curve_filter_fuses(self):
+        engine = registry.get_filters_engine()
+        curve = engine.register_curve_filter('fade', ToneCurve.linear(gain=0.8, offset=20))
+        try:
+            expected = curve.apply_array(self.pixels)
+            np.testing.assert_array_equal(np.asarray(engine.apply_filter(self.image, 'fade')), expected)
+            
+            edit = EditGraph.from_settings({'color_grade': 'cinematic_warm', 'filter': 'fade'}).compile()
+            self.assertEqual(edit.describe(), ['[grade:cinematic_warm+filter:fade]'])
+            graded = ColorGradingEngine().apply_lut(self.image, 'cinematic_warm')
+            np.testing.assert_array_equal(np.asarray(edit.run(self.image)), curve.apply_array(np.asarray(graded)))
+        finally:
+            engine.curve_filters.pop('fade', None)
+            engine.filters.pop('fade', None)
+
+
+class MicroBatcherTestCase(TestCase):
+    def test_concurrent_requests_share_a_batch(self):
+        batches = []
+        release = threading.Event()
+        
+        def run_batch(items):
+            release.wait(5)
+            batches.append(list(items))
+            return [item * 2 for item in items]
+        
+        batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait_ms=200)
+        futures = [batcher.submit(item) for item in range(6)]
+        release.set()
+        
+        self.assertEqual([future.result(5) for future in futures], [0, 2, 4, 6, 8, 10])
+        self.assertEqual(sum(len(batch) for batch in batches), 6)
+        self.assertLessEqual(max(len(batch) for batch in batches), 4)
+        self.assertLess(len(batches), 6)
+    
+    def test_errors_reach_every_caller(self):
+        def run_batch(items):
+            raise RuntimeError('model failed')
+        
+        batcher = MicroBatcher(run_batch, max_wait_ms=50)
+        futures = [batcher.submit(item) for item in range(3)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(5)
+        self.assertEqual(MicroBatcher(lambda items: items, max_wait_ms=1).map([1, 2]), [1, 2])
+    
+    def test_stalled_batch_falls_back_to_unbatched_call(self):
+        release = threading.Event()
+        calls = []
+        
+        def run_batch(items):
+            calls.append(threading.current_thread().name)
+            if threading.current_thread().name == 'stalled-batcher':
+                release.wait(5)
+            return [item * 2 for item in items]
+        
+        batcher = MicroBatcher(run_batch, max_wait_ms=1, timeout=0.2, name='stalled-batcher')
+        try:
+            started = time.monotonic()
+            self.assertEqual(batcher.call(3), 6)
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertEqual(calls, ['stalled-batcher', threading.current_thread().name])
+        finally:
+            release.set()
+
+
+class DetectionMetricsTestCase(TestCase):
+    def detection(self, label, x, y, width, height, confidence=1.0):
+        return {'label': label, 'confidence': confidence, 'bbox': {'x': x, 'y': y, 'width': width, 'height': height}}
+    
+    def test_box_iou(self):
+        ious = box_iou(np.array([[0, 0, 10, 10]]), np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]]))
+        np.testing.assert_allclose(ious[0], [1.0, 1 / 3, 0.0])
+    
+    def test_average_precision(self):
+        truths = [[self.detection('person', 0, 0, 10, 10)], [self.detection('person', 50, 50, 20, 20)]]
+        self.assertEqual(mean_average_precision(truths, truths), 1.0)
+        
+        # A confident false positive ranked first halves precision at the first hit
+        predictions = [
+            [self.detection('person', 0, 0, 10, 10, 0.8), self.detection('person', 30, 30, 10, 10, 0.9)],
+            [self.detection('dog', 50, 50, 20, 20, 0.9)],
+        ]
+        self.assertAlmostEqual(average_precision(predictions, truths, 'person'), 0.25)
+        self.assertIsNone(average_precision(predictions, truths, 'dog'))
+        self.assertEqual(mean_average_precision([[], []], truths), 0.0)
+
+
+class ProxySegmenterTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        height, width = 900, 1200
+        self.image = np.clip(rng.normal(0, 20, (height, width, 3)) + (60, 120, 90), 0, 255).astype(np.uint8)
+        ys, xs = np.ogrid[:height, :width]
+        self.subject = ((xs - 600) / 150) ** 2 + ((ys - 450) / 200) ** 2 <= 1
+        self.image[self.subject] = np.clip(
+            rng.normal(0, 20, (int(self.subject.sum()), 3)) + (180, 150, 200), 0, 255
+        ).astype(np.uint8)
+    
+    def test_proxy_mask_matches_subject(self):
+        """Coarse proxy GrabCut plus boundary refinement recovers the full-resolution outline"""
+        segmenter = ProxySegmenter(proxy_edge=300)
+        mask = segmenter.segment_rect(self.image, (420, 220, 360, 460))
+        self.assertEqual(mask.shape, self.subject.shape)
+        
+        foreground = mask > 0
+        iou = (foreground & self.subject).sum() / (foreground | self.subject).sum()
+        self.assertGreater(iou, 0.98)
+        # Refinement stays on the boundary instead of re-solving the subject's whole box
+        self.assertGreater(segmenter.refined_pixels, 0)
+        self.assertLess(segmenter.refined_pixels, 360 * 460 / 2)
+
+
+class MaskCodecTestCase(TestCase):
+    def setUp(self):
+        self.mask = np.zeros((600, 800), np.uint8)
+        cv2.ellipse(self.mask, (500, 250), (120, 80), 30, 0, 360, 255, -1)
+    
+    def test_round_trip_cropped_to_bbox(self):
+        blob = encode_mask(self.mask)
+        subject_mask = SubjectMask(blob)
+        
+        x, y, w, h = cv2.boundingRect(self.mask)
+        self.assertEqual(subject_mask.bbox, {'x': x, 'y': y, 'width': w, 'height': h})
+        self.assertEqual(subject_mask.frame_size, (800, 600))
+        np.testing.assert_array_equal(subject_mask.to_array(), self.mask)
+        self.assertEqual(subject_mask.crop().shape, (h, w))
+        
+        # Much smaller than the base64 PNG the model used to store
+        _, png = cv2.imencode('.png', self.mask)
+        self.assertLess(len(blob), len(base64.b64encode(png)) / 2)
+    
+    def test_offset_crop_and_empty_mask(self):
+        crop = self.mask[150:350, 350:650]
+        subject_mask = SubjectMask.from_array(crop, offset=(350, 150), frame_size=(800, 600))
+        np.testing.assert_array_equal(subject_mask.to_array(), self.mask)
+        
+        empty = SubjectMask.from_array(np.zeros((10, 10), np.uint8))
+        self.assertTrue(empty.is_empty)
+        self.assertFalse(empty.to_array().any())
+        with self.assertRaises(ValueError):
+            SubjectMask(b'not a mask')
+    
+    def test_migration_codec_matches_and_reverses(self):
+        migration = importlib.import_module('apps.editor.migrations.0002_detectedsubject_binary_mask')
+        blob = migration.encode_mask(self.mask)
+        self.assertEqual(blob, encode_mask(self.mask))
+        np.testing.assert_array_equal(migration.decode_mask(blob), self.mask)
+    
+    def test_detected_subject_lazy_mask(self):
+        user = User.objects.create_user(username='maskuser', password='testpass123')
+        project = Project.objects.create(user=user, name='Masks')
+        photo = Photo.objects.create(
+            project=project, original_image='originals/masks.jpg',
+            width=800, height=600, file_size=1024, format='JPEG'
+        )
+        DetectedSubject.objects.create(
+            photo=photo, subject_type='object', mask=encode_mask(self.mask),
+            confidence=0.8, bounding_box={'x': 0, 'y': 0, 'width': 800, 'height': 600}
+        )
+        
+        subject = DetectedSubject.objects.get(photo=photo)
+        self.assertIsNone(subject.subject_mask._crop)
+        np.testing.assert_array_equal(subject.subject_mask.to_array(), self.mask)
+        self.assertIs(subject.subject_mask, subject.subject_mask)
+    
+    def test_detect_subjects_encodes_masks(self):
+        image = Image.fromarray(np.dstack([self.mask] * 3))
+        subjects = PhotoProcessor.from_image(image).detect_subjects()
+        self.assertTrue(subjects)
+        
+        for subject in subjects:
+            subject_mask = SubjectMask(subject['mask'])
+            self.assertEqual(subject_mask.frame_size, image.size)
+            full = subject_mask.to_array()
+            self.assertTrue(full.any())
+            
+            # Nothing outside the subject's bounding box
+            bbox = subject['bbox']
+            full[bbox['y']:bbox['y'] + bbox['height'], bbox['x']:bbox['x'] + bbox['width']] = 0
+            self.assertFalse(full.any())
+    
+    def test_detect_subjects_keeps_largest(self):
+        pixels = np.zeros((400, 900, 3), np.uint8)
+        for index, radius in enumerate((25, 60, 40, 80, 30)):
+            cv2.circle(pixels, (90 + index * 180, 200), radius, (255, 255, 255), -1)
+        
+        subjects = PhotoProcessor.from_image(Image.fromarray(pixels)).detect_subjects(max_subjects=3)
+        self.assertEqual(len(subjects), 3)
+        widths = [subject['bbox']['width'] for subject in subjects]
+        self.assertEqual(widths, sorted(widths, reverse=True))
+        self.assertGreaterEqual(widths[-1], 80)
+        
+        for subject in subjects:
+            subject_mask = SubjectMask(subject['mask'])
+            self.assertEqual(subject_mask.bbox, subject['bbox'])
+
+
+class ThresholdSession:
+    """Stands in for a rembg session: foreground is everything bright"""
+    
+    def __init__(self):
+        self.sizes = []
+    
+    def predict(self, image):
+        self.sizes.append(image.size)
+        return [image.convert('L').point(lambda value: 255 if value > 128 else 0)]
+
+
+class MattingTestCase(TestCase):
+    def setUp(self):
+        self.truth = np.zeros((900, 1200), np.uint8)
+        cv2.circle(self.truth, (600, 450), 300, 255, -1)
+        rng = np.random.default_rng(0)
+        gray = np.where(self.truth > 0, 200, 60) + rng.normal(0, 5, self.truth.shape)
+        self.image = Image.fromarray(np.clip(gray, 0, 255).astype(np.uint8)).convert('RGB')
+    
+    def test_proxy_matting_with_guided_upsample(self):
+        session = ThresholdSession()
+        cutout = matting.remove_background(self.image, quality=300, session=session)
+        
+        self.assertEqual(session.sizes, [(300, 225)])
+        self.assertEqual(cutout.mode, 'RGBA')
+        self.assertEqual(cutout.size, self.image.size)
+        np.testing.assert_array_equal(np.asarray(cutout)[:, :, :3], np.asarray(self.image))
+        
+        # Edges follow the full-resolution image, not the blocky proxy
+        alpha = np.asarray(cutout)[:, :, 3].astype(int)
+        small = cv2.resize(self.truth, (300, 225), interpolation=cv2.INTER_AREA)
+        bilinear = cv2.resize(small, (1200, 900), interpolation=cv2.INTER_LINEAR).astype(int)
+        self.assertLess(np.abs(alpha - self.truth).mean(), np.abs(bilinear - self.truth).mean() / 2)
+    
+    def test_quality_presets(self):
+        self.assertEqual(matting.proxy_edge('fast'), 512)
+        self.assertEqual(matting.proxy_edge('768'), 768)
+        self.assertIsNone(matting.proxy_edge('full'))
+        with self.assertRaises(ValueError):
+            matting.proxy_edge('ultra')
+        
+        session = ThresholdSession()
+        matting.predict_alpha(self.image, quality='full', session=session)
+        self.assertEqual(session.sizes, [self.image.size])
+
+
+class MatteStoreTestCase(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = MatteStore(matte_dir=os.path.join(self.temp_dir, 'mattes'))
+        
+        pixels = np.full((120, 160, 3), 40, np.uint8)
+        cv2.circle(pixels, (80, 60), 30, (230, 230, 230), -1)
+        self.source_path = os.path.join(self.temp_dir, 'source.png')
+        Image.fromarray(pixels).save(self.source_path)
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_matte_computed_once_per_source_and_quality(self):
+        session = ThresholdSession()
+        first = self.store.get_alpha(self.source_path, 'full', session)
+        second = self.store.get_alpha(self.source_path, 'full', session)
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(len(session.sizes), 1)
+        
+        self.store.get_alpha(self.source_path, 64, session)
+        self.assertEqual(len(session.sizes), 2)
+    
+    def test_background_styles_reuse_the_matte(self):
+        session = ThresholdSession()
+        alpha = self.store.get_alpha(self.source_path, 'full', session)
+        cutout = matting.cutout(Image.open(self.source_path), alpha)
+        
+        for style in ('blue_default', 'blue_gradient'):
+            result = AdvancedBackgroundEngine().replace_background(cutout, None, style)
+            self.assertEqual(result.size, (160, 120))
+            # Subject pixels come from the cutout, the rest from the background
+            self.assertEqual(result.getpixel((80, 60)), (230, 230, 230))
+            self.assertNotEqual(result.getpixel((5, 5)), (40, 40, 40))
+        self.assertEqual(len(session.sizes), 1)
+    
+    def test_least_recently_used_mattes_evicted(self):
+        cache.clear()
+        session = ThresholdSession()
+        sources = []
+        for index in range(4):
+            pixels = np.full((120, 160, 3), 40, np.uint8)
+            cv2.circle(pixels, (60 + 10 * index, 60), 30, (230, 230, 230), -1)
+            sources.append(os.path.join(self.temp_dir, f'source{index}.png'))
+            Image.fromarray(pixels).save(sources[-1])
+        
+        self.store.get_alpha(sources[0], 'full', session)
+        size = sum(entry[1] for entry in self.store._entries())
+        store = MatteStore(matte_dir=self.store.matte_dir, max_bytes=int(size * 3.5))
+        
+        paths = [store.path_for(get_source_hash(source), 'full') for source in sources]
+        for index, source in enumerate(sources[:3]):
+            store.get_alpha(source, 'full', session)
+            past = time.time() - 100 + index
+            os.utime(paths[index], (past, past))
+        store.get_alpha(sources[0], 'full', session)  # A hit refreshes the oldest
+        store.get_alpha(sources[3], 'full', session)
+        
+        self.assertTrue(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(paths[1]))
+        self.assertTrue(os.path.exists(paths[3]))
+        self.assertLessEqual(sum(entry[1] for entry in store._entries()), store.max_bytes)
+    
+    def test_mattes_removed_with_photo(self):
+        media_root = os.path.join(self.temp_dir, 'media')
+        os.makedirs(os.path.join(media_root, 'originals'))
+        shutil.copy(self.source_path, os.path.join(media_root, 'originals', 'source.png'))
+        matte_dir = os.path.join(media_root, 'mattes')
+        
+        with override_settings(MEDIA_ROOT=media_root, MATTE_CACHE_DIR=matte_dir):
+            user = User.objects.create_user(username='matteuser', password='testpass123')
+            project = Project.objects.create(user=user, name='Mattes')
+            photo = Photo.objects.create(
+                project=project, original_image='originals/source.png',
+                width=160, height=120, file_size=1024, format='PNG'
+            )
+            store = MatteStore()
+            store.get_alpha(photo.original_image.path, 'full', ThresholdSession())
+            store.get_alpha(photo.original_image.path, 64, ThresholdSession())
+            self.assertEqual(len(store._entries()), 2)
+            
+            photo.delete()
+            self.assertEqual(store._entries(), [])
+
+
+class CompositingTestCase(TestCase):
+    def setUp(self):
+        self.alpha = np.zeros((120, 160), np.uint8)
+        self.alpha[30:90, 40:120] = 255
+    
+    def test_feather_only_touches_the_trimap_band(self):
+        feathered = compositing.feather(self.alpha, radius=1)
+        band = compositing.trimap_band(self.alpha, 2)
+        np.testing.assert_array_equal(feathered[~band], self.alpha[~band])
+        # The edge is softened, the interior stays solid
+        self.assertTrue(0 < feathered[30, 80] < 255)
+        self.assertEqual(feathered[60, 80], 255)
+        self.assertEqual(feathered[5, 5], 0)
+    
+    def test_composite_matches_alpha_blend(self):
+        foreground = Image.new('RGB', (160, 120), (200, 100, 0))
+        background = Image.new('RGB', (160, 120), (0, 100, 200))
+        alpha = np.full((120, 160), 64, np.uint8)
+        alpha[:, :80] = 255
+        
+        result = np.asarray(compositing.composite(foreground, background, alpha)).astype(int)
+        expected = (np.array([200, 100, 0]) * 64 + np.array([0, 100, 200]) * 191) / 255
+        np.testing.assert_allclose(result[10, 120], expected, atol=1)
+        np.testing.assert_array_equal(result[10, 10], [200, 100, 0])
+    
+    def test_replace_background_resizes_mismatched_mask(self):
+        image = Image.new('RGB', (160, 120), (230, 230, 230))
+        mask = Image.fromarray(self.alpha).resize((80, 60), Image.Resampling.NEAREST)
+        result = AdvancedBackgroundEngine().replace_background(image, mask, 'blue_default')
+        self.assertEqual(result.mode, 'RGB')
+        self.assertEqual(result.getpixel((80, 60)), (230, 230, 230))
+        self.assertEqual(result.getpixel((5, 5)), (0, 102, 255))
+
+
+class BackgroundTemplateCacheTestCase(TestCase):
+    def setUp(self):
+        self.engine = AdvancedBackgroundEngine()
+        self.cache = BackgroundTemplateCache(edges=(64, 128))
+        self.rendered = []
+    
+    def render(self, size, seed):
+        self.rendered.append((size, seed))
+        return self.engine._create_bokeh_effect(size, seed=seed)
+    
+    def test_canonical_size_keeps_aspect(self):
+        self.assertEqual(canonical_size((100, 50), (64, 128)), (128, 64))
+        self.assertEqual(canonical_size((4000, 3000)), (4096, 3072))
+        self.assertEqual(canonical_size((1000, 333)), (1024, 341))
+        # Larger than every canonical edge: rendered at its own size, not upscaled
+        self.assertEqual(canonical_size((9000, 3000)), (9000, 3000))
+    
+    def test_pixel_pattern_styles_match_across_bucket_boundary(self):
+        """Wave and ripple periods do not jump when a size crosses a canonical edge"""
+        # 500x300 renders under the 512 edge, 540x324 over it
+        wave_below = np.asarray(self.engine.render_background('blue_wave', (500, 300)))
+        wave_above = np.asarray(self.engine.render_background('blue_wave', (540, 324)))
+        np.testing.assert_array_equal(wave_above[:300, :500], wave_below)
+        
+        # Ripples are centered, so compare the windows around both centers
+        ripple_below = np.asarray(self.engine.render_background('blue_metallic', (500, 300)))
+        ripple_above = np.asarray(self.engine.render_background('blue_metallic', (540, 324)))
+        np.testing.assert_array_equal(ripple_above[12:312, 20:520], ripple_below)
+    
+    def test_seeded_styles_are_deterministic(self):
+        for style in ('bokeh', 'abstract_geometric'):
+            render = self.engine.styles[style]
+            first = np.asarray(render((90, 60), seed=7))
+            np.testing.assert_array_equal(first, np.asarray(render((90, 60), seed=7)))
+            self.assertFalse(np.array_equal(first, np.asarray(render((90, 60), seed=8))))
+    
+    def test_same_size_renders_once(self):
+        first = self.cache.get('bokeh', (100, 50), self.render)
+        for _ in range(5):
+            self.assertIs(self.cache.get('bokeh', (100, 50), self.render), first)
+        self.assertEqual(first.size, (100, 50))
+        self.assertEqual(self.rendered, [((128, 64), 0)])
+        
+        # A nearby size resamples the same template; another seed renders anew
+        self.assertEqual(self.cache.get('bokeh', (110, 55), self.render).size, (110, 55))
+        self.cache.get('bokeh', (100, 50), self.render, seed=1)
+        self.assertEqual(self.rendered, [((128, 64), 0), ((128, 64), 1)])
+
+
+class BokehGeneratorTestCase(TestCase):
+    def test_render_is_resolution_independent(self):
+        small = background_generators.bokeh((256, 192), np.random.default_rng(3))
+        large = background_generators.bokeh((2048, 1536), np.random.default_rng(3))
+        self.assertEqual(large.size, (2048, 1536))
+        # The large render is the same picture, upsampled
+        reduced = np.asarray(large.resize((256, 192), Image.Resampling.BOX), dtype=np.int16)
+        self.assertLessEqual(np.abs(reduced - np.asarray(small, dtype=np.int16)).mean(), 2)
+    
+    def test_overlapping_discs_add_up(self):
+        class OneDiscRng:
+            def __init__(self, position):
+                self.position = position
+            
+            def random(self, count):
+                return np.full(count, self.position)
+            
+            def integers(self, low, high, count):
+                return np.full(count, low)
+        
+        one = np.asarray(background_generators.bokeh((128, 128), OneDiscRng(0.5), count=1), dtype=int)
+        two = np.asarray(background_generators.bokeh((128, 128), OneDiscRng(0.5), count=2), dtype=int)
+        self.assertEqual(one[0, 0].tolist(), [10, 10, 10])
+        self.assertTrue((two[64, 64] > one[64, 64]).all())
@@ -0,0 +1,57 @@
+# tests/test_security.py
+from django.test import TestCase, override_settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageCms
+import io
+
+from apps.editor.security import SecurityValidator
+
+def jpeg_bytes(size=(64, 48), **save_kwargs):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'JPEG', **save_kwargs)
+    return buffer.getvalue()
+
+class UploadInspectionTestCase(TestCase):
+    def setUp(self):
+        self.validator = SecurityValidator()
+    
+    def test_reads_orientation_and_icc_profile_from_headers(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        icc = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+        upload = SimpleUploadedFile('photo.jpg', jpeg_bytes(exif=exif.tobytes(), icc_profile=icc))
+        
+        metadata = self.validator.inspect_upload(upload)
+        self.assertEqual((metadata.width, metadata.height), (64, 48))
+        self.assertEqual(metadata.format, 'JPEG')
+        self.assertEqual(metadata.orientation, 6)
+        self.assertEqual(metadata.display_size, (48, 64))
+        self.assertEqual(metadata.icc_profile, icc)
+        # The upload is rewound for whoever stores it next
+        self.assertEqual(upload.tell(), 0)
+    
+    def test_inspects_every_allowed_format(self):
+        for image_format in ('PNG', 'WEBP', 'TIFF'):
+            buffer = io.BytesIO()
+            Image.new('RGB', (30, 20)).save(buffer, image_format)
+            metadata = self.validator.inspect_upload(SimpleUploadedFile('photo', buffer.getvalue()))
+            self.assertEqual((metadata.format, metadata.width, metadata.height), (image_format, 30, 20))
+    
+    def test_truncated_pixel_data_is_never_decoded(self):
+        data = jpeg_bytes((640, 480))
+        metadata = self.validator.inspect_upload(SimpleUploadedFile('cut.jpg', data[:len(data) // 2]))
+        self.assertEqual((metadata.width, metadata.height), (640, 480))
+    
+    @override_settings(MAX_UPLOAD_PIXELS=1000)
+    def test_pixel_limit_applies_before_decode(self):
+        with self.assertRaises(ValidationError):
+            SecurityValidator().inspect_upload(SimpleUploadedFile('big.jpg', jpeg_bytes((64, 48))))
+    
+    def test_rejects_non_images(self):
+        with self.assertRaises(ValidationError):
+            self.validator.inspect_upload(SimpleUploadedFile('notes.jpg', b'just some text\n' * 10))
+    
+    def test_sanitize_filename(self):
+        filename = self.validator.sanitize_filename('../../etc/my photo!.jpg')
+        self.assertRegex(filename, r'^myphoto_[0-9a-f]{8}\.jpg$')
@@ -0,0 +1,207 @@
+# tests/test_storage.py
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+import json
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import io
+import threading
+import numpy as np
+from PIL import Image
+
+from apps.storage import chunked
+from apps.storage.chunked import PendingBudget, PrefixHasher, RangeReader, chunk_count, chunk_span
+from apps.editor.models import Photo, Project
+from apps.editor.security import SecurityValidator
+from apps.storage.models import FileStorage, StorageProvider, UploadSession
+
+class ChunkedUploadTestCase(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.data = os.urandom(10 * 1000 + 123)
+        self.chunk_size = 1000
+        self.count = chunk_count(len(self.data), self.chunk_size)
+    
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def chunk(self, index):
+        offset, size = chunk_span(index, len(self.data), self.chunk_size)
+        return self.data[offset:offset + size]
+    
+    def test_chunk_spans_cover_the_file(self):
+        self.assertEqual(self.count, 11)
+        self.assertEqual(chunk_span(10, len(self.data), self.chunk_size), (10000, 123))
+        self.assertEqual(b''.join(self.chunk(index) for index in range(self.count)), self.data)
+    
+    def test_parallel_writes_land_in_place_and_hash_matches(self):
+        path = os.path.join(self.temp_dir, 'upload.bin')
+        with open(path, 'wb') as destination:
+            destination.truncate(len(self.data))
+        
+        read_chunk = lambda index: chunked.read_at(path, *chunk_span(index, len(self.data), self.chunk_size))
+        hasher = PrefixHasher(self.count, read_chunk)
+        
+        def append(index):
+            offset, _ = chunk_span(index, len(self.data), self.chunk_size)
+            chunked.write_at(path, offset, self.chunk(index))
+            hasher.add(index, self.chunk(index))
+        
+        order = list(range(self.count))
+        random.Random(4).shuffle(order)
+        threads = [threading.Thread(target=append, args=(index,)) for index in order]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # A retried chunk changes nothing
+        append(order[0])
+        
+        with open(path, 'rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertTrue(hasher.complete)
+        self.assertEqual(hasher.hexdigest(), hashlib.sha256(self.data).hexdigest())
+    
+    def test_hasher_holds_chunks_it_cannot_read_back(self):
+        hasher = PrefixHasher(self.count)
+        for index in reversed(range(self.count)):
+            self.assertFalse(hasher.complete)
+            hasher.add(index, self.chunk(index))
+        self.assertEqual(hasher.hexdigest(), hashlib.sha256(self.data).hexdigest())
+    
+    def test_hashers_share_one_pending_budget(self):
+        budget = PendingBudget(max_bytes=2500)
+        first = PrefixHasher(self.count, budget=budget)
+        second = PrefixHasher(self.count, budget=budget)
+        first.add(2, self.chunk(2))
+        first.add(3, self.chunk(3))
+        self.assertEqual(budget.used_bytes, 2000)
+        
+        # The second hasher finds the budget spent and gives up rather than hold more
+        second.add(5, self.chunk(5))
+        self.assertTrue(second.abandoned)
+        self.assertFalse(second.complete)
+        with self.assertRaises(ValueError):
+            second.hexdigest()
+        
+        # Filling the gap hands the held chunks back
+        first.add(0, self.chunk(0))
+        first.add(1, self.chunk(1))
+        self.assertEqual(budget.used_bytes, 0)
+        first.add(9, self.chunk(9))
+        first.abandon()
+        self.assertEqual(budget.used_bytes, 0)
+    
+    def test_range_reader_finds_tiff_header_after_pixels(self):
+        buffer = io.BytesIO()
+        pixels = np.random.default_rng(0).integers(0, 255, (1200, 1600, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(buffer, 'TIFF', compression='tiff_adobe_deflate')
+        data = buffer.getvalue()
+        # libtiff layout: the IFD follows the strips
+        self.assertGreater(int.from_bytes(data[4:8], 'little'), 256 * 1024)
+        
+        reader = RangeReader(lambda offset, size: data[offset:offset + size], len(data))
+        metadata = SecurityValidator().inspect_upload(reader)
+        self.assertEqual((metadata.format, metadata.width, metadata.height), ('TIFF', 1600, 1200))
+        self.assertLess(reader.bytes_fetched, len(data) // 10)
+        self.assertEqual(reader.tell(), 0)
+
+
+class ChunkedUploadFlowTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+        self.min_chunk_size = chunked.MIN_CHUNK_SIZE
+        chunked.MIN_CHUNK_SIZE = 1024
+        
+        self.user = User.objects.create_user(username='uploader', password='uploadpass123')
+        self.project = Project.objects.create(user=self.user, name='Uploads')
+        StorageProvider.objects.create(name='local', provider_type='local', is_primary=True)
+        self.client.login(username='uploader', password='uploadpass123')
+        
+        buffer = io.BytesIO()
+        pixels = np.random.RandomState(0).randint(0, 256, (120, 160, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(buffer, format='PNG')
+        self.data = buffer.getvalue()
+        self.chunk_size = 16 * 1024
+    
+    def tearDown(self):
+        chunked.MIN_CHUNK_SIZE = self.min_chunk_size
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+    
+    def start(self):
+        response = self.client.post(
+            reverse('storage:start_upload'),
+            json.dumps({'filename': 'noise.png', 'size': len(self.data), 'chunk_size': self.chunk_size}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+    
+    def put_chunk(self, session_id, index):
+        offset, size = chunk_span(index, len(self.data), self.chunk_size)
+        return self.client.put(
+            reverse('storage:upload_chunk', args=[session_id, index]),
+            self.data[offset:offset + size],
+            content_type='application/octet-stream'
+        )
+    
+    def test_upload_resume_and_commit_creates_photo(self):
+        state = self.start()
+        session_id = state['session_id']
+        self.assertEqual(state['chunk_count'], chunk_count(len(self.data), self.chunk_size))
+        self.assertGreater(state['chunk_count'], 2)
+        
+        # Everything but the first chunk, out of order, then resume from status
+        for index in reversed(range(1, state['chunk_count'])):
+            self.assertEqual(self.put_chunk(session_id, index).status_code, 200)
+        
+        response = self.client.post(reverse('storage:commit_upload', args=[session_id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['missing'], [0])
+        
+        status = self.client.get(reverse('storage:upload_status', args=[session_id])).json()
+        for index in status['missing']:
+            self.assertEqual(self.put_chunk(session_id, index).status_code, 200)
+        # A retried chunk is accepted without being written again
+        self.assertEqual(self.put_chunk(session_id, 0).status_code, 200)
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse('storage:commit_upload', args=[session_id]),
+                json.dumps({'project_id': str(self.project.id)}),
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['file_hash'], hashlib.sha256(self.data).hexdigest())
+        # Processing is queued once the request's transaction commits
+        self.assertEqual(len(callbacks), 1)
+        
+        file_storage = FileStorage.objects.get(id=result['file_id'])
+        self.assertEqual((file_storage.width, file_storage.height), (160, 120))
+        
+        photo = Photo.objects.get(id=result['photo_id'])
+        self.assertEqual(photo.project, self.project)
+        self.assertEqual((photo.width, photo.height, photo.format), (160, 120, 'PNG'))
+        self.assertEqual(photo.file_size, len(self.data))
+        with photo.original_image.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertEqual(UploadSession.objects.get(id=session_id).status, 'committed')
+    
+    def test_abort_removes_reserved_file(self):
+        state = self.start()
+        session = UploadSession.objects.get(id=state['session_id'])
+        self.assertEqual(self.put_chunk(state['session_id'], 0).status_code, 200)
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, session.file_path)))
+        
+        response = self.client.post(reverse('storage:abort_upload', args=[state['session_id']]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, session.file_path)))
+        self.assertEqual(self.put_chunk(state['session_id'], 1).status_code, 409)
@@ -1,10 +1,16 @@
 # tests/test_views.py
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from PIL import Image
 import io
+import json
+import shutil
+import tempfile
+
+from apps.editor.models import Project, Photo
+from apps.processing.proxies import build_proxy_pyramid
 
 class ViewsTestCase(TestCase):
     def setUp(self):
@@ -41,6 +47,37 @@ class ViewsTestCase(TestCase):
         
         self.assertEqual(response.status_code, 200)
     
+    def test_preview_returns_jpeg_for_stored_photo(self):
+        """Preview endpoint renders JPEG bytes from the proxy pyramid"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        
+        with override_settings(MEDIA_ROOT=media_root):
+            project = Project.objects.create(user=self.user, name='Preview')
+            image = Image.new('RGB', (400, 300), color='green')
+            image_file = io.BytesIO()
+            image.save(image_file, format='JPEG')
+            photo = Photo.objects.create(
+                project=project,
+                original_image=SimpleUploadedFile('preview.jpg', image_file.getvalue()),
+                width=400,
+                height=300,
+                file_size=len(image_file.getvalue()),
+                format='JPEG'
+            )
+            build_proxy_pyramid(image, photo.id)
+            
+            response = self.client.post(
+                reverse('editor:preview', args=[photo.id]),
+                data=json.dumps({'settings': {'brightness': 15}, 'width': 200, 'height': 150}),
+                content_type='application/json'
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        with Image.open(io.BytesIO(response.content)) as preview:
+            self.assertLessEqual(preview.width, 200)
+    
     def test_editor_view_requires_auth(self):
         """Test that editor view requires authentication"""
         self.client.logout()